@@ -1,7 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime, date
+from functools import wraps
+from collections import OrderedDict
+import csv
+import hashlib
+import io
+import itertools
+import json
 import os
+import threading
 
 # =============================================================================
 # CONFIGURAÇÃO DA APLICAÇÃO FLASK E BANCO DE DADOS
@@ -11,16 +21,66 @@ app = Flask(__name__)
 
 # Configuração do banco de dados SQLite (ideal para desenvolvimento/estudos)
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "vidaplus.db")}'
+# VIDAPLUS_ADM_DATABASE_URI permite apontar para outro arquivo (ex.: nos testes)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'VIDAPLUS_ADM_DATABASE_URI', f'sqlite:///{os.path.join(basedir, "vidaplus.db")}'
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Perfil do SQLite: "producao" (WAL, synchronous=NORMAL, busy_timeout, mmap,
+# cache e chaves estrangeiras) ou "padrao" (defaults do SQLite). Cada app tem
+# o seu banco (o app.py usa instance/vidaplus.db); só as variáveis de ambiente
+# do perfil são as mesmas nos dois.
+SQLITE_PERFIL = os.environ.get('VIDAPLUS_SQLITE_PERFIL', 'producao')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('VIDAPLUS_SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_MB = int(os.environ.get('VIDAPLUS_SQLITE_MMAP_MB', 256))
+SQLITE_CACHE_MB = int(os.environ.get('VIDAPLUS_SQLITE_CACHE_MB', 64))
+
+PERFIS_SQLITE = {
+    'padrao': {},
+    'producao': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+        'mmap_size': SQLITE_MMAP_MB * 1024 * 1024,
+        'cache_size': -SQLITE_CACHE_MB * 1024,  # negativo = KiB
+        'foreign_keys': 'ON',
+        'temp_store': 'MEMORY',
+    },
+}
+
+if SQLITE_PERFIL not in PERFIS_SQLITE:
+    raise RuntimeError(f"VIDAPLUS_SQLITE_PERFIL inválido: {SQLITE_PERFIL} (use {', '.join(PERFIS_SQLITE)})")
+
+if SQLITE_PERFIL == 'producao':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('VIDAPLUS_DB_POOL_TAMANHO', 8)),
+        'max_overflow': int(os.environ.get('VIDAPLUS_DB_POOL_EXTRA', 8)),
+        'pool_timeout': int(os.environ.get('VIDAPLUS_DB_POOL_TIMEOUT', 10)),
+        'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+
+def aplicar_pragmas_sqlite(conexao_dbapi, registro_conexao):
+    """Aplica os PRAGMAs do perfil em cada conexão nova do pool"""
+    cursor = conexao_dbapi.cursor()
+    for pragma, valor in PERFIS_SQLITE[SQLITE_PERFIL].items():
+        cursor.execute(f'PRAGMA {pragma}={valor}')
+    cursor.close()
+
 # Inicializando SQLAlchemy
 db = SQLAlchemy(app)
 
+with app.app_context():
+    event.listen(db.engine, 'connect', aplicar_pragmas_sqlite)
+
 # =============================================================================
 # MODELOS DO BANCO DE DADOS (TABELAS)
 # =============================================================================
 
+def formatar_data(valor):
+    """Data no formato YYYY-MM-DD (isoformat é bem mais rápido que strftime)"""
+    return valor.date().isoformat() if isinstance(valor, datetime) else valor.isoformat()
+
 class RelatorioFinanceiro(db.Model):
     """Modelo para relatórios financeiros das unidades"""
     __tablename__ = 'relatorios_financeiros'
@@ -45,7 +105,7 @@ class RelatorioFinanceiro(db.Model):
             'receita_total': self.receita_total,
             'despesas_operacionais': self.despesas_operacionais,
             'lucro_liquido': self.lucro_liquido,
-            'data_criacao': self.data_criacao.strftime('%Y-%m-%d')
+            'data_criacao': formatar_data(self.data_criacao)
         }
 
 class Suprimento(db.Model):
@@ -62,6 +122,7 @@ class Suprimento(db.Model):
     validade = db.Column(db.String(20))  # formato: YYYY-MM-DD
     unidade = db.Column(db.String(100), nullable=False)
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # sobe a cada edição
     
     def __repr__(self):
         return f'<Suprimento {self.nome} - {self.unidade}>'
@@ -78,10 +139,440 @@ class Suprimento(db.Model):
             'fornecedor': self.fornecedor,
             'validade': self.validade,
             'unidade': self.unidade,
-            'data_cadastro': self.data_cadastro.strftime('%Y-%m-%d'),
+            'data_cadastro': formatar_data(self.data_cadastro),
             'status_estoque': 'BAIXO' if self.quantidade_estoque < self.quantidade_minima else 'OK'
         }
 
+# =============================================================================
+# VERSÕES DOS DADOS E SNAPSHOT DO DASHBOARD
+# =============================================================================
+
+class VersaoDados(db.Model):
+    """Contador de versão por tabela, incrementado a cada escrita"""
+    __tablename__ = 'versao_dados'
+    
+    tabela = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+class SnapshotDashboard(db.Model):
+    """Última resposta do dashboard e as versões dos dados usadas para calculá-la"""
+    __tablename__ = 'snapshot_dashboard'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.String(100), nullable=False)
+    dados = db.Column(db.Text, nullable=False)
+    gerado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+def incrementar_versao(tabela):
+    """Marca a tabela como alterada (na mesma transação da escrita)"""
+    db.session.execute(
+        sqlite_insert(VersaoDados).values(tabela=tabela, versao=1).on_conflict_do_update(
+            index_elements=['tabela'],
+            set_={'versao': VersaoDados.versao + 1}
+        )
+    )
+
+def versoes_dados(*tabelas):
+    """Carimbo com as versões atuais das tabelas, ex.: 'relatorios_financeiros:3|suprimentos:7'"""
+    versoes = dict(db.session.query(VersaoDados.tabela, VersaoDados.versao).filter(VersaoDados.tabela.in_(tabelas)).all())
+    return '|'.join(f'{tabela}:{versoes.get(tabela, 0)}' for tabela in tabelas)
+
+def get_condicional(*tabelas):
+    """ETag pelas versões das tabelas + rota + parâmetros; If-None-Match igual responde 304 sem ler os dados"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            chave = '\n'.join([
+                versoes_dados(*tabelas),
+                request.path,
+                '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True))),
+                request.headers.get('Accept', ''),
+            ])
+            etag = hashlib.sha1(chave.encode()).hexdigest()
+            
+            if request.if_none_match.contains(etag):
+                resposta = Response(status=304)
+                resposta.set_etag(etag)
+                return resposta
+            
+            resposta = app.make_response(f(*args, **kwargs))
+            if resposta.status_code == 200:
+                resposta.set_etag(etag)
+            return resposta
+        return decorated
+    return decorator
+
+# =============================================================================
+# SERIALIZAÇÃO DAS LISTAGENS (CAMPOS ESPARSOS)
+# =============================================================================
+
+class CamposInvalidos(ValueError):
+    """Campo pedido em '?fields=' que não existe no modelo"""
+
+class Serializador:
+    """Projeção pré-compilada de um modelo: lê só as colunas pedidas e monta o dicionário"""
+    
+    def __init__(self, campos):
+        self.campos = {nome: (coluna, formatador) for nome, coluna, formatador in campos}
+        self.todos = tuple(nome for nome, _, _ in campos)
+        self._compilados = {}
+    
+    def campos_pedidos(self):
+        """Campos de '?fields=' na ordem do registro (todos, se não informado)"""
+        fields = request.args.get('fields')
+        if not fields:
+            return self.todos
+        
+        pedidos = [campo.strip() for campo in fields.split(',') if campo.strip()]
+        desconhecidos = [campo for campo in pedidos if campo not in self.campos]
+        if desconhecidos:
+            raise CamposInvalidos(f"Campos inválidos em 'fields': {', '.join(desconhecidos)}")
+        
+        return tuple(nome for nome in self.todos if nome == 'id' or nome in pedidos)
+    
+    def projetar(self, query):
+        """Restringe a consulta às colunas pedidas e devolve a função que serializa cada linha"""
+        nomes = self.campos_pedidos()
+        colunas = [self.campos[nome][0].label(nome) for nome in nomes]
+        return query.with_entities(*colunas), self.compilar(nomes)
+    
+    def compilar(self, nomes):
+        """Monta (uma única vez por combinação de campos) a função linha -> dicionário"""
+        serializar = self._compilados.get(nomes)
+        if serializar is None:
+            formatados = [
+                (indice, self.campos[nome][1])
+                for indice, nome in enumerate(nomes)
+                if self.campos[nome][1] is not None
+            ]
+            
+            def serializar(linha):
+                valores = list(linha)
+                for indice, formatador in formatados:
+                    valor = valores[indice]
+                    if valor is not None:
+                        valores[indice] = formatador(valor)
+                return dict(zip(nomes, valores))
+            
+            self._compilados[nomes] = serializar
+        return serializar
+
+SERIALIZADOR_RELATORIO = Serializador([
+    ('id', RelatorioFinanceiro.id, None),
+    ('unidade', RelatorioFinanceiro.unidade, None),
+    ('periodo', RelatorioFinanceiro.periodo, None),
+    ('receita_total', RelatorioFinanceiro.receita_total, None),
+    ('despesas_operacionais', RelatorioFinanceiro.despesas_operacionais, None),
+    ('lucro_liquido', RelatorioFinanceiro.lucro_liquido, None),
+    ('data_criacao', RelatorioFinanceiro.data_criacao, formatar_data),
+])
+
+SERIALIZADOR_SUPRIMENTO = Serializador([
+    ('id', Suprimento.id, None),
+    ('nome', Suprimento.nome, None),
+    ('categoria', Suprimento.categoria, None),
+    ('quantidade_estoque', Suprimento.quantidade_estoque, None),
+    ('quantidade_minima', Suprimento.quantidade_minima, None),
+    ('preco_unitario', Suprimento.preco_unitario, None),
+    ('fornecedor', Suprimento.fornecedor, None),
+    ('validade', Suprimento.validade, None),
+    ('unidade', Suprimento.unidade, None),
+    ('data_cadastro', Suprimento.data_cadastro, formatar_data),
+    # Calculado no próprio SELECT, igual ao to_dict()
+    ('status_estoque', db.case(
+        (Suprimento.quantidade_estoque < Suprimento.quantidade_minima, 'BAIXO'),
+        else_='OK'
+    ), None),
+])
+
+@app.errorhandler(CamposInvalidos)
+def campos_invalidos(erro):
+    return jsonify({
+        "status": "erro",
+        "mensagem": str(erro)
+    }), 400
+
+# =============================================================================
+# CACHE DE FRAGMENTOS JSON DOS SUPRIMENTOS
+# =============================================================================
+
+# O JSON de cada suprimento fica guardado já codificado, junto com a versão da
+# linha. As listagens leem só (id, versao), juntam os fragmentos do cache e vão
+# ao banco apenas pelos que faltam ou mudaram. Quem altera um suprimento sobe a
+# versão, o que invalida o fragmento também nos outros workers.
+CACHE_FRAGMENTOS_ITENS = int(os.environ.get('VIDAPLUS_CACHE_FRAGMENTOS_ITENS', 100000))
+CACHE_FRAGMENTOS_MB = int(os.environ.get('VIDAPLUS_CACHE_FRAGMENTOS_MB', 32))
+
+class CacheFragmentos:
+    """LRU de fragmentos JSON por (tabela, id), limitado por itens e por bytes"""
+    
+    def __init__(self, maximo_itens, maximo_bytes):
+        self.maximo_itens = maximo_itens
+        self.maximo_bytes = maximo_bytes
+        self._dados = OrderedDict()  # (tabela, id) -> (versao, fragmento)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.descartes = 0
+    
+    def obter_varios(self, tabela, ids_versoes):
+        """{id: fragmento} dos registros cujo fragmento está na versão pedida"""
+        encontrados = {}
+        obter, mover = self._dados.get, self._dados.move_to_end
+        with self._lock:
+            for registro_id, versao in ids_versoes:
+                chave = (tabela, registro_id)
+                item = obter(chave)
+                if item is not None and item[0] == versao:
+                    mover(chave)
+                    encontrados[registro_id] = item[1]
+            self.hits += len(encontrados)
+            self.misses += len(ids_versoes) - len(encontrados)
+        return encontrados
+    
+    def guardar(self, tabela, registro_id, versao, fragmento):
+        """Guarda o fragmento e descarta os menos usados se passar dos limites"""
+        chave = (tabela, registro_id)
+        with self._lock:
+            anterior = self._dados.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= len(anterior[1])
+            self._dados[chave] = (versao, fragmento)
+            self.bytes += len(fragmento)
+            while len(self._dados) > self.maximo_itens or self.bytes > self.maximo_bytes:
+                _, (_, descartado) = self._dados.popitem(last=False)
+                self.bytes -= len(descartado)
+                self.descartes += 1
+    
+    def remover(self, tabela, registro_id):
+        """Libera o fragmento de um registro alterado"""
+        with self._lock:
+            item = self._dados.pop((tabela, registro_id), None)
+            if item is not None:
+                self.bytes -= len(item[1])
+    
+    def estatisticas(self):
+        """Ocupação e taxa de acerto do cache"""
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'itens': len(self._dados),
+                'bytes': self.bytes,
+                'maximo_itens': self.maximo_itens,
+                'maximo_bytes': self.maximo_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'descartes': self.descartes,
+                'taxa_acerto': round(self.hits / consultas * 100, 2) if consultas > 0 else 0
+            }
+
+cache_fragmentos = CacheFragmentos(CACHE_FRAGMENTOS_ITENS, CACHE_FRAGMENTOS_MB * 1024 * 1024)
+
+# Modelos com fragmentos em cache e o serializador que gera o JSON completo
+SERIALIZADORES_FRAGMENTOS = {Suprimento: SERIALIZADOR_SUPRIMENTO}
+
+def invalidar_fragmentos(modelo, ids):
+    """Sobe a versão dos registros (na transação atual) e libera os fragmentos deste worker"""
+    if modelo not in SERIALIZADORES_FRAGMENTOS or not ids:
+        return
+    db.session.execute(db.update(modelo).where(modelo.id.in_(ids)).values(versao=modelo.versao + 1))
+    for registro_id in ids:
+        cache_fragmentos.remover(modelo.__tablename__, registro_id)
+
+def usa_fragmentos(serializador):
+    """A resposta pode ser montada com fragmentos (registro completo, fora do streaming)"""
+    return not quer_stream() and serializador.campos_pedidos() == serializador.todos
+
+def codificar_json(valor):
+    """Mesmo formato do jsonify (chaves ordenadas, sem espaços)"""
+    return json.dumps(
+        valor, ensure_ascii=app.json.ensure_ascii, sort_keys=app.json.sort_keys, separators=(',', ':')
+    ).encode('utf-8')
+
+def fragmentos_da_consulta(modelo, query):
+    """Fragmentos JSON dos registros da consulta, na ordem dela"""
+    tabela = modelo.__tablename__
+    # Só (id, versao), executado direto no Core: sem o custo de montar objetos do ORM por linha
+    ids_versoes = db.session.connection().execute(query.with_entities(modelo.id, modelo.versao).statement).all()
+    fragmentos = cache_fragmentos.obter_varios(tabela, ids_versoes)
+    faltando = [registro_id for registro_id, _ in ids_versoes if registro_id not in fragmentos]
+    
+    serializador = SERIALIZADORES_FRAGMENTOS[modelo]
+    serializar = serializador.compilar(serializador.todos)
+    colunas = [serializador.campos[nome][0].label(nome) for nome in serializador.todos]
+    # Em blocos, por causa do limite de parâmetros do SQLite
+    for inicio in range(0, len(faltando), TAMANHO_LOTE_STREAM):
+        bloco = faltando[inicio:inicio + TAMANHO_LOTE_STREAM]
+        # A versão vem na mesma linha dos dados: o fragmento nunca fica com versão mais nova que o conteúdo
+        for linha in db.session.query(*colunas, modelo.versao).filter(modelo.id.in_(bloco)):
+            fragmento = codificar_json(serializar(linha[:-1]))
+            cache_fragmentos.guardar(tabela, linha.id, linha.versao, fragmento)
+            fragmentos[linha.id] = fragmento
+    
+    return [fragmentos[registro_id] for registro_id, _ in ids_versoes if registro_id in fragmentos]
+
+def resposta_json_montada(envelope, chave, codificado):
+    """Resposta JSON do envelope com o valor de 'chave' já codificado (fragmentos)"""
+    itens = sorted(envelope.items()) if app.json.sort_keys else envelope.items()
+    partes = [
+        codificar_json(nome) + b':' + (codificado if nome == chave else codificar_json(valor))
+        for nome, valor in itens
+    ]
+    return Response(b'{' + b','.join(partes) + b'}\n', mimetype='application/json')
+
+def lista_json(fragmentos):
+    """Array JSON a partir dos fragmentos"""
+    return b'[' + b','.join(fragmentos) + b']'
+
+# =============================================================================
+# MIGRAÇÕES DO BANCO
+# =============================================================================
+
+class VersaoSchema(db.Model):
+    """Migrações já aplicadas neste banco"""
+    __tablename__ = 'versao_schema'
+    
+    versao = db.Column(db.Integer, primary_key=True)
+    descricao = db.Column(db.String(200), nullable=False)
+    aplicada_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+MIGRACOES = []
+
+def migracao(versao, descricao):
+    """Registra uma migração; novas migrações entram sempre com a próxima versão"""
+    def registrar(f):
+        MIGRACOES.append((versao, descricao, f))
+        return f
+    return registrar
+
+def executar_sql(*comandos):
+    """Executa comandos SQL na transação atual"""
+    for comando in comandos:
+        db.session.execute(db.text(comando))
+
+@migracao(1, 'Tabelas iniciais')
+def migracao_tabelas_iniciais():
+    db.create_all()
+
+@migracao(2, 'Índices de suprimentos e relatórios')
+def migracao_indices():
+    executar_sql(
+        'CREATE INDEX IF NOT EXISTS ix_suprimentos_categoria ON suprimentos (categoria)',
+        # Índice parcial usado pela listagem de estoque baixo
+        'CREATE INDEX IF NOT EXISTS ix_suprimentos_estoque_baixo ON suprimentos (id) '
+        'WHERE quantidade_estoque < quantidade_minima',
+        'CREATE INDEX IF NOT EXISTS ix_relatorios_unidade_periodo ON relatorios_financeiros (unidade, periodo)',
+    )
+
+@migracao(3, 'Versões dos dados e snapshot do dashboard')
+def migracao_snapshot_dashboard():
+    conexao = db.session.connection()
+    VersaoDados.__table__.create(conexao, checkfirst=True)
+    SnapshotDashboard.__table__.create(conexao, checkfirst=True)
+
+@migracao(4, 'Índice da chave de importação dos suprimentos')
+def migracao_indice_importacao_suprimentos():
+    executar_sql('CREATE INDEX IF NOT EXISTS ix_suprimentos_nome_unidade ON suprimentos (nome, unidade)')
+
+@migracao(5, 'Versão por registro dos suprimentos (cache de fragmentos)')
+def migracao_versao_suprimentos():
+    colunas = {linha[1] for linha in db.session.execute(db.text('PRAGMA table_info(suprimentos)'))}
+    if 'versao' not in colunas:
+        executar_sql('ALTER TABLE suprimentos ADD COLUMN versao INTEGER NOT NULL DEFAULT 1')
+
+def aplicar_migracoes():
+    """Aplica, em ordem, as migrações que ainda não rodaram neste banco"""
+    VersaoSchema.__table__.create(db.engine, checkfirst=True)
+    aplicadas = {v.versao for v in VersaoSchema.query.all()}
+    
+    for versao, descricao, executar in sorted(MIGRACOES, key=lambda m: m[0]):
+        if versao in aplicadas:
+            continue
+        try:
+            executar()
+            db.session.add(VersaoSchema(versao=versao, descricao=descricao))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        print(f"Migração {versao} aplicada: {descricao}")
+
+@app.cli.command('migrar')
+def comando_migrar():
+    """Atualiza o schema do banco (flask --app adm migrar)"""
+    aplicar_migracoes()
+    print("Banco de dados atualizado!")
+
+# =============================================================================
+# VERIFICAÇÃO DOS PLANOS DE CONSULTA
+# =============================================================================
+
+# Varreduras esperadas: (rota, tabela)
+SCANS_PERMITIDOS = {
+    # As listagens completas devolvem todas as linhas
+    ('/api/relatorios', 'relatorios_financeiros'),
+    ('/api/suprimentos', 'suprimentos'),
+    # O índice parcial só tem os suprimentos com estoque baixo
+    ('/api/suprimentos/estoque-baixo', 'suprimentos'),
+    # O dashboard agrega as duas tabelas inteiras (só quando o snapshot está
+    # velho) e junta as duas linhas de totais
+    ('/api/dashboard', 'relatorios_financeiros'),
+    ('/api/dashboard', 'suprimentos'),
+    ('/api/dashboard', 'anon_1'),
+    ('/api/dashboard', 'anon_2'),
+}
+
+def verificar_planos_de_consulta():
+    """Roda cada rota GET e devolve as consultas com SCAN não previsto: (rota, detalhe, SQL)"""
+    capturados = []
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            capturados.append((statement, parameters))
+
+    problemas = []
+    cliente = app.test_client()
+    event.listen(db.engine, 'before_cursor_execute', capturar)
+    try:
+        for regra in app.url_map.iter_rules():
+            if 'GET' not in regra.methods or regra.endpoint == 'static':
+                continue
+
+            url = regra.rule
+            for argumento in regra.arguments:
+                url = url.replace(f'<int:{argumento}>', '1').replace(f'<{argumento}>', '1')
+
+            capturados.clear()
+            cliente.get(url)
+
+            with db.engine.connect() as conexao:
+                for statement, parameters in list(capturados):
+                    plano = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+                    for linha in plano:
+                        detalhe = linha[-1]
+                        if not detalhe.startswith('SCAN '):
+                            continue
+                        tabela = detalhe.split()[1]
+                        if tabela.startswith('(subquery-') or (regra.rule, tabela) in SCANS_PERMITIDOS:
+                            continue
+                        problemas.append((regra.rule, detalhe, ' '.join(statement.split())))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capturar)
+
+    return problemas
+
+@app.cli.command('verificar-planos')
+def comando_verificar_planos():
+    """Falha se alguma rota fizer varredura completa não prevista (flask --app adm verificar-planos)"""
+    problemas = verificar_planos_de_consulta()
+    for rota, detalhe, statement in problemas:
+        print(f"❌ {rota}: {detalhe}")
+        print(f"   {statement}")
+
+    if problemas:
+        raise SystemExit(1)
+    print("✅ Nenhuma consulta com varredura completa de tabela")
+
 # =============================================================================
 # FUNÇÃO PARA INICIALIZAR O BANCO E DADOS DE EXEMPLO
 # =============================================================================
@@ -104,6 +595,7 @@ def criar_dados_exemplo():
         
         for relatorio in relatorios_exemplo:
             db.session.add(relatorio)
+        incrementar_versao(RelatorioFinanceiro.__tablename__)
     
     if Suprimento.query.first() is None:
         # Suprimentos de exemplo
@@ -142,10 +634,87 @@ def criar_dados_exemplo():
         
         for suprimento in suprimentos_exemplo:
             db.session.add(suprimento)
+        incrementar_versao(Suprimento.__tablename__)
     
     # Salvar todas as alterações
     db.session.commit()
 
+# =============================================================================
+# RESPOSTAS EM STREAMING (NDJSON)
+# =============================================================================
+
+# Registros lidos do banco por lote no modo streaming
+TAMANHO_LOTE_STREAM = 1000
+
+def quer_stream():
+    """Indica se o cliente pediu a listagem em streaming (NDJSON)"""
+    return request.args.get('stream') == '1' or \
+        'application/x-ndjson' in request.headers.get('Accept', '')
+
+def resposta_ndjson(query, serializar):
+    """Envia cada registro da consulta como uma linha JSON, sem montar a lista inteira em memória"""
+    def gerar():
+        lote = []
+        for linha in query.yield_per(TAMANHO_LOTE_STREAM):
+            lote.append(json.dumps(serializar(linha), ensure_ascii=False))
+            if len(lote) >= TAMANHO_LOTE_STREAM:
+                yield '\n'.join(lote) + '\n'
+                lote = []
+        if lote:
+            yield '\n'.join(lote) + '\n'
+    
+    return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+# =============================================================================
+# VALIDAÇÃO DOS DADOS RECEBIDOS
+# =============================================================================
+
+# Usada tanto pelos POSTs (um registro) quanto pela importação de CSV
+CAMPOS_OBRIGATORIOS_RELATORIO = ['unidade', 'periodo', 'receita_total', 'despesas_operacionais']
+CAMPOS_OBRIGATORIOS_SUPRIMENTO = ['nome', 'categoria', 'quantidade_estoque', 'quantidade_minima', 'preco_unitario', 'fornecedor', 'unidade']
+CAMPOS_OPCIONAIS_SUPRIMENTO = ['validade']
+
+def validar_campos_obrigatorios(dados, campos):
+    """Levanta ValueError com a mensagem do primeiro campo obrigatório ausente"""
+    for campo in campos:
+        if campo not in dados:
+            raise ValueError(f"Campo obrigatório '{campo}' não fornecido")
+
+def validar_relatorio(dados):
+    """Valida e converte os campos de um relatório financeiro"""
+    validar_campos_obrigatorios(dados, CAMPOS_OBRIGATORIOS_RELATORIO)
+    try:
+        receita = float(dados['receita_total'])
+        despesas = float(dados['despesas_operacionais'])
+    except (TypeError, ValueError):
+        raise ValueError("Valores numéricos inválidos")
+    
+    # Calculando lucro líquido automaticamente
+    return {
+        'unidade': dados['unidade'],
+        'periodo': dados['periodo'],
+        'receita_total': receita,
+        'despesas_operacionais': despesas,
+        'lucro_liquido': receita - despesas
+    }
+
+def validar_suprimento(dados):
+    """Valida e converte os campos de um suprimento"""
+    validar_campos_obrigatorios(dados, CAMPOS_OBRIGATORIOS_SUPRIMENTO)
+    try:
+        return {
+            'nome': dados['nome'],
+            'categoria': dados['categoria'],
+            'quantidade_estoque': int(dados['quantidade_estoque']),
+            'quantidade_minima': int(dados['quantidade_minima']),
+            'preco_unitario': float(dados['preco_unitario']),
+            'fornecedor': dados['fornecedor'],
+            'validade': dados.get('validade', ''),  # Campo opcional (CAMPOS_OPCIONAIS_SUPRIMENTO)
+            'unidade': dados['unidade']
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Valores numéricos inválidos")
+
 # =============================================================================
 # ROTAS DA API - HOME E INFORMAÇÕES
 # =============================================================================
@@ -159,17 +728,26 @@ def home():
 # =============================================================================
 
 @app.route('/api/relatorios', methods=['GET'])
+@get_condicional('relatorios_financeiros')
 def listar_relatorios():
     """Lista todos os relatórios financeiros"""
-    relatorios = RelatorioFinanceiro.query.all()
+    query, serializar = SERIALIZADOR_RELATORIO.projetar(
+        RelatorioFinanceiro.query.order_by(RelatorioFinanceiro.id)
+    )
+    
+    if quer_stream():
+        return resposta_ndjson(query, serializar)
+    
+    relatorios = [serializar(linha) for linha in query.all()]
     
     return jsonify({
         "status": "sucesso",
         "total_relatorios": len(relatorios),
-        "relatorios": [relatorio.to_dict() for relatorio in relatorios]
+        "relatorios": relatorios
     })
 
 @app.route('/api/relatorios/<int:relatorio_id>', methods=['GET'])
+@get_condicional('relatorios_financeiros')
 def obter_relatorio(relatorio_id):
     """Obtém um relatório específico pelo ID"""
     relatorio = RelatorioFinanceiro.query.get(relatorio_id)
@@ -190,32 +768,22 @@ def criar_relatorio():
     """Cria um novo relatório financeiro"""
     dados = request.get_json()
     
-    # Validação dos campos obrigatórios
-    campos_obrigatorios = ['unidade', 'periodo', 'receita_total', 'despesas_operacionais']
-    for campo in campos_obrigatorios:
-        if campo not in dados:
-            return jsonify({
-                "status": "erro",
-                "mensagem": f"Campo obrigatório '{campo}' não fornecido"
-            }), 400
+    # Validação dos campos obrigatórios e valores numéricos
+    try:
+        valores = validar_relatorio(dados)
+    except ValueError as e:
+        return jsonify({
+            "status": "erro",
+            "mensagem": str(e)
+        }), 400
     
     try:
-        # Calculando lucro líquido automaticamente
-        receita = float(dados['receita_total'])
-        despesas = float(dados['despesas_operacionais'])
-        lucro_liquido = receita - despesas
-        
         # Criando novo relatório
-        novo_relatorio = RelatorioFinanceiro(
-            unidade=dados['unidade'],
-            periodo=dados['periodo'],
-            receita_total=receita,
-            despesas_operacionais=despesas,
-            lucro_liquido=lucro_liquido
-        )
+        novo_relatorio = RelatorioFinanceiro(**valores)
         
         # Salvando no banco
         db.session.add(novo_relatorio)
+        incrementar_versao(RelatorioFinanceiro.__tablename__)
         db.session.commit()
         
         return jsonify({
@@ -224,11 +792,6 @@ def criar_relatorio():
             "relatorio": novo_relatorio.to_dict()
         }), 201
         
-    except ValueError:
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Valores numéricos inválidos"
-        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -243,26 +806,43 @@ def criar_relatorio():
 # =============================================================================
 
 @app.route('/api/suprimentos', methods=['GET'])
+@get_condicional('suprimentos')
 def listar_suprimentos():
     """Lista todos os suprimentos"""
-    suprimentos = Suprimento.query.all()
+    query = Suprimento.query.order_by(Suprimento.id)
+    
+    if usa_fragmentos(SERIALIZADOR_SUPRIMENTO):
+        fragmentos = fragmentos_da_consulta(Suprimento, query)
+        return resposta_json_montada({
+            "status": "sucesso",
+            "total_suprimentos": len(fragmentos),
+            "suprimentos": None
+        }, "suprimentos", lista_json(fragmentos))
+    
+    query, serializar = SERIALIZADOR_SUPRIMENTO.projetar(query)
+    
+    if quer_stream():
+        return resposta_ndjson(query, serializar)
+    
+    suprimentos = [serializar(linha) for linha in query.all()]
     
     return jsonify({
         "status": "sucesso",
         "total_suprimentos": len(suprimentos),
-        "suprimentos": [suprimento.to_dict() for suprimento in suprimentos]
+        "suprimentos": suprimentos
     })
 
 @app.route('/api/suprimentos/<int:suprimento_id>', methods=['GET'])
+@get_condicional('suprimentos')
 def obter_suprimento(suprimento_id):
     """Obtém um suprimento específico pelo ID"""
-    suprimento = Suprimento.query.get(suprimento_id)
+    fragmentos = fragmentos_da_consulta(Suprimento, Suprimento.query.filter_by(id=suprimento_id))
     
-    if suprimento:
-        return jsonify({
+    if fragmentos:
+        return resposta_json_montada({
             "status": "sucesso",
-            "suprimento": suprimento.to_dict()
-        })
+            "suprimento": None
+        }, "suprimento", fragmentos[0])
     else:
         return jsonify({
             "status": "erro",
@@ -274,28 +854,20 @@ def criar_suprimento():
     """Adiciona um novo suprimento"""
     dados = request.get_json()
     
-    # Validação dos campos obrigatórios
-    campos_obrigatorios = ['nome', 'categoria', 'quantidade_estoque', 'quantidade_minima', 'preco_unitario', 'fornecedor', 'unidade']
-    for campo in campos_obrigatorios:
-        if campo not in dados:
-            return jsonify({
-                "status": "erro",
-                "mensagem": f"Campo obrigatório '{campo}' não fornecido"
-            }), 400
+    # Validação dos campos obrigatórios e valores numéricos
+    try:
+        valores = validar_suprimento(dados)
+    except ValueError as e:
+        return jsonify({
+            "status": "erro",
+            "mensagem": str(e)
+        }), 400
     
     try:
-        novo_suprimento = Suprimento(
-            nome=dados['nome'],
-            categoria=dados['categoria'],
-            quantidade_estoque=int(dados['quantidade_estoque']),
-            quantidade_minima=int(dados['quantidade_minima']),
-            preco_unitario=float(dados['preco_unitario']),
-            fornecedor=dados['fornecedor'],
-            validade=dados.get('validade', ''),  # Campo opcional
-            unidade=dados['unidade']
-        )
+        novo_suprimento = Suprimento(**valores)
         
         db.session.add(novo_suprimento)
+        incrementar_versao(Suprimento.__tablename__)
         db.session.commit()
         
         return jsonify({
@@ -304,11 +876,6 @@ def criar_suprimento():
             "suprimento": novo_suprimento.to_dict()
         }), 201
         
-    except ValueError:
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Valores numéricos inválidos"
-        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -340,6 +907,9 @@ def atualizar_suprimento(suprimento_id):
         if 'quantidade_minima' in dados:
             suprimento.quantidade_minima = int(dados['quantidade_minima'])
         
+        suprimento.versao = Suprimento.versao + 1
+        cache_fragmentos.remover(Suprimento.__tablename__, suprimento_id)
+        incrementar_versao(Suprimento.__tablename__)
         db.session.commit()
         
         return jsonify({
@@ -362,28 +932,220 @@ def atualizar_suprimento(suprimento_id):
 
 
 @app.route('/api/suprimentos/estoque-baixo', methods=['GET'])
+@get_condicional('suprimentos')
 def suprimentos_estoque_baixo():
     """Lista suprimentos com estoque abaixo do mínimo"""
-    suprimentos_baixo = Suprimento.query.filter(
+    query = Suprimento.query.filter(
         Suprimento.quantidade_estoque < Suprimento.quantidade_minima
-    ).all()
+    ).order_by(Suprimento.id)
+    
+    if usa_fragmentos(SERIALIZADOR_SUPRIMENTO):
+        fragmentos = fragmentos_da_consulta(Suprimento, query)
+        return resposta_json_montada({
+            "status": "sucesso",
+            "total_itens_estoque_baixo": len(fragmentos),
+            "suprimentos_estoque_baixo": None
+        }, "suprimentos_estoque_baixo", lista_json(fragmentos))
+    
+    query, serializar = SERIALIZADOR_SUPRIMENTO.projetar(query)
+    
+    if quer_stream():
+        return resposta_ndjson(query, serializar)
+    
+    suprimentos_baixo = [serializar(linha) for linha in query.all()]
     
     return jsonify({
         "status": "sucesso",
         "total_itens_estoque_baixo": len(suprimentos_baixo),
-        "suprimentos_estoque_baixo": [s.to_dict() for s in suprimentos_baixo]
+        "suprimentos_estoque_baixo": suprimentos_baixo
     })
 
 @app.route('/api/suprimentos/categoria/<categoria>', methods=['GET'])
+@get_condicional('suprimentos')
 def suprimentos_por_categoria(categoria):
     """Lista suprimentos por categoria"""
-    suprimentos = Suprimento.query.filter_by(categoria=categoria).all()
+    query = Suprimento.query.filter_by(categoria=categoria).order_by(Suprimento.id)
+    
+    if usa_fragmentos(SERIALIZADOR_SUPRIMENTO):
+        fragmentos = fragmentos_da_consulta(Suprimento, query)
+        return resposta_json_montada({
+            "status": "sucesso",
+            "categoria": categoria,
+            "total_suprimentos": len(fragmentos),
+            "suprimentos": None
+        }, "suprimentos", lista_json(fragmentos))
+    
+    query, serializar = SERIALIZADOR_SUPRIMENTO.projetar(query)
+    
+    if quer_stream():
+        return resposta_ndjson(query, serializar)
+    
+    suprimentos = [serializar(linha) for linha in query.all()]
     
     return jsonify({
         "status": "sucesso",
         "categoria": categoria,
         "total_suprimentos": len(suprimentos),
-        "suprimentos": [s.to_dict() for s in suprimentos]
+        "suprimentos": suprimentos
+    })
+
+# =============================================================================
+# IMPORTAÇÃO DE PLANILHAS (CSV)
+# =============================================================================
+
+# O CSV é lido linha a linha (o arquivo nunca fica inteiro em memória) e
+# gravado em lotes: cada lote busca de uma vez os registros que já existem
+# pela chave e faz um UPDATE em massa para eles e um INSERT em massa para o resto.
+TAMANHO_LOTE_IMPORTACAO = 500
+MAXIMO_ERROS_RELATORIO = 1000
+
+class CsvInvalido(ValueError):
+    """CSV enviado para importação que não pode ser lido"""
+
+@app.errorhandler(CsvInvalido)
+def csv_invalido(erro):
+    return jsonify({
+        "status": "erro",
+        "mensagem": str(erro)
+    }), 400
+
+def decodificar_linhas(bruto):
+    """Decodifica o CSV linha a linha, para um erro de codificação apontar a linha exata"""
+    for numero, linha in enumerate(bruto):
+        yield linha.decode('utf-8-sig' if numero == 0 else 'utf-8')
+
+def ler_csv_enviado():
+    """Leitor do CSV enviado como arquivo 'arquivo' (multipart) ou no corpo (text/csv)"""
+    arquivo = request.files.get('arquivo')
+    bruto = arquivo.stream if arquivo else io.BufferedReader(request.stream)
+    texto = decodificar_linhas(bruto)
+    
+    # Planilhas exportadas em português costumam usar ';' como separador
+    try:
+        cabecalho = next(texto, '')
+    except UnicodeDecodeError:
+        raise CsvInvalido("Arquivo CSV deve estar em UTF-8")
+    if not cabecalho.strip():
+        raise CsvInvalido("Arquivo CSV vazio")
+    separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    
+    return csv.DictReader(itertools.chain([cabecalho], texto), delimiter=separador)
+
+def gravar_lote_importacao(modelo, chave, lote):
+    """Upsert de um lote [(linha, valores, ausentes)] pela chave; devolve (inseridos, atualizados)"""
+    # Se a mesma chave aparece mais de uma vez no lote vale a última linha
+    por_chave = {tuple(valores[c] for c in chave): (valores, ausentes) for _, valores, ausentes in lote}
+    
+    colunas_chave = [getattr(modelo, c) for c in chave]
+    existentes = {
+        tuple(linha[1:]): linha[0]
+        for linha in db.session.query(modelo.id, *colunas_chave).filter(
+            db.tuple_(*colunas_chave).in_(list(por_chave))
+        )
+    }
+    
+    # Na atualização, os campos opcionais que a linha não trouxe mantêm o valor gravado
+    atualizar = [
+        dict({campo: valor for campo, valor in valores.items() if campo not in ausentes}, id=existentes[k])
+        for k, (valores, ausentes) in por_chave.items() if k in existentes
+    ]
+    inserir = [valores for k, (valores, _) in por_chave.items() if k not in existentes]
+    
+    if atualizar:
+        db.session.execute(db.update(modelo), atualizar)
+        invalidar_fragmentos(modelo, [valores['id'] for valores in atualizar])
+    if inserir:
+        db.session.execute(db.insert(modelo), inserir)
+    incrementar_versao(modelo.__tablename__)
+    db.session.commit()
+    
+    return len(inserir), len(atualizar)
+
+def importar_csv(modelo, validar, chave, opcionais=()):
+    """Importa o CSV enviado; linhas inválidas vão para o relatório de erros sem parar a importação"""
+    leitor = ler_csv_enviado()
+    
+    processadas = inseridos = atualizados = total_erros = 0
+    erros = []
+    
+    def registrar_erro(linha, mensagem):
+        nonlocal total_erros
+        total_erros += 1
+        if len(erros) < MAXIMO_ERROS_RELATORIO:
+            erros.append({"linha": linha, "erro": mensagem})
+    
+    def gravar(lote):
+        nonlocal inseridos, atualizados
+        try:
+            novos, alterados = gravar_lote_importacao(modelo, chave, lote)
+            inseridos += novos
+            atualizados += alterados
+        except Exception as e:
+            db.session.rollback()
+            for linha, _, _ in lote:
+                registrar_erro(linha, f"Erro ao gravar: {str(e)}")
+    
+    lote = []
+    erro_leitura = None
+    try:
+        for registro in leitor:
+            processadas += 1
+            # Células vazias contam como campo não fornecido
+            dados = {campo.strip(): valor.strip() for campo, valor in registro.items()
+                     if campo and valor is not None and valor.strip()}
+            try:
+                lote.append((leitor.line_num, validar(dados), [campo for campo in opcionais if campo not in dados]))
+            except ValueError as e:
+                registrar_erro(leitor.line_num, str(e))
+                continue
+            
+            if len(lote) >= TAMANHO_LOTE_IMPORTACAO:
+                gravar(lote)
+                lote = []
+    except UnicodeDecodeError:
+        # A linha com erro não chega a ser contada em line_num
+        erro_leitura = (leitor.line_num + 1, "Linha não está em UTF-8")
+    except csv.Error as e:
+        erro_leitura = (leitor.line_num + 1, f"CSV malformado: {str(e)}")
+    
+    # O que foi lido antes de um erro de leitura é gravado normalmente
+    if lote:
+        gravar(lote)
+    if erro_leitura:
+        registrar_erro(*erro_leitura)
+    
+    resultado = {
+        "status": "sucesso" if total_erros == 0 else "parcial",
+        "linhas_processadas": processadas,
+        "inseridos": inseridos,
+        "atualizados": atualizados,
+        "total_erros": total_erros,
+        "erros": erros
+    }
+    if erro_leitura:
+        # Interrompida: o relatório diz até onde a importação chegou
+        resultado["status"] = "erro"
+        resultado["mensagem"] = "Importação interrompida na linha {}: {}".format(*erro_leitura)
+        return jsonify(resultado), 400
+    
+    return jsonify(resultado)
+
+@app.route('/api/relatorios/import', methods=['POST'])
+def importar_relatorios():
+    """Importa relatórios financeiros de um CSV (atualiza os já existentes por unidade e período)"""
+    return importar_csv(RelatorioFinanceiro, validar_relatorio, ('unidade', 'periodo'))
+
+@app.route('/api/suprimentos/import', methods=['POST'])
+def importar_suprimentos():
+    """Importa suprimentos de um CSV (atualiza os já existentes por nome e unidade)"""
+    return importar_csv(Suprimento, validar_suprimento, ('nome', 'unidade'), CAMPOS_OPCIONAIS_SUPRIMENTO)
+
+@app.route('/api/cache/fragmentos', methods=['GET'])
+def estatisticas_cache_fragmentos():
+    """Ocupação e taxa de acerto do cache de fragmentos JSON"""
+    return jsonify({
+        "status": "sucesso",
+        "fragmentos": cache_fragmentos.estatisticas()
     })
 
 # =============================================================================
@@ -391,24 +1153,47 @@ def suprimentos_por_categoria(categoria):
 # =============================================================================
 
 @app.route('/api/dashboard', methods=['GET'])
+@get_condicional('relatorios_financeiros', 'suprimentos')
 def dashboard():
     """Retorna informações resumidas para o dashboard"""
     
-    # Consultas ao banco de dados
-    total_relatorios = RelatorioFinanceiro.query.count()
-    receita_total = db.session.query(db.func.sum(RelatorioFinanceiro.receita_total)).scalar() or 0
-    lucro_total = db.session.query(db.func.sum(RelatorioFinanceiro.lucro_liquido)).scalar() or 0
+    # O snapshot vale enquanto nenhuma das tabelas mudar de versão; como fica
+    # no banco, é compartilhado entre os workers
+    versao = versoes_dados(RelatorioFinanceiro.__tablename__, Suprimento.__tablename__)
+    snapshot = db.session.get(SnapshotDashboard, 1)
+    if snapshot is None or snapshot.versao != versao:
+        dados = app.json.dumps(calcular_dashboard())
+        db.session.execute(
+            sqlite_insert(SnapshotDashboard).values(id=1, versao=versao, dados=dados, gerado_em=datetime.utcnow())
+            .on_conflict_do_update(index_elements=['id'], set_={'versao': versao, 'dados': dados, 'gerado_em': datetime.utcnow()})
+        )
+        db.session.commit()
+    else:
+        dados = snapshot.dados
     
-    total_suprimentos = Suprimento.query.count()
-    estoque_baixo = Suprimento.query.filter(
-        Suprimento.quantidade_estoque < Suprimento.quantidade_minima
-    ).count()
+    return app.response_class(dados, mimetype='application/json')
+
+def calcular_dashboard():
+    """Calcula o dashboard em uma única consulta agregada"""
+    relatorios = db.session.query(
+        db.func.count(RelatorioFinanceiro.id).label('total_relatorios'),
+        db.func.coalesce(db.func.sum(RelatorioFinanceiro.receita_total), 0).label('receita_total'),
+        db.func.coalesce(db.func.sum(RelatorioFinanceiro.lucro_liquido), 0).label('lucro_total')
+    ).subquery()
+    suprimentos = db.session.query(
+        db.func.count(Suprimento.id).label('total_suprimentos'),
+        db.func.coalesce(db.func.sum(db.case(
+            (Suprimento.quantidade_estoque < Suprimento.quantidade_minima, 1), else_=0
+        )), 0).label('estoque_baixo'),
+        db.func.coalesce(db.func.sum(Suprimento.quantidade_estoque * Suprimento.preco_unitario), 0).label('valor_total_estoque')
+    ).subquery()
     
-    # Cálculo do valor total do estoque
-    suprimentos = Suprimento.query.all()
-    valor_total_estoque = sum(s.quantidade_estoque * s.preco_unitario for s in suprimentos)
+    # Cada subconsulta tem uma linha só; o join em true apenas as coloca lado a lado
+    linha = db.session.query(relatorios, suprimentos).select_from(relatorios).join(suprimentos, db.true()).one()
+    total_relatorios, receita_total, lucro_total = linha.total_relatorios, linha.receita_total, linha.lucro_total
+    total_suprimentos, estoque_baixo, valor_total_estoque = linha.total_suprimentos, linha.estoque_baixo, linha.valor_total_estoque
     
-    return jsonify({
+    return {
         "status": "sucesso",
         "dashboard": {
             "resumo_financeiro": {
@@ -424,7 +1209,7 @@ def dashboard():
                 "percentual_estoque_baixo": float(estoque_baixo / total_suprimentos * 100) if total_suprimentos > 0 else 0
             }
         }
-    })
+    }
 
 # =============================================================================
 # INICIALIZAÇÃO E EXECUÇÃO DA APLICAÇÃO
@@ -433,9 +1218,9 @@ def dashboard():
 if __name__ == '__main__':
     print("🏥 Iniciando Sistema de Gestão Hospitalar - VidaPlus")
     
-    # Criar todas as tabelas
+    # Criar/atualizar as tabelas
     with app.app_context():
-        db.create_all()
+        aplicar_migracoes()
         criar_dados_exemplo()
         print("✅ Banco de dados inicializado com sucesso!") 
     print("\n🚀 Servidor rodando em http://localhost:5000")
@@ -1,8 +1,24 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, g, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import bisect
+import hashlib
+import io
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+import unicodedata
+import zlib
 import jwt
 import os
 
@@ -14,13 +30,112 @@ SECRET_KEY = 'vidaplus-jwt-secret-2024'
 TOKEN_EXPIRATION_HOURS = 8
 
 # Configuração do banco de dados SQLite (mais fácil pra começar)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///vidaplus.db'
+# VIDAPLUS_DATABASE_URI permite apontar para outro arquivo (ex.: nos testes)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('VIDAPLUS_DATABASE_URI', 'sqlite:///vidaplus.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'chave-secreta-vidaplus-2024'
 
+# ===== PERFIL DO SQLITE =====
+# "producao": WAL (leitores não bloqueiam o escritor), synchronous=NORMAL,
+# busy_timeout para esperar o lock em vez de falhar com "database is locked",
+# mmap e cache maiores e chaves estrangeiras ligadas. "padrao" mantém os
+# defaults do SQLite. Os valores podem ser ajustados por variável de ambiente.
+
+SQLITE_PERFIL = os.environ.get('VIDAPLUS_SQLITE_PERFIL', 'producao')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('VIDAPLUS_SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_MB = int(os.environ.get('VIDAPLUS_SQLITE_MMAP_MB', 256))
+SQLITE_CACHE_MB = int(os.environ.get('VIDAPLUS_SQLITE_CACHE_MB', 64))
+DB_POOL_TAMANHO = int(os.environ.get('VIDAPLUS_DB_POOL_TAMANHO', 8))
+DB_POOL_EXTRA = int(os.environ.get('VIDAPLUS_DB_POOL_EXTRA', 8))
+DB_POOL_TIMEOUT_SEGUNDOS = int(os.environ.get('VIDAPLUS_DB_POOL_TIMEOUT', 10))
+
+PERFIS_SQLITE = {
+    'padrao': {},
+    'producao': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+        'mmap_size': SQLITE_MMAP_MB * 1024 * 1024,
+        'cache_size': -SQLITE_CACHE_MB * 1024,  # negativo = KiB
+        'foreign_keys': 'ON',
+        'temp_store': 'MEMORY',
+    },
+}
+
+if SQLITE_PERFIL not in PERFIS_SQLITE:
+    raise RuntimeError(f"VIDAPLUS_SQLITE_PERFIL inválido: {SQLITE_PERFIL} (use {', '.join(PERFIS_SQLITE)})")
+
+if SQLITE_PERFIL == 'producao':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': DB_POOL_TAMANHO,
+        'max_overflow': DB_POOL_EXTRA,
+        'pool_timeout': DB_POOL_TIMEOUT_SEGUNDOS,
+        # O timeout do driver cobre o lock pedido antes do primeiro PRAGMA
+        'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+
+def aplicar_pragmas_sqlite(conexao_dbapi, registro_conexao):
+    cursor = conexao_dbapi.cursor()
+    for pragma, valor in PERFIS_SQLITE[SQLITE_PERFIL].items():
+        cursor.execute(f'PRAGMA {pragma}={valor}')
+    cursor.close()
+
 # Inicializando o banco
 db = SQLAlchemy(app)
 
+with app.app_context():
+    event.listen(db.engine, 'connect', aplicar_pragmas_sqlite)
+
+# ===== HASH DE SENHAS =====
+
+# O PBKDF2 é caro de propósito. Para uma onda de logins não travar as threads
+# que atendem o resto da API, o cálculo roda num pool de processos com fila
+# limitada: acima do limite o login responde 503 em vez de enfileirar sem fim.
+# O custo (iterações) é configurável; senhas com custo diferente do atual são
+# refeitas no próximo login.
+HASH_SENHA_ITERACOES = int(os.environ.get('VIDAPLUS_HASH_ITERACOES', 600000))
+HASH_SENHA_METODO = f'pbkdf2:sha256:{HASH_SENHA_ITERACOES}'
+HASH_POOL_PROCESSOS = int(os.environ.get('VIDAPLUS_HASH_PROCESSOS', os.cpu_count() or 2))
+HASH_FILA_MAXIMA = int(os.environ.get('VIDAPLUS_HASH_FILA_MAXIMA', 64))
+HASH_TIMEOUT_SEGUNDOS = 30
+
+class FilaHashCheia(Exception):
+    pass
+
+_pool_hash = None
+_pool_hash_lock = threading.Lock()
+_vagas_fila_hash = threading.BoundedSemaphore(HASH_FILA_MAXIMA)
+
+def pool_hash():
+    # Criado sob demanda para que cada worker do gunicorn tenha o seu pool
+    global _pool_hash
+    with _pool_hash_lock:
+        if _pool_hash is None:
+            _pool_hash = ProcessPoolExecutor(max_workers=HASH_POOL_PROCESSOS)
+        return _pool_hash
+
+def executar_no_pool_hash(funcao, *args):
+    if not _vagas_fila_hash.acquire(blocking=False):
+        raise FilaHashCheia()
+    try:
+        return pool_hash().submit(funcao, *args).result(timeout=HASH_TIMEOUT_SEGUNDOS)
+    finally:
+        _vagas_fila_hash.release()
+
+def gerar_hash_senha(senha):
+    return executar_no_pool_hash(generate_password_hash, senha, HASH_SENHA_METODO)
+
+def verificar_hash_senha(password_hash, senha):
+    return executar_no_pool_hash(check_password_hash, password_hash, senha)
+
+def hash_senha_desatualizado(password_hash):
+    return password_hash.split('$', 1)[0] != HASH_SENHA_METODO
+
+def resposta_fila_hash_cheia():
+    resposta = jsonify({"erro": "Servidor ocupado, tente novamente em instantes"})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
 # ===== MODELOS DO BANCO DE DADOS =====
 
 class Paciente(db.Model):
@@ -32,6 +147,8 @@ class Paciente(db.Model):
     endereco = db.Column(db.Text)
     data_nascimento = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Sobe a cada edição; é a versão do JSON guardado em cache_fragmentos
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relacionamentos
     consultas = db.relationship('Consulta', backref='paciente_ref', lazy=True)
@@ -49,6 +166,8 @@ class Profissional(db.Model):
     tipo = db.Column(db.String(20), nullable=False) # médico, enfermeiro, técnico
     ativo = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Sobe a cada edição; é a versão do JSON guardado em cache_fragmentos
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relacionamentos
     consultas = db.relationship('Consulta', backref='profissional_ref', lazy=True)
@@ -106,6 +225,7 @@ class Prescricao(db.Model):
     atendimento_online_id = db.Column(db.Integer, db.ForeignKey('atendimento_online.id'), nullable=True)
     consulta_id = db.Column(db.Integer, db.ForeignKey('consulta.id'), nullable=True)
     medicamento = db.Column(db.String(200), nullable=False)
+    medicamento_normalizado = db.Column(db.String(200))  # ver normalizar_medicamento
     dosagem = db.Column(db.String(100), nullable=False)
     frequencia = db.Column(db.String(100), nullable=False) # ex: "8/8 horas", "2x ao dia"
     duracao = db.Column(db.String(50), nullable=False) # ex: "7 dias", "contínuo"
@@ -123,6 +243,54 @@ class AgendaDisponivel(db.Model):
     disponivel = db.Column(db.Boolean, default=True)
     observacoes = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Preenchidos quando o horário é reservado para um paciente
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), nullable=True)
+    consulta_id = db.Column(db.Integer, db.ForeignKey('consulta.id'), nullable=True)
+    atendimento_online_id = db.Column(db.Integer, db.ForeignKey('atendimento_online.id'), nullable=True)
+
+# Versão de cada tabela, incrementada em todo commit que a altera (ver
+# registrar_tabelas_alteradas); alimenta os ETags das listagens e relatórios
+class VersaoDados(db.Model):
+    __tablename__ = 'versao_dados'
+    tabela = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+# Total de consultas por dia e status, mantido a cada agendamento/mudança de status
+class ContagemConsultasDia(db.Model):
+    __tablename__ = 'contagem_consultas_dia'
+    data = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class ContagemAtendimentosHora(db.Model):
+    __tablename__ = 'contagem_atendimentos_hora'
+    hora = db.Column(db.DateTime, primary_key=True)  # data_inicio truncada na hora
+    profissional_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class ProdutividadeMes(db.Model):
+    __tablename__ = 'produtividade_mes'
+    mes = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    profissional_id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), primary_key=True)  # consulta, atendimento_online, prescricao
+    status = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class OcupacaoSetor(db.Model):
+    __tablename__ = 'ocupacao_setor'
+    setor = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    ocupados = db.Column(db.Integer, nullable=False, default=0)
+
+# Quantas prescrições (total e ativas) cada medicamento tem, pelo nome
+# normalizado; mantido ao criar/desativar prescrição e usado no autocomplete
+class MedicamentoFrequencia(db.Model):
+    __tablename__ = 'medicamento_frequencia'
+    nome_normalizado = db.Column(db.String(200), primary_key=True)
+    nome = db.Column(db.String(200), nullable=False)  # grafia da primeira prescrição
+    total = db.Column(db.Integer, nullable=False, default=0)
+    ativas = db.Column(db.Integer, nullable=False, default=0)
 
 class Usuario(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -136,10 +304,10 @@ class Usuario(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = gerar_hash_senha(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verificar_hash_senha(self.password_hash, password)
     
     def generate_token(self):
         payload = {
@@ -159,7 +327,395 @@ class Usuario(db.Model):
             return None
         except jwt.InvalidTokenError:
             return None        
-        
+
+# ===== CACHE EM MEMÓRIA =====
+
+# Cache LRU limitado, com expiração por item e seguro entre threads. Cada
+# worker tem o seu; por isso os TTLs são curtos.
+class CacheTTL:
+    def __init__(self, tamanho_maximo, ttl):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._dados = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def obter(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._dados[chave]
+                self.misses += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return item[1]
+    
+    def guardar(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._dados[chave] = (expira_em, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+    
+    def remover(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+    
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+    
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'itens': len(self._dados),
+                'tamanho_maximo': self.tamanho_maximo,
+                'hits': self.hits,
+                'misses': self.misses,
+                'taxa_acerto': round(self.hits / consultas * 100, 2) if consultas > 0 else 0
+            }
+
+# ===== CACHE DE AUTENTICAÇÃO =====
+
+# Tokens já verificados ficam associados a um "principal" leve (só o que os
+# decoradores precisam), evitando decodificar o JWT e carregar o usuário a cada
+# requisição; uma requisição com o principal em cache não faz nenhum SQL.
+#
+# Desativar um usuário, trocar o cargo ou a senha sobe a versão global das
+# credenciais (linha "usuario:credenciais" em versao_dados, no mesmo commit;
+# ver registrar_objetos_alterados). Cada principal guarda a versão da sua
+# carga e só vale enquanto ela for a versão conhecida pelo worker. O worker
+# onde a alteração foi feita relê a versão logo após o commit; os demais a
+# releem no máximo a cada CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS, que é o
+# atraso máximo para a mudança valer em todos.
+CACHE_PRINCIPAIS_TAMANHO = 10000
+CACHE_PRINCIPAIS_TTL_SEGUNDOS = 60
+CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS = float(os.environ.get('VIDAPLUS_CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS', 2))
+CAMPOS_CREDENCIAIS_USUARIO = ('ativo', 'cargo', 'password_hash')
+CHAVE_VERSAO_CREDENCIAIS = 'usuario:credenciais'
+
+Principal = namedtuple('Principal', ['id', 'username', 'cargo', 'ativo', 'versao'])
+
+cache_principais = CacheTTL(CACHE_PRINCIPAIS_TAMANHO, CACHE_PRINCIPAIS_TTL_SEGUNDOS)
+
+class VersaoCredenciais:
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._versao = None
+        self._lida_em = 0.0
+    
+    def atual(self):
+        with self._lock:
+            if self._versao is None or time.monotonic() - self._lida_em >= self.intervalo:
+                [self._versao] = ler_versoes((CHAVE_VERSAO_CREDENCIAIS,))
+                self._lida_em = time.monotonic()
+            return self._versao
+    
+    def esquecer(self):
+        # Próxima requisição relê do banco (alteração feita neste worker)
+        with self._lock:
+            self._versao = None
+
+versao_credenciais = VersaoCredenciais(CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS)
+
+def credenciais_alteradas(usuario):
+    estado = db.inspect(usuario)
+    return any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_CREDENCIAIS_USUARIO)
+
+# ===== CACHE DE RELATÓRIOS =====
+
+# Resultado do top-N de prescrições ativas por combinação de filtros e versão
+# da tabela prescricao (a mesma do ETag): qualquer escrita, feita em qualquer
+# worker, muda a chave. criar_prescricao e desativar_prescricao ainda limpam o
+# cache local para liberar as entradas antigas.
+CACHE_PRESCRICOES_ATIVAS_TAMANHO = 256
+CACHE_PRESCRICOES_ATIVAS_TTL_SEGUNDOS = 30
+TOP_MEDICAMENTOS_PADRAO = 10
+TOP_MEDICAMENTOS_MAXIMO = 100
+
+cache_prescricoes_ativas = CacheTTL(CACHE_PRESCRICOES_ATIVAS_TAMANHO, CACHE_PRESCRICOES_ATIVAS_TTL_SEGUNDOS)
+
+# ===== CACHE DE FRAGMENTOS JSON =====
+
+# Pacientes e profissionais mudam pouco, mas cada listagem serializava todos os
+# registros de novo. O JSON de cada registro fica guardado já codificado junto
+# com a versão da linha (coluna versao): as listagens leem só (id, versao),
+# juntam os fragmentos que estão no cache e buscam no banco apenas os que
+# faltam ou mudaram. As rotas que editam/excluem o registro sobem a versão
+# (invalidar_fragmento), o que vale também para os outros workers.
+# Limitado por quantidade de itens e por bytes (LRU).
+CACHE_FRAGMENTOS_ITENS = int(os.environ.get('VIDAPLUS_CACHE_FRAGMENTOS_ITENS', 100000))
+CACHE_FRAGMENTOS_MB = int(os.environ.get('VIDAPLUS_CACHE_FRAGMENTOS_MB', 32))
+
+class CacheFragmentos:
+    def __init__(self, maximo_itens, maximo_bytes):
+        self.maximo_itens = maximo_itens
+        self.maximo_bytes = maximo_bytes
+        self._dados = OrderedDict()  # (tabela, id) -> (versao, fragmento)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.descartes = 0
+    
+    def obter_varios(self, tabela, ids_versoes):
+        # Uma única aquisição do lock para a página inteira: {id: fragmento} dos que estão em dia
+        encontrados = {}
+        obter, mover = self._dados.get, self._dados.move_to_end
+        with self._lock:
+            for registro_id, versao in ids_versoes:
+                chave = (tabela, registro_id)
+                item = obter(chave)
+                if item is not None and item[0] == versao:
+                    mover(chave)
+                    encontrados[registro_id] = item[1]
+            self.hits += len(encontrados)
+            self.misses += len(ids_versoes) - len(encontrados)
+        return encontrados
+    
+    def guardar(self, tabela, registro_id, versao, fragmento):
+        chave = (tabela, registro_id)
+        with self._lock:
+            anterior = self._dados.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= len(anterior[1])
+            self._dados[chave] = (versao, fragmento)
+            self.bytes += len(fragmento)
+            while len(self._dados) > self.maximo_itens or self.bytes > self.maximo_bytes:
+                _, (_, descartado) = self._dados.popitem(last=False)
+                self.bytes -= len(descartado)
+                self.descartes += 1
+    
+    def remover(self, tabela, registro_id):
+        with self._lock:
+            item = self._dados.pop((tabela, registro_id), None)
+            if item is not None:
+                self.bytes -= len(item[1])
+    
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+            self.bytes = 0
+    
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'itens': len(self._dados),
+                'bytes': self.bytes,
+                'maximo_itens': self.maximo_itens,
+                'maximo_bytes': self.maximo_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'descartes': self.descartes,
+                'taxa_acerto': round(self.hits / consultas * 100, 2) if consultas > 0 else 0
+            }
+
+cache_fragmentos = CacheFragmentos(CACHE_FRAGMENTOS_ITENS, CACHE_FRAGMENTOS_MB * 1024 * 1024)
+
+def invalidar_fragmento(registro):
+    modelo = type(registro)
+    registro.versao = modelo.versao + 1
+    cache_fragmentos.remover(modelo.__tablename__, registro.id)
+
+# ===== VERSÕES DAS TABELAS =====
+
+# Toda escrita feita pela sessão (objetos adicionados/alterados/removidos no
+# flush e INSERT/UPDATE/DELETE via session.execute) marca a tabela; no commit
+# as versões dessas tabelas sobem na mesma transação. Comandos SQL em texto
+# (executar_sql) não são vistos: quem usa deve chamar incrementar_versao.
+
+# Upsert em Core (sem passar pelos eventos do ORM), um executemany para todas as tabelas
+_SQL_INCREMENTAR_VERSAO = sqlite_insert(VersaoDados.__table__).on_conflict_do_update(
+    index_elements=['tabela'],
+    set_={'versao': VersaoDados.__table__.c.versao + 1}
+)
+
+def incrementar_versao(*tabelas):
+    db.session.connection().execute(
+        _SQL_INCREMENTAR_VERSAO, [{'tabela': tabela, 'versao': 1} for tabela in tabelas]
+    )
+
+TABELAS_SEM_VERSAO = {'versao_dados', 'versao_schema'}
+
+# Sobe quando algum paciente muda de nome (o quadro de leitos mostra o nome;
+# cadastros novos não mexem nele)
+CHAVE_VERSAO_NOMES_PACIENTES = 'paciente:nome'
+
+def tabelas_alteradas(sessao):
+    return sessao.info.setdefault('tabelas_alteradas', set())
+
+@event.listens_for(db.session, 'before_flush')
+def registrar_objetos_alterados(sessao, contexto_flush, instancias):
+    alteradas = tabelas_alteradas(sessao)
+    for objeto in itertools.chain(sessao.new, sessao.deleted):
+        alteradas.add(objeto.__table__.name)
+    for objeto in sessao.dirty:
+        if sessao.is_modified(objeto):
+            alteradas.add(objeto.__table__.name)
+            if isinstance(objeto, Usuario) and credenciais_alteradas(objeto):
+                alteradas.add(CHAVE_VERSAO_CREDENCIAIS)
+            if isinstance(objeto, Paciente) and db.inspect(objeto).attrs.nome.history.has_changes():
+                alteradas.add(CHAVE_VERSAO_NOMES_PACIENTES)
+    for objeto in sessao.deleted:
+        if isinstance(objeto, Usuario):
+            alteradas.add(CHAVE_VERSAO_CREDENCIAIS)
+    alteradas -= TABELAS_SEM_VERSAO
+
+@event.listens_for(db.session, 'do_orm_execute')
+def registrar_comandos_alterados(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        tabela = estado.statement.table.name
+        if tabela not in TABELAS_SEM_VERSAO:
+            tabelas_alteradas(estado.session).add(tabela)
+
+@event.listens_for(db.session, 'before_commit')
+def registrar_tabelas_alteradas(sessao):
+    sessao.flush()
+    alteradas = sessao.info.pop('tabelas_alteradas', None)
+    if alteradas:
+        incrementar_versao(*sorted(alteradas))
+        if CHAVE_VERSAO_CREDENCIAIS in alteradas:
+            sessao.info['credenciais_alteradas'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def reler_versao_credenciais(sessao):
+    if sessao.info.pop('credenciais_alteradas', False):
+        versao_credenciais.esquecer()
+
+@event.listens_for(db.session, 'after_rollback')
+def descartar_tabelas_alteradas(sessao):
+    sessao.info.pop('tabelas_alteradas', None)
+    sessao.info.pop('credenciais_alteradas', None)
+
+def ler_versoes(tabelas):
+    versoes = dict(db.session.query(VersaoDados.tabela, VersaoDados.versao).filter(
+        VersaoDados.tabela.in_(tabelas)
+    ).all())
+    return tuple(versoes.get(tabela, 0) for tabela in tabelas)
+
+def versoes_tabelas(*tabelas):
+    # Lidas uma vez por requisição para cada conjunto de tabelas
+    versoes = g.setdefault('versoes_tabelas', {})
+    if tabelas not in versoes:
+        versoes[tabelas] = ler_versoes(tabelas)
+    return versoes[tabelas]
+
+def carimbo_versoes(*tabelas):
+    return '|'.join(f'{tabela}:{versao}' for tabela, versao in zip(tabelas, versoes_tabelas(*tabelas)))
+
+# ===== COMPRESSÃO DAS RESPOSTAS =====
+
+# JSON e NDJSON vão comprimidos (gzip ou deflate, conforme Accept-Encoding).
+# Respostas normais só acima do tamanho mínimo; nas em streaming o tamanho não
+# é conhecido, então o que saiu do gerador é comprimido e enviado (Z_SYNC_FLUSH)
+# a cada COMPRESSAO_BLOCO_STREAMING bytes, sem esperar o fim da exportação.
+COMPRESSAO_NIVEL = int(os.environ.get('VIDAPLUS_COMPRESSAO_NIVEL', 6))
+COMPRESSAO_TAMANHO_MINIMO = int(os.environ.get('VIDAPLUS_COMPRESSAO_TAMANHO_MINIMO', 1024))
+COMPRESSAO_BLOCO_STREAMING = 16 * 1024
+COMPRESSAO_TIPOS = {'application/json', 'application/x-ndjson'}
+
+# codificação -> wbits do zlib ("deflate" no HTTP é o formato zlib)
+CODIFICACOES_COMPRESSAO = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+def codificacao_aceita():
+    for codificacao in CODIFICACOES_COMPRESSAO:
+        if request.accept_encodings[codificacao]:
+            return codificacao
+    return None
+
+def comprimir_em_streaming(original, compressor):
+    # fecha o gerador original junto (stream_with_context precisa disso para
+    # encerrar o contexto da requisição no lugar certo)
+    try:
+        pendente = 0
+        for pedaco in original:
+            if isinstance(pedaco, str):
+                pedaco = pedaco.encode('utf-8')
+            comprimido = compressor.compress(pedaco)
+            pendente += len(pedaco)
+            if pendente >= COMPRESSAO_BLOCO_STREAMING:
+                comprimido += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pendente = 0
+            if comprimido:
+                yield comprimido
+        yield compressor.flush()
+    finally:
+        if hasattr(original, 'close'):
+            original.close()
+
+@app.after_request
+def comprimir_resposta(resposta):
+    if COMPRESSAO_NIVEL <= 0 or resposta.mimetype not in COMPRESSAO_TIPOS:
+        return resposta
+    
+    resposta.vary.add('Accept-Encoding')
+    if (request.method == 'HEAD' or resposta.status_code < 200 or resposta.status_code in (204, 206, 304)
+            or 'Content-Encoding' in resposta.headers):
+        return resposta
+    
+    codificacao = codificacao_aceita()
+    if codificacao is None:
+        return resposta
+    
+    compressor = zlib.compressobj(COMPRESSAO_NIVEL, zlib.DEFLATED, CODIFICACOES_COMPRESSAO[codificacao])
+    if resposta.is_streamed:
+        resposta.response = comprimir_em_streaming(resposta.response, compressor)
+        resposta.direct_passthrough = False
+        resposta.headers.pop('Content-Length', None)
+    else:
+        dados = resposta.get_data()
+        if len(dados) < COMPRESSAO_TAMANHO_MINIMO:
+            return resposta
+        resposta.set_data(compressor.compress(dados) + compressor.flush())
+    
+    resposta.headers['Content-Encoding'] = codificacao
+    etag, fraco = resposta.get_etag()
+    if etag:
+        resposta.set_etag(f'{etag}-{codificacao}', weak=fraco)
+    return resposta
+
+# ===== GET CONDICIONAL (ETAG / 304) =====
+
+# O ETag é calculado antes de qualquer leitura dos dados: versões das tabelas
+# que a resposta usa + rota + parâmetros + cargo de quem chama (+ data de hoje,
+# pois alguns relatórios usam o dia atual como padrão). Se o cliente mandar
+# If-None-Match com o mesmo valor, a resposta é 304 sem corpo.
+def get_condicional(*tabelas):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            usuario = getattr(request, 'current_user', None)
+            chave = '\n'.join([
+                carimbo_versoes(*tabelas),
+                request.path,
+                '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True))),
+                request.headers.get('Accept', ''),
+                usuario.cargo if usuario else '',
+                datetime.now().date().isoformat(),
+            ])
+            etag = hashlib.sha1(chave.encode()).hexdigest()
+            
+            # A resposta comprimida leva o ETag com sufixo da codificação
+            for variante in (etag, *(f'{etag}-{codificacao}' for codificacao in CODIFICACOES_COMPRESSAO)):
+                if request.if_none_match.contains(variante):
+                    resposta = Response(status=304)
+                    resposta.set_etag(variante)
+                    return resposta
+            
+            resposta = app.make_response(f(*args, **kwargs))
+            if resposta.status_code == 200:
+                resposta.set_etag(etag)
+            return resposta
+        return decorated
+    return decorator
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -172,15 +728,29 @@ def token_required(f):
             if token.startswith('Bearer '):
                 token = token.split(' ')[1]
             
-            payload = Usuario.verify_token(token)
-            if not payload:
-                return jsonify({'erro': 'Token inválido ou expirado'}), 401
+            versao = versao_credenciais.atual()
+            principal = cache_principais.obter(token)
+            if principal is not None and principal.versao != versao:
+                principal = None
             
-            usuario = Usuario.query.get(payload['user_id'])
-            if not usuario or not usuario.ativo:
-                return jsonify({'erro': 'Usuário inativo'}), 401
+            if principal is None:
+                payload = Usuario.verify_token(token)
+                if not payload:
+                    return jsonify({'erro': 'Token inválido ou expirado'}), 401
+                
+                # A versão foi lida antes do usuário: se ele mudar no meio, o
+                # principal fica com a versão antiga e é recarregado depois
+                usuario = Usuario.query.get(payload['user_id'])
+                if not usuario or not usuario.ativo:
+                    return jsonify({'erro': 'Usuário inativo'}), 401
+                
+                principal = Principal(usuario.id, usuario.username, usuario.cargo, usuario.ativo, versao)
+                
+                # O token nunca fica no cache depois de expirar
+                ttl = min(CACHE_PRINCIPAIS_TTL_SEGUNDOS, payload['exp'] - time.time())
+                cache_principais.guardar(token, principal, ttl)
             
-            request.current_user = usuario
+            request.current_user = principal
             
         except Exception as e:
             return jsonify({'erro': 'Erro na validação do token'}), 401
@@ -204,6 +774,542 @@ def medico_required(f):
         return f(*args, **kwargs)
     return decorated        
 
+# ===== PAGINAÇÃO =====
+
+# Toda listagem é paginada por cursor (keyset no id, que cresce junto com
+# created_at), então uma página custa o mesmo independente do tamanho da tabela.
+LIMITE_PAGINA_PADRAO = 50
+LIMITE_PAGINA_MAXIMO = 500
+
+def parametros_paginacao():
+    limite = request.args.get('limit', LIMITE_PAGINA_PADRAO)
+    cursor = request.args.get('cursor')
+    try:
+        limite = int(limite)
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        raise ValueError("Parâmetros 'limit' e 'cursor' devem ser inteiros")
+    
+    # O tamanho máximo da página é imposto pelo servidor
+    limite = max(1, min(limite, LIMITE_PAGINA_MAXIMO))
+    return limite, cursor
+
+def paginar(query, coluna_id):
+    limite, cursor = parametros_paginacao()
+    
+    if cursor is not None:
+        query = query.filter(coluna_id > cursor)
+    
+    # Busca um registro a mais só para saber se existe próxima página
+    registros = query.order_by(coluna_id).limit(limite + 1).all()
+    next_cursor = None
+    if len(registros) > limite:
+        registros = registros[:limite]
+        next_cursor = str(registros[-1].id)
+    
+    return registros, next_cursor
+
+def resposta_paginada(resultado, next_cursor):
+    return jsonify({
+        'itens': resultado,
+        'total_pagina': len(resultado),
+        'next_cursor': next_cursor
+    })
+
+# ===== RESPOSTAS EM STREAMING (NDJSON) =====
+
+# Com "?stream=1" ou "Accept: application/x-ndjson" as listagens devolvem todos
+# os registros (a partir do cursor, se houver) como NDJSON, uma linha por
+# registro, lidos do banco em lotes. A memória fica constante e o primeiro
+# byte sai antes do fim da consulta, o que permite exportações grandes.
+TAMANHO_LOTE_STREAM = 1000
+
+def quer_stream():
+    return request.args.get('stream') == '1' or \
+        'application/x-ndjson' in request.headers.get('Accept', '')
+
+def resposta_ndjson(query, coluna_id, serializar):
+    cursor = parametros_paginacao()[1]
+    if cursor is not None:
+        query = query.filter(coluna_id > cursor)
+    query = query.order_by(coluna_id)
+    
+    def gerar():
+        lote = []
+        for linha in query.yield_per(TAMANHO_LOTE_STREAM):
+            lote.append(json.dumps(serializar(linha), ensure_ascii=False))
+            if len(lote) >= TAMANHO_LOTE_STREAM:
+                yield '\n'.join(lote) + '\n'
+                lote = []
+        if lote:
+            yield '\n'.join(lote) + '\n'
+    
+    return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+# ===== CONSULTAS DAS LISTAGENS =====
+
+# As listagens que mostram nome de paciente/profissional fazem o JOIN na mesma
+# consulta; as colunas efetivamente lidas são escolhidas pelo serializador
+# (with_entities). Assim o número de SELECTs por requisição não cresce com o
+# número de linhas.
+
+def query_listagem_consultas():
+    return db.session.query(Consulta
+    ).join(Paciente, Consulta.paciente_id == Paciente.id
+    ).join(Profissional, Consulta.profissional_id == Profissional.id)
+
+def query_listagem_exames():
+    return db.session.query(Exame).join(Paciente, Exame.paciente_id == Paciente.id)
+
+def query_listagem_atendimentos_online():
+    return db.session.query(AtendimentoOnline
+    ).join(Paciente, AtendimentoOnline.paciente_id == Paciente.id
+    ).join(Profissional, AtendimentoOnline.profissional_id == Profissional.id)
+
+def query_listagem_prescricoes():
+    return db.session.query(Prescricao
+    ).join(Paciente, Prescricao.paciente_id == Paciente.id
+    ).join(Profissional, Prescricao.profissional_id == Profissional.id)
+
+def query_listagem_agenda():
+    return db.session.query(AgendaDisponivel
+    ).join(Profissional, AgendaDisponivel.profissional_id == Profissional.id)
+
+# ===== SERIALIZADORES =====
+
+# Cada listagem tem um serializador registrado com seus campos (nome no JSON,
+# coluna e formatador). Com "?fields=id,nome,cpf" só essas colunas são lidas do
+# banco e codificadas; o "id" sempre vem, pois é a chave do cursor. A função que
+# converte a linha em dicionário é montada uma vez por combinação de campos.
+
+# isoformat é bem mais rápido que strftime e gera o mesmo texto
+def formatar_data(valor):
+    return valor.isoformat()                       # YYYY-MM-DD
+
+def formatar_data_hora(valor):
+    return valor.isoformat(' ', 'minutes')         # YYYY-MM-DD HH:MM
+
+def formatar_hora(valor):
+    return valor.isoformat('minutes')              # HH:MM
+
+class Serializador:
+    def __init__(self, campos):
+        self.campos = {nome: (coluna, formatador) for nome, coluna, formatador in campos}
+        self.todos = tuple(nome for nome, _, _ in campos)
+        self._compilados = {}
+    
+    def campos_pedidos(self):
+        fields = request.args.get('fields')
+        if not fields:
+            return self.todos
+        
+        pedidos = [campo.strip() for campo in fields.split(',') if campo.strip()]
+        desconhecidos = [campo for campo in pedidos if campo not in self.campos]
+        if desconhecidos:
+            raise ValueError(f"Campos inválidos em 'fields': {', '.join(desconhecidos)}")
+        
+        # Mantém a ordem do registro e garante o id na primeira posição
+        return tuple(nome for nome in self.todos if nome == 'id' or nome in pedidos)
+    
+    def colunas(self, nomes):
+        return [self.campos[nome][0].label(nome) for nome in nomes]
+    
+    def compilar(self, nomes):
+        serializar = self._compilados.get(nomes)
+        if serializar is None:
+            serializar = self._montar(nomes)
+            self._compilados[nomes] = serializar
+        return serializar
+    
+    def _montar(self, nomes):
+        formatados = [
+            (indice, self.campos[nome][1])
+            for indice, nome in enumerate(nomes)
+            if self.campos[nome][1] is not None
+        ]
+        
+        if not formatados:
+            return lambda linha: dict(zip(nomes, linha))
+        
+        def serializar(linha):
+            valores = list(linha)
+            for indice, formatador in formatados:
+                valor = valores[indice]
+                if valor is not None:
+                    valores[indice] = formatador(valor)
+            return dict(zip(nomes, valores))
+        
+        return serializar
+
+SERIALIZADORES = {
+    'paciente': Serializador([
+        ('id', Paciente.id, None),
+        ('nome', Paciente.nome, None),
+        ('cpf', Paciente.cpf, None),
+        ('telefone', Paciente.telefone, None),
+        ('email', Paciente.email, None),
+        ('endereco', Paciente.endereco, None),
+        ('data_nascimento', Paciente.data_nascimento, formatar_data),
+    ]),
+    'profissional': Serializador([
+        ('id', Profissional.id, None),
+        ('nome', Profissional.nome, None),
+        ('especialidade', Profissional.especialidade, None),
+        ('crm_coren', Profissional.crm_coren, None),
+        ('tipo', Profissional.tipo, None),
+        ('telefone', Profissional.telefone, None),
+        ('email', Profissional.email, None),
+    ]),
+    'consulta': Serializador([
+        ('id', Consulta.id, None),
+        ('paciente', Paciente.nome, None),
+        ('profissional', Profissional.nome, None),
+        ('data_consulta', Consulta.data_consulta, formatar_data_hora),
+        ('tipo', Consulta.tipo, None),
+        ('status', Consulta.status, None),
+        ('observacoes', Consulta.observacoes, None),
+    ]),
+    'exame': Serializador([
+        ('id', Exame.id, None),
+        ('paciente', Paciente.nome, None),
+        ('tipo_exame', Exame.tipo_exame, None),
+        ('data_exame', Exame.data_exame, formatar_data_hora),
+        ('status', Exame.status, None),
+        ('resultado', Exame.resultado, None),
+    ]),
+    'atendimento_online': Serializador([
+        ('id', AtendimentoOnline.id, None),
+        ('paciente', Paciente.nome, None),
+        ('profissional', Profissional.nome, None),
+        ('data_inicio', AtendimentoOnline.data_inicio, formatar_data_hora),
+        ('data_fim', AtendimentoOnline.data_fim, formatar_data_hora),
+        ('status', AtendimentoOnline.status, None),
+        ('link_videochamada', AtendimentoOnline.link_videochamada, None),
+        ('sintomas_relatados', AtendimentoOnline.sintomas_relatados, None),
+        ('diagnostico', AtendimentoOnline.diagnostico, None),
+        ('observacoes', AtendimentoOnline.observacoes, None),
+    ]),
+    'prescricao': Serializador([
+        ('id', Prescricao.id, None),
+        ('paciente', Paciente.nome, None),
+        ('profissional', Profissional.nome, None),
+        ('medicamento', Prescricao.medicamento, None),
+        ('dosagem', Prescricao.dosagem, None),
+        ('frequencia', Prescricao.frequencia, None),
+        ('duracao', Prescricao.duracao, None),
+        ('instrucoes', Prescricao.instrucoes, None),
+        ('data_prescricao', Prescricao.created_at, formatar_data_hora),
+    ]),
+    'agenda': Serializador([
+        ('id', AgendaDisponivel.id, None),
+        ('profissional', Profissional.nome, None),
+        ('especialidade', Profissional.especialidade, None),
+        ('data', AgendaDisponivel.data, formatar_data),
+        ('hora_inicio', AgendaDisponivel.hora_inicio, formatar_hora),
+        ('hora_fim', AgendaDisponivel.hora_fim, formatar_hora),
+        ('tipo_atendimento', AgendaDisponivel.tipo_atendimento, None),
+        ('observacoes', AgendaDisponivel.observacoes, None),
+    ]),
+}
+
+def responder_listagem(nome_serializador, query, coluna_id):
+    serializador = SERIALIZADORES[nome_serializador]
+    nomes = serializador.campos_pedidos()
+    if nome_serializador in MODELOS_FRAGMENTOS and nomes == serializador.todos and not quer_stream():
+        return responder_listagem_fragmentos(nome_serializador, query, coluna_id)
+    
+    query = query.with_entities(*serializador.colunas(nomes))
+    serializar = serializador.compilar(nomes)
+    
+    if quer_stream():
+        return resposta_ndjson(query, coluna_id, serializar)
+    
+    linhas, next_cursor = paginar(query, coluna_id)
+    resultado = [serializar(linha) for linha in linhas]
+    return resposta_paginada(resultado, next_cursor)
+
+# Mesmo formato do jsonify (chaves ordenadas, sem espaços), para que a resposta
+# montada com fragmentos seja idêntica à serializada na hora
+def codificar_json(valor):
+    return json.dumps(
+        valor, ensure_ascii=app.json.ensure_ascii, sort_keys=app.json.sort_keys, separators=(',', ':')
+    ).encode('utf-8')
+
+def resposta_json_montada(envelope, chave, codificado):
+    itens = sorted(envelope.items()) if app.json.sort_keys else envelope.items()
+    partes = [
+        codificar_json(nome) + b':' + (codificado if nome == chave else codificar_json(valor))
+        for nome, valor in itens
+    ]
+    return Response(b'{' + b','.join(partes) + b'}\n', mimetype='application/json')
+
+# Registros cujo JSON completo fica em cache_fragmentos (nome do serializador -> modelo)
+MODELOS_FRAGMENTOS = {'paciente': Paciente, 'profissional': Profissional}
+
+def fragmentos_por_versao(nome_serializador, ids_versoes):
+    modelo = MODELOS_FRAGMENTOS[nome_serializador]
+    tabela = modelo.__tablename__
+    fragmentos = cache_fragmentos.obter_varios(tabela, ids_versoes)
+    faltando = [registro_id for registro_id, _ in ids_versoes if registro_id not in fragmentos]
+    
+    if faltando:
+        serializador = SERIALIZADORES[nome_serializador]
+        serializar = serializador.compilar(serializador.todos)
+        # A versão é lida na mesma linha dos dados, então o fragmento guardado
+        # nunca fica com uma versão mais nova que o conteúdo
+        for linha in db.session.query(
+            *serializador.colunas(serializador.todos), modelo.versao
+        ).filter(modelo.id.in_(faltando)):
+            fragmento = codificar_json(serializar(linha[:-1]))
+            cache_fragmentos.guardar(tabela, linha.id, linha.versao, fragmento)
+            fragmentos[linha.id] = fragmento
+    
+    # Registros excluídos entre as duas leituras ficam de fora
+    return [fragmentos[registro_id] for registro_id, _ in ids_versoes if registro_id in fragmentos]
+
+def responder_listagem_fragmentos(nome_serializador, query, coluna_id):
+    modelo = MODELOS_FRAGMENTOS[nome_serializador]
+    limite, cursor = parametros_paginacao()
+    query = query.with_entities(modelo.id, modelo.versao)
+    if cursor is not None:
+        query = query.filter(coluna_id > cursor)
+    
+    # Só (id, versao), executado direto no Core: sem o custo de montar objetos do ORM por linha
+    linhas = db.session.connection().execute(query.order_by(coluna_id).limit(limite + 1).statement).all()
+    next_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        next_cursor = str(linhas[-1].id)
+    
+    fragmentos = fragmentos_por_versao(nome_serializador, linhas)
+    return resposta_json_montada(
+        {'itens': None, 'total_pagina': len(fragmentos), 'next_cursor': next_cursor},
+        'itens', b'[' + b','.join(fragmentos) + b']'
+    )
+
+# ===== ÍNDICE DE OCUPAÇÃO DOS LEITOS =====
+
+# O quadro de leitos é a tela mais consultada (postos de enfermagem atualizam a
+# cada poucos segundos). Ele é mantido em memória, carregado com uma única
+# consulta e atualizado por ocupar_leito/liberar_leito/cadastrar_leito/alocar_leito.
+# Cada worker tem o seu índice e guarda a versão de TABELAS_QUADRO_LEITOS da
+# carga; só uma escrita em leito ou a troca de nome de um paciente feita por
+# outro processo força a recarga. As escritas deste worker leem as versões na
+# própria transação (depois do UPDATE, com o lock de escrita do SQLite) e, se
+# o índice estava nelas, ele passa para a versão seguinte junto com a alteração.
+TABELAS_QUADRO_LEITOS = ('leito', CHAVE_VERSAO_NOMES_PACIENTES)
+
+def versoes_quadro_leitos():
+    return ler_versoes(TABELAS_QUADRO_LEITOS)
+
+def formatar_linha_leito(leito_id, numero, setor, ocupado, paciente_id, paciente_nome, data_ocupacao):
+    return {
+        'id': leito_id,
+        'numero': numero,
+        'setor': setor,
+        'ocupado': bool(ocupado),
+        'paciente_id': paciente_id,
+        'paciente_nome': paciente_nome,
+        'data_ocupacao': formatar_data_hora(data_ocupacao) if data_ocupacao else None
+    }
+
+def query_quadro_leitos():
+    return db.session.query(
+        Leito.id, Leito.numero, Leito.setor, Leito.ocupado,
+        Leito.paciente_id, Paciente.nome, Leito.data_ocupacao
+    ).outerjoin(Paciente, Leito.paciente_id == Paciente.id)
+
+def serializar_linha_leito(linha):
+    return formatar_linha_leito(*linha)
+
+class IndiceOcupacaoLeitos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leitos = {}            # leito_id -> linha do quadro
+        self._ids = []               # ids em ordem crescente (para o cursor)
+        self._livres_por_setor = {}  # setor -> set de leito_id livres
+        self._versao = None          # versões de TABELAS_QUADRO_LEITOS refletidas no índice
+    
+    def _carregar(self, versao):
+        linhas = query_quadro_leitos().order_by(Leito.id).all()
+        
+        leitos = {}
+        livres_por_setor = {}
+        for linha in linhas:
+            leitos[linha[0]] = formatar_linha_leito(*linha)
+            if not linha[3]:
+                livres_por_setor.setdefault(linha[2], set()).add(linha[0])
+        
+        self._leitos = leitos
+        self._ids = [linha[0] for linha in linhas]
+        self._livres_por_setor = livres_por_setor
+        self._versao = versao
+    
+    def _garantir_carregado(self):
+        versao = versoes_tabelas(*TABELAS_QUADRO_LEITOS)
+        if versao != self._versao:
+            self._carregar(versao)
+    
+    def _acompanhar_commit(self, versoes_antes):
+        # O commit da escrita sobe só a versão de "leito"
+        if versoes_antes == self._versao:
+            self._versao = (versoes_antes[0] + 1,) + versoes_antes[1:]
+    
+    def quadro(self, cursor, limite):
+        with self._lock:
+            self._garantir_carregado()
+            inicio = bisect.bisect_right(self._ids, cursor) if cursor is not None else 0
+            ids = self._ids[inicio:inicio + limite + 1]
+            linhas = [self._leitos[i] for i in ids[:limite]]
+        
+        next_cursor = str(ids[limite - 1]) if len(ids) > limite else None
+        return linhas, next_cursor
+    
+    def livres(self, setor):
+        with self._lock:
+            self._garantir_carregado()
+            return sorted(self._livres_por_setor.get(setor, ()))
+    
+    def adicionar(self, leito, versoes_antes):
+        with self._lock:
+            if self._versao is None:
+                return
+            self._leitos[leito.id] = formatar_linha_leito(
+                leito.id, leito.numero, leito.setor, False, None, None, None
+            )
+            bisect.insort(self._ids, leito.id)
+            self._livres_por_setor.setdefault(leito.setor, set()).add(leito.id)
+            self._acompanhar_commit(versoes_antes)
+    
+    def ocupar(self, leito, paciente, versoes_antes):
+        with self._lock:
+            if self._versao is None:
+                return
+            self._leitos[leito.id] = formatar_linha_leito(
+                leito.id, leito.numero, leito.setor, True, paciente.id, paciente.nome, leito.data_ocupacao
+            )
+            self._livres_por_setor.get(leito.setor, set()).discard(leito.id)
+            self._acompanhar_commit(versoes_antes)
+    
+    def liberar(self, leito, versoes_antes):
+        with self._lock:
+            if self._versao is None:
+                return
+            self._leitos[leito.id] = formatar_linha_leito(
+                leito.id, leito.numero, leito.setor, False, None, None, None
+            )
+            self._livres_por_setor.setdefault(leito.setor, set()).add(leito.id)
+            self._acompanhar_commit(versoes_antes)
+    
+    def descartar_livre(self, setor, leito_id):
+        # Leito que outro worker ocupou: sai da lista de livres até a próxima recarga
+        with self._lock:
+            self._livres_por_setor.get(setor, set()).discard(leito_id)
+
+indice_leitos = IndiceOcupacaoLeitos()
+
+# ===== CONTADORES =====
+
+# Contadores atualizados na mesma transação da escrita que os altera, para que
+# os relatórios leiam poucos registros prontos em vez de agregar o histórico.
+
+def contabilizar_consulta(consulta, status, delta):
+    db.session.execute(
+        sqlite_insert(ContagemConsultasDia).values(
+            data=consulta.data_consulta.date(), status=status, total=delta
+        ).on_conflict_do_update(
+            index_elements=['data', 'status'],
+            set_={'total': ContagemConsultasDia.total + delta}
+        )
+    )
+    contabilizar_produtividade(consulta.data_consulta, consulta.profissional_id, 'consulta', status, delta)
+
+# Contagem mensal por profissional usada pelo relatório de produtividade
+def contabilizar_produtividade(data, profissional_id, tipo, status, delta):
+    db.session.execute(
+        sqlite_insert(ProdutividadeMes).values(
+            mes=data.strftime('%Y-%m'), profissional_id=profissional_id,
+            tipo=tipo, status=status, total=delta
+        ).on_conflict_do_update(
+            index_elements=['mes', 'profissional_id', 'tipo', 'status'],
+            set_={'total': ProdutividadeMes.total + delta}
+        )
+    )
+
+def hora_do_atendimento(data_inicio):
+    return data_inicio.replace(minute=0, second=0, microsecond=0)
+
+# Contagem por (hora, profissional, status) usada pelo relatório de atendimentos online
+def contabilizar_atendimento_online(data_inicio, profissional_id, status, delta):
+    db.session.execute(
+        sqlite_insert(ContagemAtendimentosHora).values(
+            hora=hora_do_atendimento(data_inicio), profissional_id=profissional_id,
+            status=status, total=delta
+        ).on_conflict_do_update(
+            index_elements=['hora', 'profissional_id', 'status'],
+            set_={'total': ContagemAtendimentosHora.total + delta}
+        )
+    )
+    contabilizar_produtividade(data_inicio, profissional_id, 'atendimento_online', status, delta)
+
+# Agrupamentos da série temporal do relatório (semana começa na segunda-feira)
+PERIODOS_ATENDIMENTOS = {
+    'dia': lambda coluna: db.func.date(coluna),
+    'semana': lambda coluna: db.func.date(coluna, '-6 days', 'weekday 1'),
+    'mes': lambda coluna: db.func.strftime('%Y-%m', coluna),
+}
+
+def estatisticas_atendimentos(contagens):
+    total = sum(contagens.values())
+    finalizados = contagens.get('finalizado', 0)
+    return {
+        'total_atendimentos': total,
+        'finalizados': finalizados,
+        'cancelados': contagens.get('cancelado', 0),
+        'em_andamento': contagens.get('em_andamento', 0),
+        'taxa_conclusao': round((finalizados / total) * 100, 2) if total > 0 else 0
+    }
+
+# Resumo de ocupação por setor, atualizado na mesma transação que altera o leito
+def contabilizar_leito(setor, total=0, ocupados=0):
+    db.session.execute(
+        sqlite_insert(OcupacaoSetor).values(
+            setor=setor, total=total, ocupados=ocupados
+        ).on_conflict_do_update(
+            index_elements=['setor'],
+            set_={
+                'total': OcupacaoSetor.total + total,
+                'ocupados': OcupacaoSetor.ocupados + ocupados,
+            }
+        )
+    )
+
+# "Amoxicilina  500mg", "amoxicilina 500 MG" e "Amoxicilína 500mg" viram a
+# mesma chave: sem acentos, minúsculas e espaços simples
+def normalizar_medicamento(nome):
+    sem_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', nome) if not unicodedata.combining(c)
+    )
+    return ' '.join(sem_acentos.lower().split())
+
+# Frequência por medicamento, atualizada na mesma transação que cria/desativa a prescrição
+def contabilizar_medicamento(nome, total=0, ativas=0):
+    db.session.execute(
+        sqlite_insert(MedicamentoFrequencia).values(
+            nome_normalizado=normalizar_medicamento(nome), nome=nome.strip(), total=total, ativas=ativas
+        ).on_conflict_do_update(
+            index_elements=['nome_normalizado'],
+            set_={
+                'total': MedicamentoFrequencia.total + total,
+                'ativas': MedicamentoFrequencia.ativas + ativas,
+            }
+        )
+    )
+
+# Limite superior para buscar um prefixo como intervalo num índice: '123' -> '124'
+def fim_do_prefixo(prefixo):
+    return prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+
 # ===== ROTAS DA API =====
 
 @app.route('/')
@@ -220,21 +1326,12 @@ def listar_pacientes_protegido():
 
 
 @app.route('/pacientes', methods=['GET'])
+@get_condicional('paciente')
 def listar_pacientes():
     try:
-        pacientes = Paciente.query.all()
-        resultado = []
-        for p in pacientes:
-            resultado.append({
-                'id': p.id,
-                'nome': p.nome,
-                'cpf': p.cpf,
-                'telefone': p.telefone,
-                'email': p.email,
-                'endereco': p.endereco,
-                'data_nascimento': p.data_nascimento.strftime('%Y-%m-%d') if p.data_nascimento else None
-            })
-        return jsonify(resultado)
+        return responder_listagem('paciente', Paciente.query, Paciente.id)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -267,12 +1364,174 @@ def cadastrar_paciente():
         )
         
         db.session.add(novo_paciente)
+        db.session.flush()
+        indexar_pacientes_busca([(novo_paciente.id, novo_paciente.nome, novo_paciente.cpf, novo_paciente.data_nascimento)])
         db.session.commit()
         
         return jsonify({"message": "Paciente cadastrado com sucesso!", "id": novo_paciente.id}), 201
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+# ===== CADASTRO EM LOTE =====
+
+# POST /pacientes/bulk recebe um array JSON ou NDJSON (Content-Type
+# application/x-ndjson), valida tudo numa passada, confere os CPFs com IN em
+# blocos e insere com executemany, um commit por bloco. A resposta traz o
+# resultado de cada linha, na ordem do corpo.
+TAMANHO_LOTE_BULK = 1000
+BULK_MAXIMO_LINHAS = 50000
+
+def ler_linhas_bulk():
+    if request.mimetype == 'application/x-ndjson':
+        linhas = []
+        # Sem o buffer, iterar o stream do werkzeug por linha lê aos pedaços minúsculos
+        for numero, linha in enumerate(io.BufferedReader(request.stream), start=1):
+            if not linha.strip():
+                continue
+            try:
+                linhas.append(json.loads(linha))
+            except ValueError:
+                raise ValueError(f"Linha {numero} do NDJSON não é um JSON válido")
+            if len(linhas) > BULK_MAXIMO_LINHAS:
+                break
+    else:
+        linhas = request.get_json(silent=True)
+        if not isinstance(linhas, list):
+            raise ValueError("O corpo deve ser um array JSON ou NDJSON")
+    
+    if len(linhas) > BULK_MAXIMO_LINHAS:
+        raise ValueError(f"Máximo de {BULK_MAXIMO_LINHAS} pacientes por requisição")
+    return linhas
+
+def validar_paciente_bulk(dados):
+    if not isinstance(dados, dict):
+        raise ValueError("Registro deve ser um objeto JSON")
+    if not dados.get('nome') or not dados.get('cpf'):
+        raise ValueError("Nome e CPF são obrigatórios")
+    
+    return {
+        'nome': dados['nome'],
+        'cpf': str(dados['cpf']),
+        'telefone': dados.get('telefone'),
+        'email': dados.get('email'),
+        'endereco': dados.get('endereco'),
+        'data_nascimento': datetime.strptime(dados['data_nascimento'], '%Y-%m-%d').date() if dados.get('data_nascimento') else None,
+    }
+
+def cpfs_cadastrados(cpfs):
+    existentes = set()
+    cpfs = list(cpfs)
+    for i in range(0, len(cpfs), TAMANHO_LOTE_BULK):
+        existentes.update(cpf for (cpf,) in db.session.query(Paciente.cpf).filter(Paciente.cpf.in_(cpfs[i:i + TAMANHO_LOTE_BULK])))
+    return existentes
+
+def inserir_bloco_pacientes(bloco, resultados):
+    # bloco: lista de (posição, valores); devolve quantos foram inseridos
+    agora = datetime.utcnow()
+    ids = db.session.execute(
+        db.insert(Paciente).returning(Paciente.id, sort_by_parameter_order=True),
+        [dict(valores, created_at=agora) for _, valores in bloco]
+    ).scalars().all()
+    indexar_pacientes_busca([
+        (paciente_id, valores['nome'], valores['cpf'], valores['data_nascimento'])
+        for (_, valores), paciente_id in zip(bloco, ids)
+    ])
+    db.session.commit()
+    
+    for (posicao, _), paciente_id in zip(bloco, ids):
+        resultados[posicao] = {"linha": posicao + 1, "status": "criado", "id": paciente_id}
+    return len(ids)
+
+def inserir_pacientes_um_a_um(bloco, resultados):
+    # Último recurso quando o bloco falhou mesmo depois de reconferido: cada
+    # linha no seu commit, e a que violar o CPF único vira erro no resultado
+    criados = 0
+    for posicao, valores in bloco:
+        try:
+            criados += inserir_bloco_pacientes([(posicao, valores)], resultados)
+        except IntegrityError:
+            db.session.rollback()
+            resultados[posicao] = {"linha": posicao + 1, "status": "erro", "erro": "CPF já cadastrado"}
+    return criados
+
+@app.route('/pacientes/bulk/protegido', methods=['POST'])
+@token_required
+def cadastrar_pacientes_bulk_protegido():
+    
+    return cadastrar_pacientes_bulk()
+
+@app.route('/pacientes/bulk', methods=['POST'])
+def cadastrar_pacientes_bulk():
+    try:
+        linhas = ler_linhas_bulk()
+        resultados = [None] * len(linhas)
+        
+        # Validação em uma passada, incluindo CPF repetido dentro do próprio lote
+        validos = []
+        cpfs_lote = set()
+        for posicao, dados in enumerate(linhas):
+            try:
+                valores = validar_paciente_bulk(dados)
+            except ValueError as e:
+                resultados[posicao] = {"linha": posicao + 1, "status": "erro", "erro": str(e)}
+                continue
+            if valores['cpf'] in cpfs_lote:
+                resultados[posicao] = {"linha": posicao + 1, "status": "erro", "erro": "CPF repetido no lote"}
+                continue
+            cpfs_lote.add(valores['cpf'])
+            validos.append((posicao, valores))
+        
+        existentes = cpfs_cadastrados(cpfs_lote)
+        novos = []
+        for posicao, valores in validos:
+            if valores['cpf'] in existentes:
+                resultados[posicao] = {"linha": posicao + 1, "status": "erro", "erro": "CPF já cadastrado"}
+            else:
+                novos.append((posicao, valores))
+        
+        criados = 0
+        for i in range(0, len(novos), TAMANHO_LOTE_BULK):
+            bloco = novos[i:i + TAMANHO_LOTE_BULK]
+            try:
+                criados += inserir_bloco_pacientes(bloco, resultados)
+            except IntegrityError:
+                # Outro cadastro gravou algum desses CPFs depois da conferência:
+                # confere o bloco de novo e insere o restante
+                db.session.rollback()
+                existentes = cpfs_cadastrados(valores['cpf'] for _, valores in bloco)
+                restantes = []
+                for posicao, valores in bloco:
+                    if valores['cpf'] in existentes:
+                        resultados[posicao] = {"linha": posicao + 1, "status": "erro", "erro": "CPF já cadastrado"}
+                    else:
+                        restantes.append((posicao, valores))
+                if restantes:
+                    try:
+                        criados += inserir_bloco_pacientes(restantes, resultados)
+                    except IntegrityError:
+                        db.session.rollback()
+                        criados += inserir_pacientes_um_a_um(restantes, resultados)
+        
+        erros = len(linhas) - criados
+        if erros == 0:
+            status_http = 201
+        elif criados == 0:
+            status_http = 400
+        else:
+            status_http = 207
+        
+        return jsonify({
+            "total": len(linhas),
+            "criados": criados,
+            "erros": erros,
+            "resultados": resultados
+        }), status_http
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 500
+
 @app.route('/pacientes/<int:id>/protegido', methods=['GET'])
 @token_required
 def buscar_paciente_protegido(id):
@@ -282,16 +1541,11 @@ def buscar_paciente_protegido(id):
 @app.route('/pacientes/<int:id>', methods=['GET'])
 def buscar_paciente(id):
     try:
-        paciente = Paciente.query.get_or_404(id)
-        return jsonify({
-            'id': paciente.id,
-            'nome': paciente.nome,
-            'cpf': paciente.cpf,
-            'telefone': paciente.telefone,
-            'email': paciente.email,
-            'endereco': paciente.endereco,
-            'data_nascimento': paciente.data_nascimento.strftime('%Y-%m-%d') if paciente.data_nascimento else None
-        })
+        paciente = Paciente.query.with_entities(Paciente.id, Paciente.versao).filter_by(id=id).first_or_404()
+        fragmentos = fragmentos_por_versao('paciente', [paciente])
+        if not fragmentos:
+            return jsonify({"erro": "Paciente não encontrado"}), 404
+        return Response(fragmentos[0] + b'\n', mimetype='application/json')
     except Exception as e:
         return jsonify({"erro": str(e)}), 404
     
@@ -310,6 +1564,7 @@ def editar_paciente(id):
         # Validação básica
         if not dados.get('nome'):
             return jsonify({"erro": "Nome é obrigatório"}), 400
+        nome_indexado = paciente.nome
         
         # Verifica se o CPF foi alterado e se já existe para outro paciente
         if dados.get('cpf') and dados['cpf'] != paciente.cpf:
@@ -333,6 +1588,9 @@ def editar_paciente(id):
         if dados.get('data_nascimento'):
             paciente.data_nascimento = datetime.strptime(dados['data_nascimento'], '%Y-%m-%d').date()
         
+        invalidar_fragmento(paciente)
+        remover_paciente_busca(paciente.id, nome_indexado)
+        indexar_pacientes_busca([(paciente.id, paciente.nome, paciente.cpf, paciente.data_nascimento)])
         db.session.commit()
         
         return jsonify({
@@ -385,7 +1643,14 @@ def deletar_paciente(id):
         # Se não há relacionamentos, pode excluir
         nome_paciente = paciente.nome
         db.session.delete(paciente)
-        db.session.commit()
+        remover_paciente_busca(id, nome_paciente)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Com foreign_keys ligado o banco recusa registros órfãos (ex.: prescrições inativas)
+            db.session.rollback()
+            return jsonify({"erro": "Não é possível excluir este paciente pois possui registros vinculados"}), 400
+        cache_fragmentos.remover(Paciente.__tablename__, id)
         
         return jsonify({
             "message": f"Paciente {nome_paciente} excluído com sucesso!",
@@ -395,6 +1660,201 @@ def deletar_paciente(id):
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+# ===== BUSCA DE PACIENTES =====
+
+# GET /pacientes/busca filtra por nome ("q"), prefixo de CPF e data de
+# nascimento. Nome, CPF (só dígitos) e data (YYYYMMDD) ficam na tabela FTS5
+# paciente_busca (sem acentos e sem diferenciar maiúsculas), mantida na mesma
+# transação pelas rotas que cadastram, editam e excluem pacientes. Cada palavra
+# de "q" vale como prefixo ("jo silv" acha "João da Silva"); com nome, CPF e
+# data entram na mesma consulta ao índice. Sem nome, CPF e data usam os índices
+# comuns da tabela paciente.
+#
+# Relevância: todas as palavras são obrigatórias, então o bm25 só diferencia os
+# resultados pelo tamanho do nome, mas para isso pontua todos os encontrados
+# antes de devolver o primeiro (centenas de ms para "maria" com 1 milhão de
+# pacientes). A mesma ordem, (palavras, tamanho, id), vai gravada no rowid de
+# cada linha do índice (chave_busca_paciente): o FTS5 devolve os encontrados já
+# em ordem de rowid, então a página para no limite e o cursor é a chave do
+# último resultado ("rowid > cursor"), sem ordenar nem pular os anteriores.
+# Prefixos de 2 a 6 letras têm índice próprio no FTS5; palavras maiores
+# percorrem só os termos que começam com elas.
+SQL_CRIAR_BUSCA_PACIENTES = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS paciente_busca USING fts5("
+    "nome, cpf, data_nascimento, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+)
+
+BUSCA_TAMANHO_MINIMO_PALAVRA = 2
+BUSCA_TAMANHO_MAXIMO_PREFIXO = 6
+
+# chave = ((palavras * 1024) + tamanho) * BUSCA_FATOR_ID + id, com palavras
+# contadas pelos espaços (até 63) e tamanho até 1023: cabe num rowid de 64 bits
+BUSCA_FATOR_ID = 2 ** 40
+SQL_CHAVE_BUSCA = (
+    "(min(length(nome) - length(replace(nome, ' ', '')), 63) * 1024 + min(length(nome), 1023)) "
+    f"* {BUSCA_FATOR_ID} + id"
+)
+
+def chave_busca_paciente(paciente_id, nome):
+    # Mesmo cálculo de SQL_CHAVE_BUSCA
+    return (min(nome.count(' '), 63) * 1024 + min(len(nome), 1023)) * BUSCA_FATOR_ID + paciente_id
+
+# CPF só com dígitos: o cadastro aceita "123.456.789-00" ou "12345678900" e a
+# busca compara o prefixo com esta expressão, que tem índice próprio (o SQL da
+# consulta precisa usar exatamente o mesmo texto)
+def sql_cpf_digitos(coluna):
+    return f"replace(replace(replace({coluna}, '.', ''), '-', ''), ' ', '')"
+
+SQL_CPF_DIGITOS = sql_cpf_digitos('cpf')
+
+def indexar_pacientes_busca(pacientes):
+    # pacientes: lista de (id, nome, cpf, data_nascimento) ainda não indexados;
+    # para reindexar um paciente editado, remover_paciente_busca antes
+    if pacientes:
+        db.session.execute(
+            db.text(
+                'INSERT OR REPLACE INTO paciente_busca (rowid, nome, cpf, data_nascimento) '
+                'VALUES (:chave, :nome, :cpf, :data_nascimento)'
+            ),
+            [
+                {
+                    'chave': chave_busca_paciente(paciente_id, nome),
+                    'nome': nome,
+                    'cpf': re.sub(r'\D', '', cpf),
+                    'data_nascimento': data_nascimento.strftime('%Y%m%d') if data_nascimento else None,
+                }
+                for paciente_id, nome, cpf, data_nascimento in pacientes
+            ]
+        )
+
+def reindexar_busca_pacientes():
+    executar_sql(
+        'DELETE FROM paciente_busca',
+        "INSERT INTO paciente_busca (rowid, nome, cpf, data_nascimento) "
+        f"SELECT {SQL_CHAVE_BUSCA}, nome, {SQL_CPF_DIGITOS}, replace(data_nascimento, '-', '') FROM paciente",
+    )
+
+def remover_paciente_busca(paciente_id, nome):
+    # nome: o que estava gravado quando o paciente foi indexado (faz parte da chave)
+    db.session.execute(
+        db.text('DELETE FROM paciente_busca WHERE rowid = :chave'),
+        {'chave': chave_busca_paciente(paciente_id, nome)}
+    )
+
+def termos_busca_nome(texto):
+    # Só palavras, entre aspas: operadores do FTS5 digitados pelo usuário não têm efeito
+    palavras = [p for p in re.findall(r'\w+', texto) if len(p) >= BUSCA_TAMANHO_MINIMO_PALAVRA]
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+def filtros_busca_pacientes():
+    q = request.args.get('q', '').strip()
+    cpf = re.sub(r'[.\-\s]', '', request.args.get('cpf', ''))
+    data_nascimento = request.args.get('data_nascimento')
+    
+    # "q" só com dígitos (com ou sem pontuação) é tratado como prefixo de CPF
+    if q and not cpf and re.fullmatch(r'[\d.\-\s]+', q):
+        cpf, q = re.sub(r'\D', '', q), ''
+    
+    termos = termos_busca_nome(q)
+    if q and not termos:
+        raise ValueError(f"Informe ao menos uma palavra com {BUSCA_TAMANHO_MINIMO_PALAVRA} letras em 'q'")
+    if cpf and not cpf.isdigit():
+        raise ValueError("'cpf' deve conter apenas números")
+    if data_nascimento:
+        try:
+            data_nascimento = datetime.strptime(data_nascimento, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError("'data_nascimento' deve estar no formato YYYY-MM-DD")
+    if not (termos or cpf or data_nascimento):
+        raise ValueError("Informe 'q', 'cpf' ou 'data_nascimento'")
+    
+    return termos, cpf, data_nascimento
+
+def buscar_ids_pacientes(termos, cpf, data_nascimento, limite, cursor):
+    # Devolve (id, versao, chave), com chave = valor do cursor da página seguinte
+    parametros = {'limite': limite}
+    condicoes = []
+    if cpf:
+        # Prefixo como intervalo do CPF só com dígitos: '123' <= cpf < '124'
+        parametros.update(cpf_de=cpf, cpf_ate=fim_do_prefixo(cpf))
+    
+    if termos:
+        consulta = f'nome : ({termos})'
+        if cpf:
+            # No FTS5 o CPF vai no máximo até o maior prefixo indexado (com 1
+            # milhão de pacientes, 6 dígitos já deixam um ou dois); o resto é
+            # conferido na tabela paciente, só para esses poucos encontrados
+            prefixo = cpf[:BUSCA_TAMANHO_MAXIMO_PREFIXO]
+            if len(prefixo) >= BUSCA_TAMANHO_MINIMO_PALAVRA:
+                consulta += f' AND cpf : "{prefixo}"*'
+            if prefixo != cpf or len(prefixo) < BUSCA_TAMANHO_MINIMO_PALAVRA:
+                cpf_paciente = sql_cpf_digitos('paciente.cpf')
+                condicoes.append(f'{cpf_paciente} >= :cpf_de AND {cpf_paciente} < :cpf_ate')
+        if data_nascimento:
+            consulta += f' AND data_nascimento : "{data_nascimento.strftime("%Y%m%d")}"'
+        parametros.update(consulta=consulta, depois=cursor or 0, fator=BUSCA_FATOR_ID)
+        # O FTS5 percorre os encontrados em ordem de rowid (a chave de
+        # relevância) e para ao completar a página
+        sql = (
+            'SELECT paciente.id, paciente.versao, paciente_busca.rowid AS chave '
+            'FROM paciente_busca CROSS JOIN paciente ON paciente.id = paciente_busca.rowid % :fator '
+            'WHERE paciente_busca MATCH :consulta AND paciente_busca.rowid > :depois' +
+            ''.join(f' AND {condicao}' for condicao in condicoes) +
+            ' ORDER BY paciente_busca.rowid LIMIT :limite'
+        )
+    else:
+        ordem = SQL_CPF_DIGITOS if cpf else 'nome'
+        if cursor is not None:
+            # Continua depois do último paciente da página anterior, pela mesma ordem do índice
+            condicoes.append(f'({ordem}, id) > (SELECT {ordem}, id FROM paciente WHERE id = :cursor)')
+            parametros['cursor'] = cursor
+        if cpf:
+            inicio = ':cpf_de'
+            if cursor is not None:
+                # O índice da expressão não usa a comparação acima como início do
+                # intervalo; sem isto cada página relê o prefixo desde o começo
+                inicio = f'max(:cpf_de, (SELECT {SQL_CPF_DIGITOS} FROM paciente WHERE id = :cursor))'
+            condicoes.append(f'{SQL_CPF_DIGITOS} >= {inicio} AND {SQL_CPF_DIGITOS} < :cpf_ate')
+        if data_nascimento:
+            condicoes.append('data_nascimento = :data_nascimento')
+            parametros['data_nascimento'] = data_nascimento.isoformat()
+        sql = (
+            'SELECT id, versao, id AS chave FROM paciente WHERE ' + ' AND '.join(condicoes) +
+            f' ORDER BY {ordem}, id LIMIT :limite'
+        )
+    
+    return db.session.connection().execute(db.text(sql), parametros).all()
+
+@app.route('/pacientes/busca/protegido', methods=['GET'])
+@token_required
+def buscar_pacientes_protegido():
+    
+    return buscar_pacientes()
+
+@app.route('/pacientes/busca', methods=['GET'])
+@get_condicional('paciente')
+def buscar_pacientes():
+    try:
+        termos, cpf, data_nascimento = filtros_busca_pacientes()
+        limite, cursor = parametros_paginacao()
+        
+        # Um a mais só para saber se existe próxima página
+        linhas = buscar_ids_pacientes(termos, cpf, data_nascimento, limite + 1, cursor)
+        next_cursor = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            next_cursor = str(linhas[-1].chave)
+        
+        fragmentos = fragmentos_por_versao('paciente', [(linha.id, linha.versao) for linha in linhas])
+        return resposta_json_montada(
+            {'itens': None, 'total_pagina': len(fragmentos), 'next_cursor': next_cursor},
+            'itens', b'[' + b','.join(fragmentos) + b']'
+        )
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
 # === ROTAS DE PROFISSIONAIS ===
 
 @app.route('/profissionais/protegido', methods=['GET'])
@@ -404,21 +1864,12 @@ def listar_profissionais_protegido():
     return listar_profissionais()
 
 @app.route('/profissionais', methods=['GET'])
+@get_condicional('profissional')
 def listar_profissionais():
     try:
-        profissionais = Profissional.query.filter_by(ativo=True).all()
-        resultado = []
-        for p in profissionais:
-            resultado.append({
-                'id': p.id,
-                'nome': p.nome,
-                'especialidade': p.especialidade,
-                'crm_coren': p.crm_coren,
-                'tipo': p.tipo,
-                'telefone': p.telefone,
-                'email': p.email
-            })
-        return jsonify(resultado)
+        return responder_listagem('profissional', Profissional.query.filter_by(ativo=True), Profissional.id)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -464,21 +1915,12 @@ def listar_consultas_protegido():
     return listar_consultas()
 
 @app.route('/consultas', methods=['GET'])
+@get_condicional('consulta', 'paciente', 'profissional')
 def listar_consultas():
     try:
-        consultas = Consulta.query.all()
-        resultado = []
-        for c in consultas:
-            resultado.append({
-                'id': c.id,
-                'paciente': c.paciente_ref.nome,
-                'profissional': c.profissional_ref.nome,
-                'data_consulta': c.data_consulta.strftime('%Y-%m-%d %H:%M'),
-                'tipo': c.tipo,
-                'status': c.status,
-                'observacoes': c.observacoes
-            })
-        return jsonify(resultado)
+        return responder_listagem('consulta', query_listagem_consultas(), Consulta.id)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -505,12 +1947,52 @@ def agendar_consulta():
         )
         
         db.session.add(nova_consulta)
+        contabilizar_consulta(nova_consulta, 'agendada', 1)
         db.session.commit()
         
         return jsonify({"message": "Consulta agendada com sucesso!", "id": nova_consulta.id}), 201
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+@app.route('/consultas/<int:id>/status/protegido', methods=['PUT'])
+@token_required
+def atualizar_status_consulta_protegido(id):
+    
+    return atualizar_status_consulta(id)
+
+@app.route('/consultas/<int:id>/status', methods=['PUT'])
+def atualizar_status_consulta(id):
+    try:
+        consulta = Consulta.query.get_or_404(id)
+        dados = request.get_json()
+        
+        novo_status = dados.get('status')
+        if novo_status not in ['agendada', 'realizada', 'cancelada']:
+            return jsonify({"erro": "Status inválido"}), 400
+        
+        status_anterior = consulta.status
+        if novo_status != status_anterior:
+            # UPDATE condicional: se outra requisição mudou o status no meio
+            # tempo nada muda e os contadores não recebem o mesmo -1 duas vezes
+            alterada = db.session.execute(
+                db.update(Consulta).where(
+                    Consulta.id == id, Consulta.status == status_anterior
+                ).values(status=novo_status).returning(
+                    Consulta.data_consulta, Consulta.profissional_id
+                ).execution_options(synchronize_session=False)
+            ).first()
+            if not alterada:
+                db.session.rollback()
+                return jsonify({"erro": "Status da consulta foi alterado por outra requisição"}), 409
+            
+            contabilizar_consulta(alterada, status_anterior, -1)
+            contabilizar_consulta(alterada, novo_status, 1)
+            db.session.commit()
+        
+        return jsonify({"message": "Status da consulta atualizado!", "id": id, "status": novo_status})
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
 # === ROTAS DE EXAMES ===
 
 @app.route('/exames/protegido', methods=['GET'])
@@ -520,20 +2002,12 @@ def listar_exames_protegido():
     return listar_exames()
 
 @app.route('/exames', methods=['GET'])
+@get_condicional('exame', 'paciente')
 def listar_exames():
     try:
-        exames = Exame.query.all()
-        resultado = []
-        for e in exames:
-            resultado.append({
-                'id': e.id,
-                'paciente': e.paciente_ref.nome,
-                'tipo_exame': e.tipo_exame,
-                'data_exame': e.data_exame.strftime('%Y-%m-%d %H:%M'),
-                'status': e.status,
-                'resultado': e.resultado
-            })
-        return jsonify(resultado)
+        return responder_listagem('exame', query_listagem_exames(), Exame.id)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -595,26 +2069,17 @@ def listar_leitos_protegido():
     return listar_leitos()
 
 @app.route('/leitos', methods=['GET'])
+@get_condicional(*TABELAS_QUADRO_LEITOS)
 def listar_leitos():
     try:
-        leitos = Leito.query.all()
-        resultado = []
-        for l in leitos:
-            paciente_nome = None
-            if l.paciente_id:
-                paciente = Paciente.query.get(l.paciente_id)
-                paciente_nome = paciente.nome if paciente else None
-            
-            resultado.append({
-                'id': l.id,
-                'numero': l.numero,
-                'setor': l.setor,
-                'ocupado': l.ocupado,
-                'paciente_id': l.paciente_id,
-                'paciente_nome': paciente_nome,
-                'data_ocupacao': l.data_ocupacao.strftime('%Y-%m-%d %H:%M') if l.data_ocupacao else None
-            })
-        return jsonify(resultado)
+        if quer_stream():
+            return resposta_ndjson(query_quadro_leitos(), Leito.id, serializar_linha_leito)
+        
+        limite, cursor = parametros_paginacao()
+        resultado, next_cursor = indice_leitos.quadro(cursor, limite)
+        return resposta_paginada(resultado, next_cursor)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -641,7 +2106,10 @@ def cadastrar_leito():
         )
         
         db.session.add(novo_leito)
+        contabilizar_leito(novo_leito.setor, total=1)
+        versoes = versoes_quadro_leitos()
         db.session.commit()
+        indice_leitos.adicionar(novo_leito, versoes)
         
         return jsonify({"message": "Leito cadastrado com sucesso!", "id": novo_leito.id}), 201
     except Exception as e:
@@ -670,11 +2138,21 @@ def ocupar_leito(id):
         if not paciente:
             return jsonify({"erro": "Paciente não encontrado"}), 404
         
-        leito.ocupado = True
-        leito.paciente_id = dados['paciente_id']
-        leito.data_ocupacao = datetime.utcnow()
+        # UPDATE condicional: se outra requisição ocupou o leito no meio tempo
+        # nada muda e o contador do setor não é incrementado duas vezes
+        atualizados = Leito.query.filter_by(id=id, ocupado=False).update({
+            'ocupado': True,
+            'paciente_id': dados['paciente_id'],
+            'data_ocupacao': datetime.utcnow(),
+        })
+        if not atualizados:
+            db.session.rollback()
+            return jsonify({"erro": "Leito já está ocupado"}), 400
         
+        contabilizar_leito(leito.setor, ocupados=1)
+        versoes = versoes_quadro_leitos()
         db.session.commit()
+        indice_leitos.ocupar(leito, paciente, versoes)
         
         return jsonify({"message": f"Leito {leito.numero} ocupado por {paciente.nome}"})
     except Exception as e:
@@ -694,16 +2172,108 @@ def liberar_leito(id):
         if not leito.ocupado:
             return jsonify({"erro": "Leito já está livre"}), 400
         
-        leito.ocupado = False
-        leito.paciente_id = None
-        leito.data_ocupacao = None
+        atualizados = Leito.query.filter_by(id=id, ocupado=True).update({
+            'ocupado': False,
+            'paciente_id': None,
+            'data_ocupacao': None,
+        })
+        if not atualizados:
+            db.session.rollback()
+            return jsonify({"erro": "Leito já está livre"}), 400
         
+        contabilizar_leito(leito.setor, ocupados=-1)
+        versoes = versoes_quadro_leitos()
         db.session.commit()
+        indice_leitos.liberar(leito, versoes)
         
         return jsonify({"message": f"Leito {leito.numero} liberado com sucesso"})
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+# Alocação automática: tenta os leitos livres do setor segundo o índice em
+# memória (que pode estar defasado em relação a outros workers) e, se nenhum
+# servir, deixa o próprio UPDATE escolher o primeiro livre. Em todos os casos
+# a reserva é um UPDATE condicional, sem ler e depois escrever.
+ALOCACAO_TENTATIVAS_INDICE = 3
+
+def ocupar_leito_se_livre(condicao_leito, paciente_id, setor):
+    # Alias para o subselect não ser correlacionado com a linha do UPDATE
+    outro = db.aliased(Leito)
+    paciente_em_leito = db.session.query(outro.id).filter(
+        outro.paciente_id == paciente_id, outro.ocupado == True
+    ).exists()
+    
+    return db.session.execute(
+        db.update(Leito).where(
+            condicao_leito, Leito.setor == setor, Leito.ocupado == False, ~paciente_em_leito
+        ).values(
+            ocupado=True, paciente_id=paciente_id, data_ocupacao=datetime.utcnow()
+        ).returning(
+            Leito.id, Leito.numero, Leito.setor, Leito.data_ocupacao
+        ).execution_options(synchronize_session=False)
+    ).first()
+
+@app.route('/leitos/alocar/protegido', methods=['POST'])
+@token_required
+def alocar_leito_protegido():
+    
+    return alocar_leito()
+
+@app.route('/leitos/alocar', methods=['POST'])
+def alocar_leito():
+    try:
+        dados = request.get_json(silent=True) or {}
+        paciente_id = dados.get('paciente_id')
+        setor = dados.get('setor')
+        
+        if not paciente_id or not setor:
+            return jsonify({"erro": "ID do paciente e setor são obrigatórios"}), 400
+        
+        paciente = db.session.get(Paciente, paciente_id)
+        if not paciente:
+            return jsonify({"erro": "Paciente não encontrado"}), 404
+        
+        leito_atual = Leito.query.filter_by(paciente_id=paciente_id, ocupado=True).first()
+        if leito_atual:
+            return jsonify({"erro": f"Paciente já ocupa o leito {leito_atual.numero}"}), 409
+        
+        leito = None
+        for leito_id in indice_leitos.livres(setor)[:ALOCACAO_TENTATIVAS_INDICE]:
+            leito = ocupar_leito_se_livre(Leito.id == leito_id, paciente_id, setor)
+            if leito:
+                break
+            indice_leitos.descartar_livre(setor, leito_id)
+        
+        if leito is None:
+            livre = db.aliased(Leito)
+            primeiro_livre = db.session.query(livre.id).filter(
+                livre.setor == setor, livre.ocupado == False
+            ).order_by(livre.id).limit(1).scalar_subquery()
+            leito = ocupar_leito_se_livre(Leito.id == primeiro_livre, paciente_id, setor)
+        
+        if leito is None:
+            db.session.rollback()
+            # O UPDATE também recusa se o paciente foi internado no meio tempo
+            leito_atual = Leito.query.filter_by(paciente_id=paciente_id, ocupado=True).first()
+            if leito_atual:
+                return jsonify({"erro": f"Paciente já ocupa o leito {leito_atual.numero}"}), 409
+            return jsonify({"erro": f"Nenhum leito livre no setor {setor}"}), 409
+        
+        contabilizar_leito(setor, ocupados=1)
+        versoes = versoes_quadro_leitos()
+        db.session.commit()
+        indice_leitos.ocupar(leito, paciente, versoes)
+        
+        return jsonify({
+            "message": f"Leito {leito.numero} ocupado por {paciente.nome}",
+            "leito_id": leito.id,
+            "numero": leito.numero,
+            "setor": leito.setor
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"erro": str(e)}), 500
+
 # === ROTAS DE RELATÓRIOS ===
 
 @app.route('/relatorios/ocupacao-leitos/protegido', methods=['GET'])
@@ -713,20 +2283,15 @@ def relatorio_ocupacao_leitos_protegido():
     return relatorio_ocupacao_leitos()
 
 @app.route('/relatorios/ocupacao-leitos', methods=['GET'])
+@get_condicional('ocupacao_setor')
 def relatorio_ocupacao_leitos():
     try:
-        total_leitos = Leito.query.count()
-        leitos_ocupados = Leito.query.filter_by(ocupado=True).count()
-        leitos_livres = total_leitos - leitos_ocupados
+        # Lê só o resumo por setor (uma linha por setor), mantido pelas rotas de leitos
+        ocupacao_por_setor = OcupacaoSetor.query.filter(OcupacaoSetor.total > 0).order_by(OcupacaoSetor.setor).all()
         
-        ocupacao_por_setor = db.session.query(
-            Leito.setor,
-            db.func.count(Leito.id).label('total'),
-            db.func.sum(db.case(
-                (Leito.ocupado == True, 1),
-                else_=0
-            )).label('ocupados')
-        ).group_by(Leito.setor).all()
+        total_leitos = sum(setor.total for setor in ocupacao_por_setor)
+        leitos_ocupados = sum(setor.ocupados for setor in ocupacao_por_setor)
+        leitos_livres = total_leitos - leitos_ocupados
         
         setores = []
         for setor in ocupacao_por_setor:
@@ -756,7 +2321,18 @@ def relatorio_consultas_dia_protegido():
     
     return relatorio_consultas_dia()
 
+def serializar_consulta_dia(c):
+    return {
+        'id': c.id,
+        'paciente': c.paciente,
+        'profissional': c.profissional,
+        'horario': formatar_hora(c.data_consulta.time()),
+        'status': c.status,
+        'tipo': c.tipo
+    }
+
 @app.route('/relatorios/consultas-dia', methods=['GET'])
+@get_condicional('consulta', 'paciente', 'profissional', 'contagem_consultas_dia')
 def relatorio_consultas_dia():
     try:
         data_param = request.args.get('data')
@@ -765,35 +2341,43 @@ def relatorio_consultas_dia():
         else:
             data_filtro = datetime.now().date()
         
-        consultas = Consulta.query.filter(
-            db.func.date(Consulta.data_consulta) == data_filtro
-        ).all()
-        
-        agendadas = len([c for c in consultas if c.status == 'agendada'])
-        realizadas = len([c for c in consultas if c.status == 'realizada'])
-        canceladas = len([c for c in consultas if c.status == 'cancelada'])
-        
-        consultas_detalhadas = []
-        for c in consultas:
-            consultas_detalhadas.append({
-                'id': c.id,
-                'paciente': c.paciente_ref.nome,
-                'profissional': c.profissional_ref.nome,
-                'horario': c.data_consulta.strftime('%H:%M'),
-                'status': c.status,
-                'tipo': c.tipo
-            })
+        # Intervalo semiaberto [dia, dia seguinte) para usar o índice de data_consulta
+        inicio = datetime.combine(data_filtro, datetime.min.time())
+        fim = inicio + timedelta(days=1)
+        
+        query = query_listagem_consultas().with_entities(
+            *SERIALIZADORES['consulta'].colunas(('id', 'paciente', 'profissional', 'data_consulta', 'status', 'tipo'))
+        ).filter(
+            Consulta.data_consulta >= inicio,
+            Consulta.data_consulta < fim
+        )
+        
+        # No modo streaming só as linhas do detalhe são enviadas
+        if quer_stream():
+            return resposta_ndjson(query, Consulta.id, serializar_consulta_dia)
+        
+        consultas, next_cursor = paginar(query, Consulta.id)
+        
+        # O resumo vem pronto da tabela de contadores
+        contagens = dict(db.session.query(
+            ContagemConsultasDia.status, ContagemConsultasDia.total
+        ).filter(ContagemConsultasDia.data == data_filtro).all())
+        
+        consultas_detalhadas = [serializar_consulta_dia(c) for c in consultas]
         
         return jsonify({
             'data': data_filtro.strftime('%Y-%m-%d'),
             'resumo': {
-                'total': len(consultas),
-                'agendadas': agendadas,
-                'realizadas': realizadas,
-                'canceladas': canceladas
+                'total': sum(contagens.values()),
+                'agendadas': contagens.get('agendada', 0),
+                'realizadas': contagens.get('realizada', 0),
+                'canceladas': contagens.get('cancelada', 0)
             },
-            'consultas': consultas_detalhadas
+            'consultas': consultas_detalhadas,
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -803,26 +2387,124 @@ def relatorio_produtividade_profissionais_protegido():
     
     return relatorio_produtividade_profissionais()
 
+# tipo -> (coluna do profissional, coluna da data, coluna do status, status válidos)
+# Prescrições não têm status de produtividade: toda prescrição emitida conta.
+TIPOS_PRODUTIVIDADE = {
+    'consulta': (Consulta.profissional_id, Consulta.data_consulta, Consulta.status,
+                 ('agendada', 'realizada', 'cancelada')),
+    'atendimento_online': (AtendimentoOnline.profissional_id, AtendimentoOnline.data_inicio, AtendimentoOnline.status,
+                           ('agendado', 'em_andamento', 'finalizado', 'cancelado')),
+    'prescricao': (Prescricao.profissional_id, Prescricao.created_at, None, ('emitida',)),
+}
+
+def inicio_do_mes_seguinte(data):
+    return (data.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+# Divide [inicio, fim) em meses completos (lidos de produtividade_mes) e nas
+# pontas que não fecham um mês (contadas direto nas tabelas, pelos índices de data)
+def dividir_periodo_por_mes(inicio, fim):
+    primeiro_mes = inicio if inicio is None or inicio.day == 1 else inicio_do_mes_seguinte(inicio)
+    fim_meses = fim.replace(day=1) if fim is not None else None
+    
+    if primeiro_mes is not None and fim_meses is not None and primeiro_mes >= fim_meses:
+        return None, [(inicio, fim)]
+    
+    pontas = []
+    if inicio is not None and inicio < primeiro_mes:
+        pontas.append((inicio, primeiro_mes))
+    if fim is not None and fim_meses < fim:
+        pontas.append((fim_meses, fim))
+    return (primeiro_mes, fim_meses), pontas
+
+def contagens_produtividade(inicio, fim, status_aceitos):
+    contagens = {}
+    meses, pontas = dividir_periodo_por_mes(inicio, fim)
+    
+    if meses is not None:
+        primeiro_mes, fim_meses = meses
+        filtros = []
+        if primeiro_mes is not None:
+            filtros.append(ProdutividadeMes.mes >= primeiro_mes.strftime('%Y-%m'))
+        if fim_meses is not None:
+            filtros.append(ProdutividadeMes.mes < fim_meses.strftime('%Y-%m'))
+        
+        linhas = db.session.query(
+            ProdutividadeMes.profissional_id, ProdutividadeMes.tipo, ProdutividadeMes.status,
+            db.func.sum(ProdutividadeMes.total)
+        ).filter(*filtros).group_by(
+            ProdutividadeMes.profissional_id, ProdutividadeMes.tipo, ProdutividadeMes.status
+        )
+        for profissional_id, tipo, status, total in linhas:
+            if status in status_aceitos[tipo]:
+                contagens.setdefault(profissional_id, Counter())[tipo] += total
+    
+    for de, ate in pontas:
+        for tipo, (coluna_profissional, coluna_data, coluna_status, padroes) in TIPOS_PRODUTIVIDADE.items():
+            filtros = [coluna_data >= de, coluna_data < ate]
+            if coluna_status is not None:
+                filtros.append(db.func.coalesce(coluna_status, padroes[0]).in_(status_aceitos[tipo]))
+            
+            linhas = db.session.query(
+                coluna_profissional, db.func.count()
+            ).filter(*filtros).group_by(coluna_profissional)
+            for profissional_id, total in linhas:
+                contagens.setdefault(profissional_id, Counter())[tipo] += total
+    
+    return contagens
+
+def status_aceitos_produtividade():
+    aceitos = {}
+    for tipo, parametro in (('consulta', 'status_consulta'), ('atendimento_online', 'status_atendimento'), ('prescricao', None)):
+        validos = TIPOS_PRODUTIVIDADE[tipo][3]
+        pedidos = request.args.get(parametro) if parametro else None
+        if not pedidos:
+            aceitos[tipo] = validos
+            continue
+        
+        pedidos = tuple(p.strip() for p in pedidos.split(',') if p.strip())
+        invalidos = [p for p in pedidos if p not in validos]
+        if invalidos:
+            raise ValueError(f"{parametro} inválido: {', '.join(invalidos)} (use {', '.join(validos)})")
+        aceitos[tipo] = pedidos
+    return aceitos
+
+def serializar_produtividade(prof, contagens):
+    return {
+        'id': prof.id,
+        'nome': prof.nome,
+        'especialidade': prof.especialidade,
+        'total_consultas': contagens.get('consulta', 0),
+        'total_atendimentos_online': contagens.get('atendimento_online', 0),
+        'total_prescricoes': contagens.get('prescricao', 0)
+    }
+
 @app.route('/relatorios/profissionais-produtividade', methods=['GET'])
+@get_condicional('profissional', 'produtividade_mes', 'consulta', 'atendimento_online', 'prescricao')
 def relatorio_produtividade_profissionais():
     try:
-        profissionais_stats = db.session.query(
-            Profissional.id,
-            Profissional.nome,
-            Profissional.especialidade,
-            db.func.count(Consulta.id).label('total_consultas')
-        ).outerjoin(Consulta).group_by(Profissional.id).all()
-        
-        resultado = []
-        for prof in profissionais_stats:
-            resultado.append({
-                'id': prof.id,
-                'nome': prof.nome,
-                'especialidade': prof.especialidade,
-                'total_consultas': prof.total_consultas
-            })
+        data_inicio = request.args.get('data_inicio')
+        data_fim = request.args.get('data_fim')
+        
+        inicio = datetime.strptime(data_inicio, '%Y-%m-%d') if data_inicio else None
+        # data_fim inclusiva: intervalo semiaberto até o dia seguinte
+        fim = datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1) if data_fim else None
+        
+        contagens = contagens_produtividade(inicio, fim, status_aceitos_produtividade())
+        vazio = Counter()
+        
+        def serializar(prof):
+            return serializar_produtividade(prof, contagens.get(prof.id, vazio))
+        
+        query = db.session.query(Profissional.id, Profissional.nome, Profissional.especialidade)
+        
+        if quer_stream():
+            return resposta_ndjson(query, Profissional.id, serializar)
+        
+        resultado = [serializar(prof) for prof in query.order_by(Profissional.id).all()]
         
         return jsonify(resultado)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
     
@@ -833,39 +2515,58 @@ def relatorio_atendimentos_online_protegido():
     return relatorio_atendimentos_online()
 
 @app.route('/relatorios/atendimentos-online', methods=['GET'])
+@get_condicional('contagem_atendimentos_hora')
 def relatorio_atendimentos_online():
     try:
         data_inicio = request.args.get('data_inicio')
         data_fim = request.args.get('data_fim')
+        profissional_id = request.args.get('profissional_id', type=int)
+        granularidade = request.args.get('granularidade')
         
-        query = AtendimentoOnline.query
+        if granularidade and granularidade not in PERIODOS_ATENDIMENTOS:
+            raise ValueError(f"granularidade deve ser uma de: {', '.join(PERIODOS_ATENDIMENTOS)}")
         
+        # Soma as contagens por hora em vez de ler os atendimentos (horas zeradas
+        # ficam na tabela quando o atendimento muda de hora ou de status)
+        filtros = [ContagemAtendimentosHora.total != 0]
         if data_inicio:
-            query = query.filter(AtendimentoOnline.data_inicio >= datetime.strptime(data_inicio, '%Y-%m-%d'))
+            filtros.append(ContagemAtendimentosHora.hora >= datetime.strptime(data_inicio, '%Y-%m-%d'))
         if data_fim:
-            query = query.filter(AtendimentoOnline.data_inicio <= datetime.strptime(data_fim, '%Y-%m-%d'))
-        
-        atendimentos = query.all()
+            # data_fim inclusiva: intervalo semiaberto até o dia seguinte
+            filtros.append(ContagemAtendimentosHora.hora < datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1))
+        if profissional_id:
+            filtros.append(ContagemAtendimentosHora.profissional_id == profissional_id)
         
-        # Estatísticas
-        total = len(atendimentos)
-        finalizados = len([a for a in atendimentos if a.status == 'finalizado'])
-        cancelados = len([a for a in atendimentos if a.status == 'cancelado'])
-        em_andamento = len([a for a in atendimentos if a.status == 'em_andamento'])
+        totais = dict(db.session.query(
+            ContagemAtendimentosHora.status, db.func.sum(ContagemAtendimentosHora.total)
+        ).filter(*filtros).group_by(ContagemAtendimentosHora.status).all())
         
-        return jsonify({
+        resposta = {
             'periodo': {
                 'inicio': data_inicio or 'Início dos registros',
                 'fim': data_fim or 'Até hoje'
             },
-            'estatisticas': {
-                'total_atendimentos': total,
-                'finalizados': finalizados,
-                'cancelados': cancelados,
-                'em_andamento': em_andamento,
-                'taxa_conclusao': round((finalizados / total) * 100, 2) if total > 0 else 0
-            }
-        })
+            'estatisticas': estatisticas_atendimentos(totais)
+        }
+        
+        if granularidade:
+            periodo = PERIODOS_ATENDIMENTOS[granularidade](ContagemAtendimentosHora.hora).label('periodo')
+            linhas = db.session.query(
+                periodo, ContagemAtendimentosHora.status, db.func.sum(ContagemAtendimentosHora.total)
+            ).filter(*filtros).group_by(periodo, ContagemAtendimentosHora.status).order_by(periodo).all()
+            
+            serie = {}
+            for chave, status, total in linhas:
+                serie.setdefault(chave, {})[status] = total
+            resposta['granularidade'] = granularidade
+            resposta['serie'] = [
+                dict(periodo=chave, **estatisticas_atendimentos(contagens))
+                for chave, contagens in serie.items()
+            ]
+        
+        return jsonify(resposta)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -877,28 +2578,52 @@ def relatorio_prescricoes_ativas_protegido():
     return relatorio_prescricoes_ativas()
 
 @app.route('/relatorios/prescricoes-ativas', methods=['GET'])
+@get_condicional('prescricao')
 def relatorio_prescricoes_ativas():
     try:
-        prescricoes = Prescricao.query.filter_by(ativo=True).all()
+        limite = request.args.get('limit', TOP_MEDICAMENTOS_PADRAO, type=int)
+        if limite < 1 or limite > TOP_MEDICAMENTOS_MAXIMO:
+            raise ValueError(f"limit deve estar entre 1 e {TOP_MEDICAMENTOS_MAXIMO}")
         
-        # Agrupar por medicamento
-        medicamentos_count = {}
-        for p in prescricoes:
-            if p.medicamento in medicamentos_count:
-                medicamentos_count[p.medicamento] += 1
-            else:
-                medicamentos_count[p.medicamento] = 1
+        profissional_id = request.args.get('profissional_id', type=int)
+        data_inicio = request.args.get('data_inicio')
+        data_fim = request.args.get('data_fim')
         
-        # Ordenar por frequência
-        medicamentos_ordenados = sorted(medicamentos_count.items(), key=lambda x: x[1], reverse=True)
+        chave = (carimbo_versoes('prescricao'), profissional_id, data_inicio, data_fim, limite)
+        resultado = cache_prescricoes_ativas.obter(chave)
+        if resultado is not None:
+            return jsonify(resultado)
         
-        return jsonify({
-            'total_prescricoes_ativas': len(prescricoes),
+        filtros = [Prescricao.ativo == True]
+        if profissional_id:
+            filtros.append(Prescricao.profissional_id == profissional_id)
+        if data_inicio:
+            filtros.append(Prescricao.created_at >= datetime.strptime(data_inicio, '%Y-%m-%d'))
+        if data_fim:
+            # data_fim inclusiva: intervalo semiaberto até o dia seguinte
+            filtros.append(Prescricao.created_at < datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1))
+        
+        total_prescricoes = db.session.query(db.func.count(Prescricao.id)).filter(*filtros).scalar()
+        
+        quantidade = db.func.count(Prescricao.id).label('quantidade')
+        mais_prescritos = db.session.query(
+            Prescricao.medicamento, quantidade
+        ).filter(*filtros).group_by(Prescricao.medicamento).order_by(
+            quantidade.desc(), Prescricao.medicamento
+        ).limit(limite).all()
+        
+        resultado = {
+            'total_prescricoes_ativas': total_prescricoes,
             'medicamentos_mais_prescritos': [
-                {'medicamento': med, 'quantidade': qtd} 
-                for med, qtd in medicamentos_ordenados[:10]
+                {'medicamento': med, 'quantidade': qtd}
+                for med, qtd in mais_prescritos
             ]
-        })
+        }
+        cache_prescricoes_ativas.guardar(chave, resultado)
+        
+        return jsonify(resultado)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500   
     
@@ -911,24 +2636,12 @@ def listar_atendimentos_online_protegido():
     return listar_atendimentos_online()
 
 @app.route('/atendimentos-online', methods=['GET'])
+@get_condicional('atendimento_online', 'paciente', 'profissional')
 def listar_atendimentos_online():
     try:
-        atendimentos = AtendimentoOnline.query.all()
-        resultado = []
-        for a in atendimentos:
-            resultado.append({
-                'id': a.id,
-                'paciente': a.paciente_ref.nome,
-                'profissional': a.profissional_ref.nome,
-                'data_inicio': a.data_inicio.strftime('%Y-%m-%d %H:%M'),
-                'data_fim': a.data_fim.strftime('%Y-%m-%d %H:%M') if a.data_fim else None,
-                'status': a.status,
-                'link_videochamada': a.link_videochamada,
-                'sintomas_relatados': a.sintomas_relatados,
-                'diagnostico': a.diagnostico,
-                'observacoes': a.observacoes
-            })
-        return jsonify(resultado)
+        return responder_listagem('atendimento_online', query_listagem_atendimentos_online(), AtendimentoOnline.id)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -959,6 +2672,7 @@ def agendar_atendimento_online():
         )
         
         db.session.add(novo_atendimento)
+        contabilizar_atendimento_online(novo_atendimento.data_inicio, novo_atendimento.profissional_id, 'agendado', 1)
         db.session.commit()
         
         return jsonify({
@@ -977,9 +2691,23 @@ def iniciar_atendimento_online(id):
         if atendimento.status != 'agendado':
             return jsonify({"erro": "Atendimento não pode ser iniciado"}), 400
         
-        atendimento.status = 'em_andamento'
-        atendimento.data_inicio = datetime.utcnow()
+        # O atendimento muda de hora (data_inicio passa a ser agora) e de status.
+        # UPDATE condicional: se outra requisição iniciou antes, os contadores
+        # não são movidos duas vezes
+        agendado_para = atendimento.data_inicio
+        agora = datetime.utcnow()
+        alterado = db.session.execute(
+            db.update(AtendimentoOnline).where(
+                AtendimentoOnline.id == id, AtendimentoOnline.status == 'agendado',
+                AtendimentoOnline.data_inicio == agendado_para
+            ).values(status='em_andamento', data_inicio=agora).execution_options(synchronize_session=False)
+        ).rowcount
+        if not alterado:
+            db.session.rollback()
+            return jsonify({"erro": "Atendimento não pode ser iniciado"}), 400
         
+        contabilizar_atendimento_online(agendado_para, atendimento.profissional_id, 'agendado', -1)
+        contabilizar_atendimento_online(agora, atendimento.profissional_id, 'em_andamento', 1)
         db.session.commit()
         
         return jsonify({
@@ -998,12 +2726,25 @@ def finalizar_atendimento_online(id):
         if atendimento.status != 'em_andamento':
             return jsonify({"erro": "Atendimento não está em andamento"}), 400
         
-        atendimento.status = 'finalizado'
-        atendimento.data_fim = datetime.utcnow()
-        atendimento.sintomas_relatados = dados.get('sintomas_relatados', '')
-        atendimento.diagnostico = dados.get('diagnostico', '')
-        atendimento.observacoes = dados.get('observacoes', '')
+        alterado = db.session.execute(
+            db.update(AtendimentoOnline).where(
+                AtendimentoOnline.id == id, AtendimentoOnline.status == 'em_andamento'
+            ).values(
+                status='finalizado',
+                data_fim=datetime.utcnow(),
+                sintomas_relatados=dados.get('sintomas_relatados', ''),
+                diagnostico=dados.get('diagnostico', ''),
+                observacoes=dados.get('observacoes', ''),
+            ).returning(
+                AtendimentoOnline.data_inicio, AtendimentoOnline.profissional_id
+            ).execution_options(synchronize_session=False)
+        ).first()
+        if not alterado:
+            db.session.rollback()
+            return jsonify({"erro": "Atendimento não está em andamento"}), 400
         
+        contabilizar_atendimento_online(alterado.data_inicio, alterado.profissional_id, 'em_andamento', -1)
+        contabilizar_atendimento_online(alterado.data_inicio, alterado.profissional_id, 'finalizado', 1)
         db.session.commit()
         
         return jsonify({"message": "Atendimento finalizado com sucesso!"})
@@ -1020,28 +2761,20 @@ def listar_prescricoes_protegida():
     return listar_prescricoes()
 
 @app.route('/prescricoes', methods=['GET'])
+@get_condicional('prescricao', 'paciente', 'profissional')
 def listar_prescricoes():
     try:
         paciente_id = request.args.get('paciente_id')
+        medicamento = request.args.get('medicamento')
+        query = query_listagem_prescricoes().filter(Prescricao.ativo == True)
         if paciente_id:
-            prescricoes = Prescricao.query.filter_by(paciente_id=paciente_id, ativo=True).all()
-        else:
-            prescricoes = Prescricao.query.filter_by(ativo=True).all()
-        
-        resultado = []
-        for p in prescricoes:
-            resultado.append({
-                'id': p.id,
-                'paciente': p.paciente_ref.nome,
-                'profissional': p.profissional_ref.nome,
-                'medicamento': p.medicamento,
-                'dosagem': p.dosagem,
-                'frequencia': p.frequencia,
-                'duracao': p.duracao,
-                'instrucoes': p.instrucoes,
-                'data_prescricao': p.created_at.strftime('%Y-%m-%d %H:%M')
-            })
-        return jsonify(resultado)
+            query = query.filter(Prescricao.paciente_id == paciente_id)
+        if medicamento:
+            query = query.filter(Prescricao.medicamento_normalizado == normalizar_medicamento(medicamento))
+        
+        return responder_listagem('prescricao', query, Prescricao.id)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
     
@@ -1067,14 +2800,19 @@ def criar_prescricao():
             atendimento_online_id=dados.get('atendimento_online_id'),
             consulta_id=dados.get('consulta_id'),
             medicamento=dados['medicamento'],
+            medicamento_normalizado=normalizar_medicamento(dados['medicamento']),
             dosagem=dados['dosagem'],
             frequencia=dados['frequencia'],
             duracao=dados['duracao'],
-            instrucoes=dados.get('instrucoes', '')
+            instrucoes=dados.get('instrucoes', ''),
+            created_at=datetime.utcnow()
         )
         
         db.session.add(nova_prescricao)
+        contabilizar_produtividade(nova_prescricao.created_at, nova_prescricao.profissional_id, 'prescricao', 'emitida', 1)
+        contabilizar_medicamento(nova_prescricao.medicamento, total=1, ativas=1)
         db.session.commit()
+        cache_prescricoes_ativas.limpar()
         
         return jsonify({"message": "Prescrição criada com sucesso!", "id": nova_prescricao.id}), 201
     except Exception as e:
@@ -1091,14 +2829,63 @@ def desativar_prescricao_protegida(id):
 def desativar_prescricao(id):
     try:
         prescricao = Prescricao.query.get_or_404(id)
-        prescricao.ativo = False
+        
+        # Só quem de fato desativou desconta a prescrição ativa do medicamento
+        if Prescricao.query.filter_by(id=id, ativo=True).update({'ativo': False}):
+            contabilizar_medicamento(prescricao.medicamento, ativas=-1)
         
         db.session.commit()
+        cache_prescricoes_ativas.limpar()
         
         return jsonify({"message": "Prescrição desativada com sucesso!"})
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+# Autocomplete de medicamentos: prefixo do nome normalizado (intervalo na chave
+# de medicamento_frequencia), os mais prescritos primeiro
+SUGESTOES_MEDICAMENTOS_PADRAO = 10
+SUGESTOES_MEDICAMENTOS_MAXIMO = 50
+
+@app.route('/prescricoes/medicamentos/sugestoes/protegido', methods=['GET'])
+@token_required
+def sugerir_medicamentos_protegido():
+    
+    return sugerir_medicamentos()
+
+@app.route('/prescricoes/medicamentos/sugestoes', methods=['GET'])
+@get_condicional('medicamento_frequencia')
+def sugerir_medicamentos():
+    try:
+        prefixo = normalizar_medicamento(request.args.get('prefixo', ''))
+        if not prefixo:
+            return jsonify({"erro": "Parâmetro 'prefixo' é obrigatório"}), 400
+        
+        try:
+            limite = int(request.args.get('limit', SUGESTOES_MEDICAMENTOS_PADRAO))
+        except ValueError:
+            return jsonify({"erro": "Parâmetro 'limit' deve ser inteiro"}), 400
+        limite = max(1, min(limite, SUGESTOES_MEDICAMENTOS_MAXIMO))
+        
+        sugestoes = db.session.query(
+            MedicamentoFrequencia.nome, MedicamentoFrequencia.total, MedicamentoFrequencia.ativas
+        ).filter(
+            MedicamentoFrequencia.nome_normalizado >= prefixo,
+            MedicamentoFrequencia.nome_normalizado < fim_do_prefixo(prefixo),
+            MedicamentoFrequencia.total > 0
+        ).order_by(
+            MedicamentoFrequencia.total.desc(), MedicamentoFrequencia.nome_normalizado
+        ).limit(limite).all()
+        
+        return jsonify({
+            "prefixo": prefixo,
+            "sugestoes": [
+                {"medicamento": nome, "prescricoes": total, "prescricoes_ativas": ativas}
+                for nome, total, ativas in sugestoes
+            ]
+        })
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
 # === ROTAS DE AGENDA E DISPONIBILIDADE ===
 
 @app.route('/agenda-disponivel/protegido', methods=['GET'])
@@ -1108,20 +2895,21 @@ def listar_agenda_disponivel_protegida():
     return listar_agenda_disponivel()
 
 @app.route('/agenda-disponivel', methods=['GET'])
+@get_condicional('agenda_disponivel', 'profissional')
 def listar_agenda_disponivel():
     try:
         profissional_id = request.args.get('profissional_id')
         data_param = request.args.get('data')
         tipo_atendimento = request.args.get('tipo', 'ambos')  # presencial, online, ambos
         
-        query = AgendaDisponivel.query.filter_by(disponivel=True)
+        query = query_listagem_agenda().filter(AgendaDisponivel.disponivel == True)
         
         if profissional_id:
-            query = query.filter_by(profissional_id=profissional_id)
+            query = query.filter(AgendaDisponivel.profissional_id == profissional_id)
         
         if data_param:
             data_filtro = datetime.strptime(data_param, '%Y-%m-%d').date()
-            query = query.filter_by(data=data_filtro)
+            query = query.filter(AgendaDisponivel.data == data_filtro)
         
         if tipo_atendimento != 'ambos':
             query = query.filter(
@@ -1129,20 +2917,123 @@ def listar_agenda_disponivel():
                 (AgendaDisponivel.tipo_atendimento == 'ambos')
             )
         
-        agenda = query.all()
-        resultado = []
-        for a in agenda:
-            resultado.append({
-                'id': a.id,
-                'profissional': a.profissional_ref.nome,
-                'especialidade': a.profissional_ref.especialidade,
-                'data': a.data.strftime('%Y-%m-%d'),
-                'hora_inicio': a.hora_inicio.strftime('%H:%M'),
-                'hora_fim': a.hora_fim.strftime('%H:%M'),
-                'tipo_atendimento': a.tipo_atendimento,
-                'observacoes': a.observacoes
-            })
-        return jsonify(resultado)
+        return responder_listagem('agenda', query, AgendaDisponivel.id)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+# ===== PRÓXIMOS HORÁRIOS LIVRES =====
+
+# Uma única consulta: os horários livres dos profissionais ativos da
+# especialidade são numerados por profissional em ordem (data, hora_inicio)
+# (ROW_NUMBER, que percorre o índice ix_agenda_proximos já nessa ordem); só os
+# N primeiros de cada um entram na ordenação final, que devolve os N primeiros
+# no geral.
+PROXIMOS_HORARIOS_PADRAO = 10
+PROXIMOS_HORARIOS_MAXIMO = 100
+
+def parametro_a_partir_de():
+    valor = request.args.get('a_partir_de')
+    if not valor:
+        return datetime.now().replace(second=0, microsecond=0)
+    for formato in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            pass
+    raise ValueError("a_partir_de deve estar no formato YYYY-MM-DD ou YYYY-MM-DD HH:MM")
+
+def filtros_horarios_livres(a_partir_de, tipo_atendimento):
+    filtros = [
+        AgendaDisponivel.disponivel == True,
+        # data >= dia em separado para o índice usar a data como intervalo
+        AgendaDisponivel.data >= a_partir_de.date(),
+        (AgendaDisponivel.data > a_partir_de.date()) | (AgendaDisponivel.hora_inicio >= a_partir_de.time())
+    ]
+    if tipo_atendimento != 'ambos':
+        filtros.append(AgendaDisponivel.tipo_atendimento.in_((tipo_atendimento, 'ambos')))
+    return filtros
+
+def proximos_horarios_livres(especialidade, a_partir_de, tipo_atendimento, limite):
+    filtros = filtros_horarios_livres(a_partir_de, tipo_atendimento)
+    da_especialidade = (Profissional.especialidade == especialidade, Profissional.ativo == True)
+    
+    # Horizonte: um profissional sozinho já tem N horários até a data do seu
+    # N-ésimo, então a resposta não passa da menor dessas datas. Sem ele a
+    # numeração leria todos os horários futuros da especialidade.
+    enesimo_do_profissional = db.select(AgendaDisponivel.data).where(
+        AgendaDisponivel.profissional_id == Profissional.id, *filtros
+    ).order_by(AgendaDisponivel.data, AgendaDisponivel.hora_inicio, AgendaDisponivel.id).limit(1).offset(limite - 1)
+    horizonte = db.select(db.func.min(enesimo_do_profissional.scalar_subquery())).where(*da_especialidade)
+    
+    posicao = db.func.row_number().over(
+        partition_by=AgendaDisponivel.profissional_id,
+        order_by=(AgendaDisponivel.data, AgendaDisponivel.hora_inicio, AgendaDisponivel.id)
+    ).label('posicao')
+    
+    # A numeração só usa colunas do índice ix_agenda_proximos (sem ler a tabela);
+    # o profissional vai em IN para a agenda ser lida profissional a profissional
+    numerados = db.select(
+        AgendaDisponivel.id, AgendaDisponivel.data, AgendaDisponivel.hora_inicio, posicao
+    ).where(
+        AgendaDisponivel.profissional_id.in_(db.select(Profissional.id).where(*da_especialidade)),
+        AgendaDisponivel.data <= db.func.coalesce(horizonte.scalar_subquery(), date.max),
+        *filtros
+    ).subquery('numerados')
+    
+    primeiros = db.select(numerados.c.id).where(numerados.c.posicao <= limite).order_by(
+        numerados.c.data, numerados.c.hora_inicio, numerados.c.id
+    ).limit(limite)
+    
+    # Só os N escolhidos são lidos por inteiro
+    return db.session.query(
+        AgendaDisponivel.id, AgendaDisponivel.profissional_id, Profissional.nome.label('profissional'),
+        AgendaDisponivel.data, AgendaDisponivel.hora_inicio, AgendaDisponivel.hora_fim,
+        AgendaDisponivel.tipo_atendimento, AgendaDisponivel.observacoes
+    ).join(Profissional, AgendaDisponivel.profissional_id == Profissional.id).filter(
+        AgendaDisponivel.id.in_(primeiros)
+    ).order_by(AgendaDisponivel.data, AgendaDisponivel.hora_inicio, AgendaDisponivel.id).all()
+
+@app.route('/agenda-disponivel/proximos/protegido', methods=['GET'])
+@token_required
+def proximos_horarios_disponiveis_protegido():
+    
+    return proximos_horarios_disponiveis()
+
+@app.route('/agenda-disponivel/proximos', methods=['GET'])
+def proximos_horarios_disponiveis():
+    try:
+        especialidade = request.args.get('especialidade')
+        if not especialidade:
+            raise ValueError("especialidade é obrigatória")
+        
+        tipo_atendimento = request.args.get('tipo', 'ambos')  # presencial, online, ambos
+        a_partir_de = parametro_a_partir_de()
+        limite = request.args.get('n', PROXIMOS_HORARIOS_PADRAO, type=int)
+        if limite < 1 or limite > PROXIMOS_HORARIOS_MAXIMO:
+            raise ValueError(f"n deve estar entre 1 e {PROXIMOS_HORARIOS_MAXIMO}")
+        
+        itens = [{
+            'id': h.id,
+            'profissional_id': h.profissional_id,
+            'profissional': h.profissional,
+            'especialidade': especialidade,
+            'data': formatar_data(h.data),
+            'hora_inicio': formatar_hora(h.hora_inicio),
+            'hora_fim': formatar_hora(h.hora_fim),
+            'tipo_atendimento': h.tipo_atendimento,
+            'observacoes': h.observacoes
+        } for h in proximos_horarios_livres(especialidade, a_partir_de, tipo_atendimento, limite)]
+        
+        return jsonify({
+            'especialidade': especialidade,
+            'a_partir_de': a_partir_de.strftime('%Y-%m-%d %H:%M'),
+            'itens': itens,
+            'total': len(itens)
+        })
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -1186,16 +3077,83 @@ def ocupar_agenda_protegida(id):
 @app.route('/agenda-disponivel/<int:id>/ocupar', methods=['PUT'])
 def ocupar_agenda(id):
     try:
-        agenda = AgendaDisponivel.query.get_or_404(id)
+        dados = request.get_json(silent=True) or {}
+        paciente_id = dados.get('paciente_id')
+        tipo = dados.get('tipo', 'presencial')  # presencial ou online (para horários "ambos")
+        
+        if tipo not in ('presencial', 'online'):
+            return jsonify({"erro": "Tipo deve ser presencial ou online"}), 400
         
-        if not agenda.disponivel:
-            return jsonify({"erro": "Horário já ocupado"}), 400
+        if paciente_id and not db.session.get(Paciente, paciente_id):
+            return jsonify({"erro": "Paciente não encontrado"}), 404
+        
+        # Compare-and-set: só reserva se o horário ainda estiver livre (e aceitar
+        # o tipo pedido). Duas reservas simultâneas não passam ambas do WHERE, e o
+        # lock de escrita vai só desse UPDATE até o commit, sem leitura no meio.
+        filtros = [AgendaDisponivel.id == id, AgendaDisponivel.disponivel == True]
+        if paciente_id:
+            filtros.append(AgendaDisponivel.tipo_atendimento.in_((tipo, 'ambos')))
+        
+        reservado = db.session.execute(
+            db.update(AgendaDisponivel).where(*filtros).values(
+                disponivel=False, paciente_id=paciente_id
+            ).returning(
+                AgendaDisponivel.profissional_id, AgendaDisponivel.data, AgendaDisponivel.hora_inicio
+            ).execution_options(synchronize_session=False)
+        ).first()
+        
+        if reservado is None:
+            db.session.rollback()
+            agenda = db.session.get(AgendaDisponivel, id)
+            if agenda is None:
+                return jsonify({"erro": "Horário não encontrado"}), 404
+            if not agenda.disponivel:
+                return jsonify({"erro": "Horário já ocupado"}), 409
+            return jsonify({"erro": f"Horário não atende o tipo {tipo}"}), 400
+        
+        resposta = {"message": "Horário reservado com sucesso!"}
+        
+        # Com paciente, a consulta/atendimento nasce na mesma transação da reserva
+        if paciente_id:
+            data_hora = datetime.combine(reservado.data, reservado.hora_inicio)
+            if tipo == 'online':
+                import uuid
+                atendimento = AtendimentoOnline(
+                    paciente_id=paciente_id,
+                    profissional_id=reservado.profissional_id,
+                    data_inicio=data_hora,
+                    link_videochamada=f"https://vidaplus-meet.com/room/{uuid.uuid4().hex[:8]}",
+                    observacoes=dados.get('observacoes', '')
+                )
+                db.session.add(atendimento)
+                contabilizar_atendimento_online(data_hora, reservado.profissional_id, 'agendado', 1)
+                db.session.flush()
+                vinculo = {'atendimento_online_id': atendimento.id}
+                resposta.update(vinculo, link_videochamada=atendimento.link_videochamada)
+            else:
+                consulta = Consulta(
+                    paciente_id=paciente_id,
+                    profissional_id=reservado.profissional_id,
+                    data_consulta=data_hora,
+                    tipo='presencial',
+                    observacoes=dados.get('observacoes')
+                )
+                db.session.add(consulta)
+                contabilizar_consulta(consulta, 'agendada', 1)
+                db.session.flush()
+                vinculo = {'consulta_id': consulta.id}
+                resposta.update(vinculo)
+            
+            db.session.execute(
+                db.update(AgendaDisponivel).where(AgendaDisponivel.id == id).values(**vinculo)
+                .execution_options(synchronize_session=False)
+            )
         
-        agenda.disponivel = False
         db.session.commit()
         
-        return jsonify({"message": "Horário reservado com sucesso!"})
+        return jsonify(resposta)
     except Exception as e:
+        db.session.rollback()
         return jsonify({"erro": str(e)}), 500
 
 # === ROTAS DE AUTENTICAÇÃO ===
@@ -1240,6 +3198,8 @@ def registrar_usuario():
             }
         }), 201
         
+    except FilaHashCheia:
+        return resposta_fila_hash_cheia()
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -1259,6 +3219,10 @@ def login():
         if not usuario.ativo:
             return jsonify({"erro": "Usuário inativo"}), 401
         
+        # Refaz o hash se o custo configurado mudou
+        if hash_senha_desatualizado(usuario.password_hash):
+            usuario.set_password(dados['password'])
+        
         usuario.ultimo_login = datetime.utcnow()
         db.session.commit()
         
@@ -1275,6 +3239,8 @@ def login():
             }
         }), 200
         
+    except FilaHashCheia:
+        return resposta_fila_hash_cheia()
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -1282,7 +3248,7 @@ def login():
 @token_required
 def usuario_atual():
     try:
-        usuario = request.current_user
+        usuario = Usuario.query.get_or_404(request.current_user.id)
         return jsonify({
             "id": usuario.id,
             "username": usuario.username,
@@ -1293,10 +3259,359 @@ def usuario_atual():
     except Exception as e:
         return jsonify({"erro": str(e)}), 500    
 
+@app.route('/auth/cache/estatisticas', methods=['GET'])
+@token_required
+@admin_required
+def estatisticas_cache_autenticacao():
+    return jsonify({"principais": cache_principais.estatisticas()})
+
+@app.route('/cache/fragmentos/estatisticas', methods=['GET'])
+@token_required
+@admin_required
+def estatisticas_cache_fragmentos():
+    return jsonify({"fragmentos": cache_fragmentos.estatisticas()})
+
+# ===== MIGRAÇÕES DO BANCO =====
+
+# O schema é versionado: cada migração roda uma única vez, em ordem, e fica
+# registrada na tabela versao_schema. Novas mudanças de schema (índices,
+# tabelas, colunas) entram como uma nova migração no fim da lista, escritas de
+# forma idempotente para bancos criados antes do versionamento.
+
+class VersaoSchema(db.Model):
+    __tablename__ = 'versao_schema'
+    versao = db.Column(db.Integer, primary_key=True)
+    descricao = db.Column(db.String(200), nullable=False)
+    aplicada_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+MIGRACOES = []
+
+def migracao(versao, descricao):
+    def registrar(f):
+        MIGRACOES.append((versao, descricao, f))
+        return f
+    return registrar
+
+def executar_sql(*comandos):
+    for comando in comandos:
+        db.session.execute(db.text(comando))
+
+@migracao(1, 'Tabelas iniciais')
+def migracao_tabelas_iniciais():
+    db.create_all()
+
+@migracao(2, 'Índices das consultas mais frequentes')
+def migracao_indices():
+    executar_sql(
+        'CREATE INDEX IF NOT EXISTS ix_consulta_paciente ON consulta (paciente_id)',
+        'CREATE INDEX IF NOT EXISTS ix_consulta_profissional_data ON consulta (profissional_id, data_consulta)',
+        'CREATE INDEX IF NOT EXISTS ix_consulta_data ON consulta (data_consulta)',
+        'CREATE INDEX IF NOT EXISTS ix_exame_paciente ON exame (paciente_id)',
+        'CREATE INDEX IF NOT EXISTS ix_leito_paciente_ocupado ON leito (paciente_id, ocupado)',
+        'CREATE INDEX IF NOT EXISTS ix_leito_setor_ocupado ON leito (setor, ocupado)',
+        'CREATE INDEX IF NOT EXISTS ix_atendimento_online_data_inicio ON atendimento_online (data_inicio)',
+        'CREATE INDEX IF NOT EXISTS ix_atendimento_online_paciente ON atendimento_online (paciente_id)',
+        'CREATE INDEX IF NOT EXISTS ix_atendimento_online_profissional ON atendimento_online (profissional_id, data_inicio)',
+        'CREATE INDEX IF NOT EXISTS ix_prescricao_paciente_ativo ON prescricao (paciente_id, ativo)',
+        'CREATE INDEX IF NOT EXISTS ix_prescricao_profissional ON prescricao (profissional_id)',
+        'CREATE INDEX IF NOT EXISTS ix_agenda_disponivel_profissional_data ON agenda_disponivel (disponivel, profissional_id, data)',
+        'CREATE INDEX IF NOT EXISTS ix_agenda_disponivel_data ON agenda_disponivel (disponivel, data)',
+    )
+
+@migracao(3, 'Contadores diários de consultas por status')
+def migracao_contagem_consultas_dia():
+    ContagemConsultasDia.__table__.create(db.session.connection(), checkfirst=True)
+    executar_sql(
+        'DELETE FROM contagem_consultas_dia',
+        "INSERT INTO contagem_consultas_dia (data, status, total) "
+        "SELECT date(data_consulta), COALESCE(status, 'agendada'), count(*) "
+        "FROM consulta GROUP BY date(data_consulta), COALESCE(status, 'agendada')",
+    )
+
+SQL_RECALCULO_OCUPACAO_SETOR = (
+    "SELECT setor, count(*) AS total, COALESCE(sum(ocupado), 0) AS ocupados "
+    "FROM leito GROUP BY setor"
+)
+
+@migracao(4, 'Resumo de ocupação dos leitos por setor')
+def migracao_ocupacao_setor():
+    OcupacaoSetor.__table__.create(db.session.connection(), checkfirst=True)
+    executar_sql(
+        'DELETE FROM ocupacao_setor',
+        'INSERT INTO ocupacao_setor (setor, total, ocupados) ' + SQL_RECALCULO_OCUPACAO_SETOR,
+    )
+
+@migracao(5, 'Índice de prescrições ativas por medicamento')
+def migracao_indice_prescricao_medicamento():
+    executar_sql('CREATE INDEX IF NOT EXISTS ix_prescricao_ativo_medicamento ON prescricao (ativo, medicamento)')
+
+@migracao(6, 'Contadores por hora dos atendimentos online')
+def migracao_contagem_atendimentos_hora():
+    ContagemAtendimentosHora.__table__.create(db.session.connection(), checkfirst=True)
+    executar_sql('DELETE FROM contagem_atendimentos_hora')
+    
+    # Agrupado em Python: data_inicio é gravado com e sem microssegundos conforme
+    # a rota, e a hora truncada precisa ficar no mesmo formato que o ORM grava
+    contagens = Counter()
+    atendimentos = db.session.query(
+        AtendimentoOnline.data_inicio, AtendimentoOnline.profissional_id, AtendimentoOnline.status
+    ).yield_per(TAMANHO_LOTE_STREAM)
+    for data_inicio, profissional_id, status in atendimentos:
+        contagens[(hora_do_atendimento(data_inicio), profissional_id, status or 'agendado')] += 1
+    
+    if contagens:
+        db.session.execute(sqlite_insert(ContagemAtendimentosHora), [
+            {'hora': hora, 'profissional_id': profissional_id, 'status': status, 'total': total}
+            for (hora, profissional_id, status), total in contagens.items()
+        ])
+
+@migracao(7, 'Contadores mensais de produtividade dos profissionais')
+def migracao_produtividade_mes():
+    ProdutividadeMes.__table__.create(db.session.connection(), checkfirst=True)
+    executar_sql(
+        'CREATE INDEX IF NOT EXISTS ix_prescricao_created_at ON prescricao (created_at)',
+        'DELETE FROM produtividade_mes',
+        "INSERT INTO produtividade_mes (mes, profissional_id, tipo, status, total) "
+        "SELECT strftime('%Y-%m', data_consulta), profissional_id, 'consulta', COALESCE(status, 'agendada'), count(*) "
+        "FROM consulta GROUP BY 1, 2, 4",
+        "INSERT INTO produtividade_mes (mes, profissional_id, tipo, status, total) "
+        "SELECT strftime('%Y-%m', data_inicio), profissional_id, 'atendimento_online', COALESCE(status, 'agendado'), count(*) "
+        "FROM atendimento_online GROUP BY 1, 2, 4",
+        "INSERT INTO produtividade_mes (mes, profissional_id, tipo, status, total) "
+        "SELECT strftime('%Y-%m', created_at), profissional_id, 'prescricao', 'emitida', count(*) "
+        "FROM prescricao GROUP BY 1, 2",
+    )
+
+@migracao(8, 'Índices da busca de próximos horários livres')
+def migracao_indices_proximos_horarios():
+    executar_sql(
+        'CREATE INDEX IF NOT EXISTS ix_profissional_especialidade ON profissional (especialidade)',
+        # Cobre a ordenação por (data, hora_inicio); torna o índice antigo redundante
+        'CREATE INDEX IF NOT EXISTS ix_agenda_proximos ON agenda_disponivel (disponivel, profissional_id, data, hora_inicio)',
+        'DROP INDEX IF EXISTS ix_agenda_disponivel_profissional_data',
+    )
+
+def colunas_da_tabela(tabela):
+    return {linha[1] for linha in db.session.execute(db.text(f'PRAGMA table_info({tabela})'))}
+
+@migracao(9, 'Vínculo da agenda com paciente, consulta e atendimento online')
+def migracao_vinculos_agenda():
+    existentes = colunas_da_tabela('agenda_disponivel')
+    for coluna, referencia in (('paciente_id', 'paciente'), ('consulta_id', 'consulta'),
+                               ('atendimento_online_id', 'atendimento_online')):
+        if coluna not in existentes:
+            executar_sql(f'ALTER TABLE agenda_disponivel ADD COLUMN {coluna} INTEGER REFERENCES {referencia} (id)')
+
+@migracao(10, 'Versão por registro de pacientes e profissionais (cache de fragmentos)')
+def migracao_versao_registros():
+    for tabela in ('paciente', 'profissional'):
+        if 'versao' not in colunas_da_tabela(tabela):
+            executar_sql(f'ALTER TABLE {tabela} ADD COLUMN versao INTEGER NOT NULL DEFAULT 1')
+    executar_sql(
+        # Cobrem a primeira leitura das listagens, que só precisa de (id, versao)
+        'CREATE INDEX IF NOT EXISTS ix_paciente_id_versao ON paciente (id, versao)',
+        'CREATE INDEX IF NOT EXISTS ix_profissional_ativo_id_versao ON profissional (ativo, id, versao)',
+    )
+
+@migracao(11, 'Índice de busca de pacientes (nome, CPF e data de nascimento)')
+def migracao_busca_pacientes():
+    executar_sql(
+        SQL_CRIAR_BUSCA_PACIENTES,
+        'CREATE INDEX IF NOT EXISTS ix_paciente_nascimento_nome ON paciente (data_nascimento, nome)',
+    )
+    reindexar_busca_pacientes()
+
+@migracao(12, 'Nome normalizado dos medicamentos e frequência para o autocomplete')
+def migracao_medicamentos_normalizados():
+    if 'medicamento_normalizado' not in colunas_da_tabela('prescricao'):
+        executar_sql('ALTER TABLE prescricao ADD COLUMN medicamento_normalizado VARCHAR(200)')
+    MedicamentoFrequencia.__table__.create(db.session.connection(), checkfirst=True)
+    executar_sql('DELETE FROM medicamento_frequencia')
+    
+    # A normalização (acentos) é feita em Python, um UPDATE por grafia distinta
+    frequencias = {}
+    for medicamento, total, ativas in db.session.query(
+        Prescricao.medicamento, db.func.count(), db.func.coalesce(db.func.sum(db.cast(Prescricao.ativo, db.Integer)), 0)
+    ).group_by(Prescricao.medicamento):
+        normalizado = normalizar_medicamento(medicamento)
+        db.session.execute(
+            db.update(Prescricao).where(Prescricao.medicamento == medicamento).values(medicamento_normalizado=normalizado)
+        )
+        nome, total_atual, ativas_atual = frequencias.get(normalizado, (medicamento.strip(), 0, 0))
+        frequencias[normalizado] = (nome, total_atual + total, ativas_atual + ativas)
+    
+    if frequencias:
+        db.session.execute(db.insert(MedicamentoFrequencia), [
+            {'nome_normalizado': normalizado, 'nome': nome, 'total': total, 'ativas': ativas}
+            for normalizado, (nome, total, ativas) in frequencias.items()
+        ])
+    executar_sql(
+        'CREATE INDEX IF NOT EXISTS ix_prescricao_medicamento_normalizado '
+        'ON prescricao (medicamento_normalizado, ativo, id)'
+    )
+
+@migracao(13, 'Índice do CPF só com dígitos (busca de pacientes por CPF)')
+def migracao_indice_cpf_digitos():
+    executar_sql(f'CREATE INDEX IF NOT EXISTS ix_paciente_cpf_digitos ON paciente ({SQL_CPF_DIGITOS})')
+
+@migracao(14, 'Busca de pacientes: chave de relevância no rowid e prefixos de até 6 letras')
+def migracao_busca_pacientes_por_relevancia():
+    executar_sql('DROP TABLE IF EXISTS paciente_busca', SQL_CRIAR_BUSCA_PACIENTES)
+    reindexar_busca_pacientes()
+
+def aplicar_migracoes():
+    VersaoSchema.__table__.create(db.engine, checkfirst=True)
+    # Precisa existir antes de qualquer commit, pois todo commit registra versões
+    VersaoDados.__table__.create(db.engine, checkfirst=True)
+    aplicadas = {v.versao for v in VersaoSchema.query.all()}
+    
+    for versao, descricao, executar in sorted(MIGRACOES, key=lambda m: m[0]):
+        if versao in aplicadas:
+            continue
+        try:
+            executar()
+            db.session.add(VersaoSchema(versao=versao, descricao=descricao))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        print(f"Migração {versao} aplicada: {descricao}")
+
+@app.cli.command('migrar')
+def comando_migrar():
+    aplicar_migracoes()
+    print("Banco de dados atualizado!")
+
+# "flask --app app reparar-ocupacao-leitos" recalcula o resumo por setor a
+# partir da tabela leito e mostra as diferenças encontradas (drift)
+def reparar_ocupacao_setor():
+    esperado = {
+        linha.setor: (linha.total, linha.ocupados)
+        for linha in db.session.execute(db.text(SQL_RECALCULO_OCUPACAO_SETOR))
+    }
+    atual = {linha.setor: (linha.total, linha.ocupados) for linha in OcupacaoSetor.query.all()}
+    
+    divergencias = []
+    for setor in sorted(set(esperado) | set(atual)):
+        if esperado.get(setor, (0, 0)) != atual.get(setor, (0, 0)):
+            divergencias.append((setor, atual.get(setor, (0, 0)), esperado.get(setor, (0, 0))))
+    
+    if divergencias:
+        executar_sql(
+            'DELETE FROM ocupacao_setor',
+            'INSERT INTO ocupacao_setor (setor, total, ocupados) ' + SQL_RECALCULO_OCUPACAO_SETOR,
+        )
+        incrementar_versao(OcupacaoSetor.__tablename__)
+    db.session.commit()
+    return divergencias
+
+# "flask --app app reindexar-busca-pacientes" reconstrói o índice de busca a
+# partir da tabela paciente (ex.: após cargas feitas direto no banco)
+@app.cli.command('reindexar-busca-pacientes')
+def comando_reindexar_busca_pacientes():
+    reindexar_busca_pacientes()
+    db.session.commit()
+    print("✅ Índice de busca de pacientes reconstruído")
+
+@app.cli.command('reparar-ocupacao-leitos')
+def comando_reparar_ocupacao_leitos():
+    divergencias = reparar_ocupacao_setor()
+    for setor, (total, ocupados), (total_real, ocupados_real) in divergencias:
+        print(f"⚠️  {setor}: total {total} -> {total_real}, ocupados {ocupados} -> {ocupados_real}")
+    
+    if divergencias:
+        print(f"🔧 {len(divergencias)} setor(es) corrigido(s)")
+    else:
+        print("✅ Resumo de ocupação consistente com a tabela de leitos")
+
+# ===== VERIFICAÇÃO DOS PLANOS DE CONSULTA =====
+
+# "flask --app app verificar-planos" chama todas as rotas GET públicas, captura
+# os SELECTs executados e roda EXPLAIN QUERY PLAN em cada um. Se alguma tabela
+# for lida com SCAN (varredura completa) o comando falha, o que pega índices
+# faltando ou consultas que deixaram de usar índice.
+
+# Parâmetros enviados para todas as rotas (rotas ignoram os que não usam);
+# o cursor faz as listagens paginadas buscarem pela chave, como a partir da 2ª página
+PARAMETROS_VERIFICACAO_PLANOS = {
+    'cursor': '1',
+    'data': '2024-01-01',
+    'data_inicio': '2024-01-01',
+    'data_fim': '2024-01-31',
+    'especialidade': 'Cardiologia',
+    'q': 'Maria',
+    'medicamento': 'Amoxicilina',
+    'prefixo': 'amo',
+}
+
+# Varreduras esperadas: (rota, tabela)
+SCANS_PERMITIDOS = {
+    # O quadro de leitos é carregado inteiro no índice em memória
+    ('/leitos', 'leito'),
+    # O relatório cobre todos os profissionais
+    ('/relatorios/profissionais-produtividade', 'profissional'),
+    # O resumo tem uma linha por setor e é lido inteiro
+    ('/relatorios/ocupacao-leitos', 'ocupacao_setor'),
+    # Consulta ao índice FTS5 aparece como SCAN da tabela virtual
+    ('/pacientes/busca', 'paciente_busca'),
+    # "numerados" são os horários até o horizonte, já lidos pelo índice
+    ('/agenda-disponivel/proximos', 'numerados'),
+}
+
+def verificar_planos_de_consulta():
+    capturados = []
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            capturados.append((statement, parameters))
+    
+    problemas = []
+    cliente = app.test_client()
+    event.listen(db.engine, 'before_cursor_execute', capturar)
+    try:
+        for regra in app.url_map.iter_rules():
+            if 'GET' not in regra.methods or regra.endpoint == 'static' or 'protegido' in regra.rule:
+                continue
+            
+            url = regra.rule
+            for argumento in regra.arguments:
+                url = url.replace(f'<int:{argumento}>', '1').replace(f'<{argumento}>', '1')
+            
+            capturados.clear()
+            cliente.get(url, query_string=PARAMETROS_VERIFICACAO_PLANOS)
+            
+            with db.engine.connect() as conexao:
+                for statement, parameters in list(capturados):
+                    plano = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+                    for linha in plano:
+                        detalhe = linha[-1]
+                        if not detalhe.startswith('SCAN '):
+                            continue
+                        tabela = detalhe.split()[1]
+                        # "(subquery-N)" é resultado intermediário do próprio SQLite
+                        # (ex.: a janela do ROW_NUMBER), não uma tabela
+                        if tabela.startswith('(subquery-') or (regra.rule, tabela) in SCANS_PERMITIDOS:
+                            continue
+                        problemas.append((regra.rule, detalhe, ' '.join(statement.split())))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capturar)
+    
+    return problemas
+
+@app.cli.command('verificar-planos')
+def comando_verificar_planos():
+    problemas = verificar_planos_de_consulta()
+    for rota, detalhe, statement in problemas:
+        print(f"❌ {rota}: {detalhe}")
+        print(f"   {statement}")
+    
+    if problemas:
+        sys.exit(1)
+    print("✅ Nenhuma consulta com varredura completa de tabela")
+
 # Função para criar as tabelas
 def criar_tabelas():
     with app.app_context():
-        db.create_all()
+        aplicar_migracoes()
         
         # Criar usuário admin padrão
         admin_existente = Usuario.query.filter_by(cargo='admin').first()
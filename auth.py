@@ -1,16 +1,69 @@
 # Sistema de Controle de Acesso para VidaPlus
 from flask import Flask, app, request, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from functools import wraps
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import jwt
 import os
+import threading
+import time
 
 # Configurações de segurança
 SECRET_KEY = 'vidaplus-jwt-secret-2024'
 TOKEN_EXPIRATION_HOURS = 8
 
+# ===== HASH DE SENHAS =====
+# Adicione junto com as configurações. O PBKDF2 roda num pool de processos com
+# fila limitada (acima do limite o login responde 503) e o custo é configurável;
+# senhas com custo diferente do atual são refeitas no próximo login.
+
+HASH_SENHA_ITERACOES = int(os.environ.get('VIDAPLUS_HASH_ITERACOES', 600000))
+HASH_SENHA_METODO = f'pbkdf2:sha256:{HASH_SENHA_ITERACOES}'
+HASH_POOL_PROCESSOS = int(os.environ.get('VIDAPLUS_HASH_PROCESSOS', os.cpu_count() or 2))
+HASH_FILA_MAXIMA = int(os.environ.get('VIDAPLUS_HASH_FILA_MAXIMA', 64))
+HASH_TIMEOUT_SEGUNDOS = 30
+
+class FilaHashCheia(Exception):
+    pass
+
+_pool_hash = None
+_pool_hash_lock = threading.Lock()
+_vagas_fila_hash = threading.BoundedSemaphore(HASH_FILA_MAXIMA)
+
+def pool_hash():
+    # Criado sob demanda para que cada worker do gunicorn tenha o seu pool
+    global _pool_hash
+    with _pool_hash_lock:
+        if _pool_hash is None:
+            _pool_hash = ProcessPoolExecutor(max_workers=HASH_POOL_PROCESSOS)
+        return _pool_hash
+
+def executar_no_pool_hash(funcao, *args):
+    if not _vagas_fila_hash.acquire(blocking=False):
+        raise FilaHashCheia()
+    try:
+        return pool_hash().submit(funcao, *args).result(timeout=HASH_TIMEOUT_SEGUNDOS)
+    finally:
+        _vagas_fila_hash.release()
+
+def gerar_hash_senha(senha):
+    return executar_no_pool_hash(generate_password_hash, senha, HASH_SENHA_METODO)
+
+def verificar_hash_senha(password_hash, senha):
+    return executar_no_pool_hash(check_password_hash, password_hash, senha)
+
+def hash_senha_desatualizado(password_hash):
+    return password_hash.split('$', 1)[0] != HASH_SENHA_METODO
+
+def resposta_fila_hash_cheia():
+    resposta = jsonify({"erro": "Servidor ocupado, tente novamente em instantes"})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
 # ===== MODELO DE USUÁRIO =====
 # Adicione esta classe ao seu app.py, junto com os outros modelos
 
@@ -26,10 +79,10 @@ class Usuario(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = gerar_hash_senha(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verificar_hash_senha(self.password_hash, password)
     
     def generate_token(self):
         payload = {
@@ -50,6 +103,103 @@ class Usuario(db.Model):
         except jwt.InvalidTokenError:
             return None
 
+# ===== CACHE DE AUTENTICAÇÃO =====
+# Adicione junto com os decoradores. Tokens já verificados ficam associados a um
+# "principal" leve (id, username, cargo, ativo), evitando ir ao banco a cada
+# requisição. Com vários workers, cada um tem o seu cache: toggle_usuario e
+# alterar_senha sobem, no mesmo commit, a versão global das credenciais
+# (linha "usuario:credenciais" em versao_dados). Cada principal guarda a versão
+# da sua carga e só vale enquanto ela for a versão conhecida pelo worker, que a
+# relê logo após as próprias alterações e, das feitas em outros workers, no
+# máximo a cada CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS (o atraso máximo).
+
+CACHE_PRINCIPAIS_TAMANHO = 10000
+CACHE_PRINCIPAIS_TTL_SEGUNDOS = 60
+CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS = float(os.environ.get('VIDAPLUS_CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS', 2))
+CHAVE_VERSAO_CREDENCIAIS = 'usuario:credenciais'
+
+# O app.py já tem esta tabela (também usada pelos ETags); não duplique
+class VersaoDados(db.Model):
+    __tablename__ = 'versao_dados'
+    tabela = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+class CacheTTL:
+    def __init__(self, tamanho_maximo, ttl):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._dados = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def obter(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._dados[chave]
+                self.misses += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return item[1]
+    
+    def guardar(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._dados[chave] = (expira_em, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+    
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'itens': len(self._dados),
+                'tamanho_maximo': self.tamanho_maximo,
+                'hits': self.hits,
+                'misses': self.misses,
+                'taxa_acerto': round(self.hits / consultas * 100, 2) if consultas > 0 else 0
+            }
+
+Principal = namedtuple('Principal', ['id', 'username', 'cargo', 'ativo', 'versao'])
+
+cache_principais = CacheTTL(CACHE_PRINCIPAIS_TAMANHO, CACHE_PRINCIPAIS_TTL_SEGUNDOS)
+
+class VersaoCredenciais:
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._versao = None
+        self._lida_em = 0.0
+    
+    def atual(self):
+        with self._lock:
+            if self._versao is None or time.monotonic() - self._lida_em >= self.intervalo:
+                linha = db.session.get(VersaoDados, CHAVE_VERSAO_CREDENCIAIS)
+                self._versao = linha.versao if linha else 0
+                self._lida_em = time.monotonic()
+            return self._versao
+    
+    def esquecer(self):
+        # Próxima requisição relê do banco (alteração feita neste worker)
+        with self._lock:
+            self._versao = None
+
+versao_credenciais = VersaoCredenciais(CACHE_PRINCIPAIS_CONFERENCIA_SEGUNDOS)
+
+def subir_versao_credenciais():
+    # Chame antes do commit que muda ativo, cargo ou senha; depois do commit,
+    # versao_credenciais.esquecer()
+    db.session.execute(
+        sqlite_insert(VersaoDados).values(tabela=CHAVE_VERSAO_CREDENCIAIS, versao=1).on_conflict_do_update(
+            index_elements=['tabela'],
+            set_={'versao': VersaoDados.versao + 1}
+        )
+    )
+
 # ===== DECORADORES DE AUTENTICAÇÃO =====
 
 def token_required(f):
@@ -64,16 +214,29 @@ def token_required(f):
             if token.startswith('Bearer '):
                 token = token.split(' ')[1]
             
-            payload = Usuario.verify_token(token)
-            if not payload:
-                return jsonify({'erro': 'Token inválido ou expirado'}), 401
+            versao = versao_credenciais.atual()
+            principal = cache_principais.obter(token)
+            if principal is not None and principal.versao != versao:
+                principal = None
             
-            # Verificar se usuário ainda está ativo
-            usuario = Usuario.query.get(payload['user_id'])
-            if not usuario or not usuario.ativo:
-                return jsonify({'erro': 'Usuário inativo'}), 401
+            if principal is None:
+                payload = Usuario.verify_token(token)
+                if not payload:
+                    return jsonify({'erro': 'Token inválido ou expirado'}), 401
+                
+                # Verificar se usuário ainda está ativo (a versão foi lida antes:
+                # se ele mudar no meio, o principal é recarregado depois)
+                usuario = Usuario.query.get(payload['user_id'])
+                if not usuario or not usuario.ativo:
+                    return jsonify({'erro': 'Usuário inativo'}), 401
+                
+                principal = Principal(usuario.id, usuario.username, usuario.cargo, usuario.ativo, versao)
+                
+                # O token nunca fica no cache depois de expirar
+                ttl = min(CACHE_PRINCIPAIS_TTL_SEGUNDOS, payload['exp'] - time.time())
+                cache_principais.guardar(token, principal, ttl)
             
-            request.current_user = usuario
+            request.current_user = principal
             
         except Exception as e:
             return jsonify({'erro': 'Erro na validação do token'}), 401
@@ -153,6 +316,8 @@ def registrar_usuario():
             }
         }), 201
         
+    except FilaHashCheia:
+        return resposta_fila_hash_cheia()
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -173,6 +338,10 @@ def login():
         if not usuario.ativo:
             return jsonify({"erro": "Usuário inativo"}), 401
         
+        # Refaz o hash se o custo configurado mudou
+        if hash_senha_desatualizado(usuario.password_hash):
+            usuario.set_password(dados['password'])
+        
         # Atualizar último login
         usuario.ultimo_login = datetime.utcnow()
         db.session.commit()
@@ -192,6 +361,8 @@ def login():
             }
         }), 200
         
+    except FilaHashCheia:
+        return resposta_fila_hash_cheia()
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -199,7 +370,7 @@ def login():
 @token_required
 def usuario_atual():
     try:
-        usuario = request.current_user
+        usuario = Usuario.query.get_or_404(request.current_user.id)
         return jsonify({
             "id": usuario.id,
             "username": usuario.username,
@@ -245,7 +416,9 @@ def toggle_usuario(id):
             return jsonify({"erro": "Não é possível desativar seu próprio usuário"}), 400
         
         usuario.ativo = not usuario.ativo
+        subir_versao_credenciais()
         db.session.commit()
+        versao_credenciais.esquecer()
         
         status = "ativado" if usuario.ativo else "desativado"
         return jsonify({"message": f"Usuário {status} com sucesso!"})
@@ -262,7 +435,7 @@ def alterar_senha():
         if not dados.get('senha_atual') or not dados.get('nova_senha'):
             return jsonify({"erro": "Senha atual e nova senha são obrigatórias"}), 400
         
-        usuario = request.current_user
+        usuario = Usuario.query.get_or_404(request.current_user.id)
         
         # Verificar senha atual
         if not usuario.check_password(dados['senha_atual']):
@@ -274,13 +447,23 @@ def alterar_senha():
         
         # Atualizar senha
         usuario.set_password(dados['nova_senha'])
+        subir_versao_credenciais()
         db.session.commit()
+        versao_credenciais.esquecer()
         
         return jsonify({"message": "Senha alterada com sucesso!"})
         
+    except FilaHashCheia:
+        return resposta_fila_hash_cheia()
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+@app.route('/auth/cache/estatisticas', methods=['GET'])
+@token_required
+@admin_required
+def estatisticas_cache_autenticacao():
+    return jsonify({"principais": cache_principais.estatisticas()})
+
 # ===== PROTEÇÕES DAS ROTAS =====
 
 @app.route('/pacientes-protegido', methods=['POST'])
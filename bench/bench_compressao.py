@@ -0,0 +1,95 @@
+# Bytes enviados e CPU por requisição, sem compressão, com gzip e com deflate,
+# nas listagens com textos longos (normais e em streaming).
+# Uso: python bench/bench_compressao.py [repeticoes]
+import gzip
+import random
+import statistics
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from comum import preparar
+
+preparar()
+import app as vidaplus  # noqa: E402
+
+REPETICOES = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+ENDPOINTS = [
+    '/consultas?limit=500',
+    '/atendimentos-online?limit=500',
+    '/pacientes?limit=500',
+    '/consultas?stream=1',
+    '/atendimentos-online?stream=1',
+]
+
+aleatorio = random.Random(3)
+PALAVRAS = ('paciente relata dor abdominal febre persistente cefaleia tosse seca há três dias '
+            'sem melhora com analgésico histórico de hipertensão').split()
+
+
+def texto(palavras):
+    return ' '.join(aleatorio.choice(PALAVRAS) for _ in range(palavras))
+
+
+def popular():
+    db = vidaplus.db
+    vidaplus.aplicar_migracoes()
+    db.session.execute(db.insert(vidaplus.Paciente), [
+        {'nome': f'Paciente {i}', 'cpf': f'{i:011d}', 'email': f'p{i}@exemplo.com', 'endereco': texto(8)}
+        for i in range(2000)
+    ])
+    db.session.execute(db.insert(vidaplus.Profissional), [
+        {'nome': f'Profissional {i}', 'crm_coren': f'CRM{i}', 'especialidade': 'Clínica', 'tipo': 'medico'}
+        for i in range(20)
+    ])
+    inicio = datetime(2025, 1, 1)
+    db.session.execute(db.insert(vidaplus.Consulta), [
+        {'paciente_id': 1 + i % 2000, 'profissional_id': 1 + i % 20, 'data_consulta': inicio + timedelta(hours=i),
+         'tipo': 'presencial', 'status': 'agendada', 'observacoes': texto(40)}
+        for i in range(5000)
+    ])
+    db.session.execute(db.insert(vidaplus.AtendimentoOnline), [
+        {'paciente_id': 1 + i % 2000, 'profissional_id': 1 + i % 20, 'data_inicio': inicio + timedelta(hours=i),
+         'status': 'finalizado', 'observacoes': texto(30), 'sintomas_relatados': texto(30), 'diagnostico': texto(20),
+         'link_videochamada': 'https://vidaplus-meet.com/room/abcd1234'}
+        for i in range(3000)
+    ])
+    db.session.commit()
+
+
+def medir(cliente, url, codificacao):
+    cabecalhos = {'Accept-Encoding': codificacao} if codificacao else {}
+    # Aquecimento: cache de páginas do SQLite, de fragmentos e do zlib
+    for _ in range(2):
+        cliente.get(url, headers=cabecalhos).get_data()
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.process_time()
+        resposta = cliente.get(url, headers=cabecalhos)
+        dados = resposta.get_data()
+        resposta.close()
+        tempos.append((time.process_time() - inicio) * 1000)
+    return resposta, dados, statistics.median(tempos)
+
+
+DESCOMPRIMIR = {'gzip': gzip.decompress, 'deflate': zlib.decompress}
+
+with vidaplus.app.app_context():
+    popular()
+cliente = vidaplus.app.test_client()
+
+print(f'nível {vidaplus.COMPRESSAO_NIVEL}, CPU por requisição (mediana de {REPETICOES}, após aquecimento)')
+print(f'{"endpoint":34s} {"bytes":>10s} {"gzip":>10s} {"deflate":>10s} {"ms":>7s} {"ms gzip":>8s} {"ms defl":>8s}')
+for url in ENDPOINTS:
+    _, original, cpu = medir(cliente, url, None)
+    colunas = [len(original)], [cpu]
+    for codificacao in ('gzip', 'deflate'):
+        resposta, dados, cpu = medir(cliente, url, codificacao)
+        assert resposta.headers.get('Content-Encoding') == codificacao
+        assert DESCOMPRIMIR[codificacao](dados) == original
+        colunas[0].append(len(dados))
+        colunas[1].append(cpu)
+    tamanhos, tempos = colunas
+    print(f'{url:34s} {tamanhos[0]:10d} {tamanhos[1]:10d} {tamanhos[2]:10d} '
+          f'{tempos[0]:7.1f} {tempos[1]:8.1f} {tempos[2]:8.1f}')
@@ -0,0 +1,63 @@
+# Logins/s com N requisições simultâneas e latência de uma rota comum (GET /)
+# durante uma onda de logins. Com --sem-pool o PBKDF2 roda na própria thread
+# da requisição, como antes do pool de processos.
+# Uso: python bench/bench_hash_senha.py [logins] [--sem-pool]
+# O custo do hash vem de VIDAPLUS_HASH_ITERACOES (aqui, padrão 100000).
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from comum import preparar
+
+preparar(VIDAPLUS_HASH_ITERACOES=os.environ.get('VIDAPLUS_HASH_ITERACOES', '100000'))
+import app as vidaplus  # noqa: E402
+
+argumentos = [a for a in sys.argv[1:] if not a.startswith('--')]
+LOGINS = int(argumentos[0]) if argumentos else 64
+SEM_POOL = '--sem-pool' in sys.argv
+
+if SEM_POOL:
+    vidaplus.executar_no_pool_hash = lambda funcao, *args: funcao(*args)
+
+
+def login(_):
+    resposta = vidaplus.app.test_client().post('/auth/login', json={'username': 'admin', 'password': 'admin123'})
+    return resposta.status_code
+
+
+vidaplus.criar_tabelas()
+# Aquecimento fora da medição: sobe todos os processos do pool (criados sob
+# demanda) e carrega o usuário e as conexões do banco
+with ThreadPoolExecutor(vidaplus.HASH_POOL_PROCESSOS) as executor:
+    list(executor.map(login, range(vidaplus.HASH_POOL_PROCESSOS * 2)))
+print(f'modo: {"sem pool" if SEM_POOL else "pool de processos"}, '
+      f'{vidaplus.HASH_SENHA_ITERACOES} iterações, {LOGINS} logins')
+
+for simultaneos in (1, 8, 32):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(simultaneos) as executor:
+        status = list(executor.map(login, range(LOGINS)))
+    duracao = time.perf_counter() - inicio
+    print(f'{simultaneos:3d} simultâneos: {LOGINS / duracao:7.1f} logins/s  status {sorted(set(status))}')
+
+
+def onda_de_logins():
+    with ThreadPoolExecutor(32) as executor:
+        list(executor.map(login, range(LOGINS)))
+
+
+onda = threading.Thread(target=onda_de_logins)
+onda.start()
+time.sleep(0.2)
+cliente = vidaplus.app.test_client()
+latencias = []
+while onda.is_alive():
+    inicio = time.perf_counter()
+    cliente.get('/')
+    latencias.append((time.perf_counter() - inicio) * 1000)
+    time.sleep(0.01)
+onda.join()
+print(f'GET / durante a onda: mediana {statistics.median(latencias):.1f} ms, máximo {max(latencias):.1f} ms')
@@ -0,0 +1,75 @@
+# Pacientes/s cadastrados por POST /pacientes/bulk (JSON e NDJSON) contra
+# um POST /pacientes por paciente. Cada caso aquece com poucos pacientes e o
+# número é a mediana das repetições; o corpo da requisição é montado fora da
+# medição. Uso: python bench/bench_pacientes_bulk.py [pacientes] [repeticoes]
+import itertools
+import json
+import statistics
+import sys
+import time
+
+from comum import preparar
+
+preparar()
+import app as vidaplus  # noqa: E402
+
+PACIENTES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+REPETICOES = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+UNITARIOS = min(PACIENTES, 1000)
+AQUECIMENTO = 200
+
+# Cada rodada cadastra CPFs novos: prefixo da rodada + número do paciente
+prefixos = itertools.count(10)
+
+
+def pacientes(n):
+    prefixo = next(prefixos)
+    return [{'nome': f'Paciente {prefixo}-{i}', 'cpf': f'{prefixo:02d}{i:09d}', 'email': f'p{i}@exemplo.com',
+             'data_nascimento': '1980-05-17'} for i in range(n)]
+
+
+def medir(descricao, n, montar):
+    # montar(n) -> função que envia n pacientes
+    montar(min(n, AQUECIMENTO))()
+    taxas = []
+    for _ in range(REPETICOES):
+        enviar = montar(n)
+        inicio = time.perf_counter()
+        enviar()
+        taxas.append(n / (time.perf_counter() - inicio))
+    print(f'{descricao:28s} {n:6d} pacientes {statistics.median(taxas):9.0f} pacientes/s')
+
+
+with vidaplus.app.app_context():
+    vidaplus.aplicar_migracoes()
+cliente = vidaplus.app.test_client()
+
+
+def bulk_json(n):
+    corpo = pacientes(n)
+    def enviar():
+        resposta = cliente.post('/pacientes/bulk', json=corpo)
+        assert resposta.get_json()['criados'] == n
+    return enviar
+
+
+def bulk_ndjson(n):
+    corpo = ''.join(json.dumps(p) + '\n' for p in pacientes(n))
+    def enviar():
+        resposta = cliente.post('/pacientes/bulk', data=corpo, content_type='application/x-ndjson')
+        assert resposta.get_json()['criados'] == n
+    return enviar
+
+
+def unitarios(n):
+    corpo = pacientes(n)
+    def enviar():
+        for paciente in corpo:
+            assert cliente.post('/pacientes', json=paciente).status_code == 201
+    return enviar
+
+
+print(f'mediana de {REPETICOES} repetições após o aquecimento')
+medir('POST /pacientes (um a um)', UNITARIOS, unitarios)
+medir('POST /pacientes/bulk JSON', PACIENTES, bulk_json)
+medir('POST /pacientes/bulk NDJSON', PACIENTES, bulk_ndjson)
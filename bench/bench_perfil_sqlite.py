@@ -0,0 +1,86 @@
+# Escritas/s e leituras/s com vários processos disputando o mesmo banco
+# (4 gravando POST /pacientes, 4 lendo GET /pacientes?limit=50), em cada
+# perfil do SQLite. Uso: python bench/bench_perfil_sqlite.py [segundos] [perfil]
+# Sem perfil, roda "padrao" e "producao", cada um num processo e banco novos.
+# Cada processo aquece (conexão própria, PRAGMAs, primeiras páginas) e só
+# então começa a contar, junto com os outros.
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from comum import preparar
+
+DURACAO = float(sys.argv[1]) if len(sys.argv) > 1 else 6
+ESCRITORES = 4
+LEITORES = 4
+AQUECIMENTO = 20
+
+
+def trabalhador(indice, papel, largada, fila):
+    import app as vidaplus
+    with vidaplus.app.app_context():
+        vidaplus.db.engine.dispose(close=False)  # conexões herdadas do fork não são reusadas
+    cliente = vidaplus.app.test_client()
+    n = 0
+    
+    def requisitar():
+        nonlocal n
+        n += 1
+        if papel == 'escrita':
+            return cliente.post('/pacientes', json={'nome': f'Paciente {indice}-{n}', 'cpf': f'{indice:02d}{n:09d}'})
+        return cliente.get('/pacientes?limit=50')
+    
+    for _ in range(AQUECIMENTO):
+        requisitar()
+    largada.wait()
+    
+    ok = erros = 0
+    fim = time.time() + DURACAO
+    while time.time() < fim:
+        if requisitar().status_code < 300:
+            ok += 1
+        else:
+            erros += 1
+    fila.put((papel, ok, erros))
+
+
+def medir(perfil):
+    preparar(VIDAPLUS_SQLITE_PERFIL=perfil)
+    import app as vidaplus
+    with vidaplus.app.app_context():
+        vidaplus.aplicar_migracoes()
+    cliente = vidaplus.app.test_client()
+    for i in range(200):
+        cliente.post('/pacientes', json={'nome': f'Inicial {i}', 'cpf': f'99{i:09d}'})
+    with vidaplus.app.app_context():
+        vidaplus.db.engine.dispose()
+
+    fila = multiprocessing.Queue()
+    largada = multiprocessing.Barrier(ESCRITORES + LEITORES)
+    processos = [
+        multiprocessing.Process(target=trabalhador, args=(i, 'escrita' if i < ESCRITORES else 'leitura', largada, fila))
+        for i in range(ESCRITORES + LEITORES)
+    ]
+    for processo in processos:
+        processo.start()
+    totais = {'escrita': [0, 0], 'leitura': [0, 0]}
+    for _ in processos:
+        papel, ok, erros = fila.get()
+        totais[papel][0] += ok
+        totais[papel][1] += erros
+    for processo in processos:
+        processo.join()
+
+    print(f'{perfil:9s} escritas/s {totais["escrita"][0] / DURACAO:7.0f} (erros {totais["escrita"][1]})'
+          f'   leituras/s {totais["leitura"][0] / DURACAO:7.0f} (erros {totais["leitura"][1]})')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        medir(sys.argv[2])
+    else:
+        for perfil in ('padrao', 'producao'):
+            ambiente = {k: v for k, v in os.environ.items() if not k.startswith('VIDAPLUS_')}
+            subprocess.run([sys.executable, __file__, str(DURACAO), perfil], env=ambiente, check=True)
@@ -0,0 +1,77 @@
+# Linhas/segundo dos serializadores compilados (SERIALIZADORES, ?fields=)
+# contra o laço antigo que montava cada dict a partir do objeto do ORM com
+# strftime. Cada caso roda uma vez para aquecer (cache de páginas do SQLite e
+# serializador compilado) e o número é a mediana das repetições seguintes.
+# Uso: python bench/bench_serializadores.py [linhas] [repeticoes]
+import sys
+from datetime import date, datetime
+
+from comum import mediana_ms, preparar
+
+preparar()
+import app as vidaplus  # noqa: E402
+
+LINHAS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+REPETICOES = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+db = vidaplus.db
+
+
+def popular():
+    vidaplus.aplicar_migracoes()
+    db.session.add(vidaplus.Profissional(nome='Dra. Ana', crm_coren='CRM1', especialidade='Clínica', tipo='medico'))
+    db.session.execute(db.insert(vidaplus.Paciente), [
+        {'nome': f'Paciente {i}', 'cpf': f'{i:011d}', 'data_nascimento': date(1990, 1, 1),
+         'telefone': '11999990000', 'email': f'p{i}@exemplo.com', 'endereco': 'Rua A, 1'}
+        for i in range(LINHAS)
+    ])
+    db.session.execute(db.insert(vidaplus.Consulta), [
+        {'paciente_id': i + 1, 'profissional_id': 1, 'data_consulta': datetime(2026, 1, 1, 10),
+         'tipo': 'presencial', 'status': 'agendada', 'observacoes': 'retorno'}
+        for i in range(LINHAS)
+    ])
+    db.session.commit()
+
+
+def pacientes_laco_antigo():
+    return [{
+        'id': p.id, 'nome': p.nome, 'cpf': p.cpf, 'telefone': p.telefone, 'email': p.email,
+        'endereco': p.endereco,
+        'data_nascimento': p.data_nascimento.strftime('%Y-%m-%d') if p.data_nascimento else None,
+    } for p in vidaplus.Paciente.query.all()]
+
+
+def consultas_laco_antigo():
+    linhas = vidaplus.query_listagem_consultas().with_entities(
+        vidaplus.Consulta.id, vidaplus.Paciente.nome.label('paciente'),
+        vidaplus.Profissional.nome.label('profissional'), vidaplus.Consulta.data_consulta,
+        vidaplus.Consulta.tipo, vidaplus.Consulta.status, vidaplus.Consulta.observacoes
+    ).all()
+    return [{
+        'id': c.id, 'paciente': c.paciente, 'profissional': c.profissional,
+        'data_consulta': c.data_consulta.strftime('%Y-%m-%d %H:%M'),
+        'tipo': c.tipo, 'status': c.status, 'observacoes': c.observacoes,
+    } for c in linhas]
+
+
+def compilado(nome, query, campos=None):
+    serializador = vidaplus.SERIALIZADORES[nome]
+    campos = campos or serializador.todos
+    serializar = serializador.compilar(campos)
+    return [serializar(linha) for linha in query.with_entities(*serializador.colunas(campos)).all()]
+
+
+def medir(descricao, funcao):
+    def executar():
+        db.session.expunge_all()
+        assert len(funcao()) == LINHAS
+    print(f'{descricao:42s} {LINHAS / mediana_ms(executar, REPETICOES) * 1000:10.0f} linhas/s')
+
+
+with vidaplus.app.app_context():
+    popular()
+    print(f'{LINHAS} linhas, mediana de {REPETICOES} repetições após o aquecimento')
+    medir('pacientes laço antigo (ORM + strftime)', pacientes_laco_antigo)
+    medir('pacientes compilado', lambda: compilado('paciente', vidaplus.Paciente.query))
+    medir('pacientes compilado fields=id,nome', lambda: compilado('paciente', vidaplus.Paciente.query, ('id', 'nome')))
+    medir('consultas laço antigo (JOIN + strftime)', consultas_laco_antigo)
+    medir('consultas compilado', lambda: compilado('consulta', vidaplus.query_listagem_consultas()))
@@ -0,0 +1,29 @@
+# Preparação comum dos benchmarks: banco em diretório temporário e raiz do
+# projeto no sys.path. Chamar preparar() antes de importar app/adm.
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def preparar(**ambiente):
+    diretorio = tempfile.mkdtemp(prefix='vidaplus-bench-')
+    os.environ.setdefault('VIDAPLUS_DATABASE_URI', f'sqlite:///{os.path.join(diretorio, "app.db")}')
+    os.environ.setdefault('VIDAPLUS_HASH_ITERACOES', '1000')
+    os.environ.update(ambiente)
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    return diretorio
+
+
+def mediana_ms(funcao, repeticoes=10):
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
@@ -0,0 +1,103 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+# Bancos em arquivo temporário (modo WAL do perfil de produção) e hash de
+# senha barato; precisa estar no ambiente antes de importar app/adm
+DIRETORIO_BANCOS = tempfile.mkdtemp(prefix='vidaplus-testes-')
+os.environ.setdefault('VIDAPLUS_DATABASE_URI', f'sqlite:///{os.path.join(DIRETORIO_BANCOS, "app.db")}')
+os.environ.setdefault('VIDAPLUS_ADM_DATABASE_URI', f'sqlite:///{os.path.join(DIRETORIO_BANCOS, "adm.db")}')
+os.environ.setdefault('VIDAPLUS_HASH_ITERACOES', '1000')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def vidaplus():
+    import app as vidaplus
+    with vidaplus.app.app_context():
+        vidaplus.aplicar_migracoes()
+    return vidaplus
+
+
+@pytest.fixture
+def limpar_banco(vidaplus):
+    # Esvazia as tabelas. O DELETE passa pela sessão para as versões das
+    # tabelas subirem, como numa escrita normal.
+    db = vidaplus.db
+    def limpar():
+        with vidaplus.app.app_context():
+            for tabela in reversed(db.metadata.sorted_tables):
+                if tabela.name not in vidaplus.TABELAS_SEM_VERSAO:
+                    db.session.execute(tabela.delete())
+            db.session.execute(db.text('DELETE FROM paciente_busca'))
+            db.session.commit()
+        for cache in (vidaplus.cache_principais, vidaplus.cache_prescricoes_ativas, vidaplus.cache_fragmentos):
+            cache.limpar()
+        vidaplus.versao_credenciais.esquecer()
+    return limpar
+
+
+@pytest.fixture
+def banco(vidaplus, limpar_banco):
+    # Cada teste começa com as tabelas vazias; devolve o engine
+    limpar_banco()
+    with vidaplus.app.app_context():
+        return vidaplus.db.engine
+
+
+@pytest.fixture
+def inserir(vidaplus, banco):
+    # inserir(Modelo, [{...}, ...]) -> ids criados, num contexto próprio (as
+    # requisições do teste abrem os delas, como em produção)
+    db = vidaplus.db
+    def inserir_linhas(modelo, linhas):
+        with vidaplus.app.app_context():
+            ids = db.session.execute(db.insert(modelo).returning(modelo.id), linhas).scalars().all()
+            db.session.commit()
+        return ids
+    return inserir_linhas
+
+
+@pytest.fixture
+def cliente(vidaplus, banco):
+    return vidaplus.app.test_client()
+
+
+@pytest.fixture
+def contador_queries(vidaplus, banco):
+    # contador_queries(funcao) -> quantos comandos SQL a função executou
+    def contar(funcao):
+        executados = []
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            executados.append(statement)
+        event.listen(banco, 'before_cursor_execute', registrar)
+        try:
+            funcao()
+        finally:
+            event.remove(banco, 'before_cursor_execute', registrar)
+        return len(executados)
+    return contar
+
+
+@pytest.fixture(scope='session')
+def adm():
+    import adm
+    with adm.app.app_context():
+        adm.aplicar_migracoes()
+    return adm
+
+
+@pytest.fixture
+def cliente_adm(adm):
+    # ADM com as tabelas de dados vazias (as versões sobem como numa escrita)
+    with adm.app.app_context():
+        for modelo in (adm.RelatorioFinanceiro, adm.Suprimento, adm.SnapshotDashboard):
+            adm.db.session.execute(adm.db.delete(modelo))
+            adm.incrementar_versao(modelo.__tablename__)
+        adm.db.session.commit()
+    adm.cache_fragmentos = adm.CacheFragmentos(adm.CACHE_FRAGMENTOS_ITENS, adm.CACHE_FRAGMENTOS_MB * 1024 * 1024)
+    return adm.app.test_client()
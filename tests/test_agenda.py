@@ -0,0 +1,91 @@
+import random
+import threading
+from datetime import date, time, timedelta
+
+
+def test_proximos_horarios_junta_profissionais_e_ignora_inativos(vidaplus, inserir, cliente):
+    # Profissional 0 está inativo; 6 e 7 são de outra especialidade
+    profissionais = inserir(vidaplus.Profissional, [
+        {'nome': f'Dr. {i}', 'crm_coren': f'CRM{i}', 'especialidade': 'Cardiologia' if i < 6 else 'Ortopedia',
+         'tipo': 'medico', 'ativo': i != 0}
+        for i in range(8)
+    ])
+    aleatorio = random.Random(7)
+    horarios = [{
+        'profissional_id': aleatorio.choice(profissionais),
+        'data': date(2026, 3, 1) + timedelta(days=aleatorio.randint(0, 60)),
+        'hora_inicio': time(aleatorio.randint(7, 18), aleatorio.choice((0, 30))),
+        'hora_fim': time(19),
+        'tipo_atendimento': aleatorio.choice(('presencial', 'online', 'ambos')),
+        'disponivel': aleatorio.random() < 0.8,
+    } for _ in range(2000)]
+    ids = inserir(vidaplus.AgendaDisponivel, horarios)
+    cardiologia_ativos = set(profissionais[1:6])
+
+    def esperados(inicio, tipo, n):
+        livres = sorted(
+            (h['data'], h['hora_inicio'], horario_id) for horario_id, h in zip(ids, horarios)
+            if h['disponivel'] and h['profissional_id'] in cardiologia_ativos
+            and (h['data'], h['hora_inicio']) >= inicio
+            and (tipo == 'ambos' or h['tipo_atendimento'] in (tipo, 'ambos'))
+        )
+        return [horario_id for _, _, horario_id in livres[:n]]
+
+    casos = [
+        ('2026-03-10 12:00', (date(2026, 3, 10), time(12)), 'ambos', 10),
+        ('2026-04-01', (date(2026, 4, 1), time(0)), 'online', 37),
+        # Menos horários livres que N
+        ('2026-04-30 17:00', (date(2026, 4, 30), time(17)), 'presencial', 100),
+    ]
+    for a_partir_de, inicio, tipo, n in casos:
+        resposta = cliente.get('/agenda-disponivel/proximos', query_string={
+            'especialidade': 'Cardiologia', 'a_partir_de': a_partir_de, 'tipo': tipo, 'n': n
+        })
+        assert resposta.status_code == 200
+        assert [item['id'] for item in resposta.get_json()['itens']] == esperados(inicio, tipo, n)
+
+
+def test_reservas_simultaneas_do_mesmo_horario_so_uma_vence(vidaplus, inserir, banco):
+    with banco.connect() as conexao:
+        assert conexao.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+
+    agentes = 16
+    pacientes = inserir(vidaplus.Paciente, [{'nome': f'Paciente {i}', 'cpf': f'{i:011d}'} for i in range(agentes)])
+    [profissional] = inserir(vidaplus.Profissional, [
+        {'nome': 'Dra. Ana', 'crm_coren': 'CRM1', 'especialidade': 'Clínica', 'tipo': 'medico'}
+    ])
+    horarios = inserir(vidaplus.AgendaDisponivel, [
+        {'profissional_id': profissional, 'data': date(2026, 5, 4) + timedelta(days=i // 10),
+         'hora_inicio': time(8 + i % 10), 'hora_fim': time(9 + i % 10), 'tipo_atendimento': 'ambos'}
+        for i in range(20)
+    ])
+
+    largada = threading.Barrier(agentes)
+    status = {horario: [] for horario in horarios}
+
+    def agente(indice):
+        # Cada agente tenta todos os horários, em ordem própria, com paciente e tipo próprios
+        cliente = vidaplus.app.test_client()
+        ordem = horarios[:]
+        random.Random(indice).shuffle(ordem)
+        largada.wait()
+        for horario in ordem:
+            resposta = cliente.put(f'/agenda-disponivel/{horario}/ocupar', json={
+                'paciente_id': pacientes[indice], 'tipo': 'online' if indice % 2 else 'presencial'
+            })
+            status[horario].append(resposta.status_code)
+
+    threads = [threading.Thread(target=agente, args=(i,)) for i in range(agentes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for horario in horarios:
+        assert sorted(status[horario]) == [200] + [409] * (agentes - 1), horario
+
+    with vidaplus.app.app_context():
+        reservados = vidaplus.AgendaDisponivel.query.filter_by(disponivel=False).all()
+        assert len(reservados) == len(horarios)
+        assert all((h.consulta_id is None) != (h.atendimento_online_id is None) for h in reservados)
+        assert vidaplus.Consulta.query.count() + vidaplus.AtendimentoOnline.query.count() == len(horarios)
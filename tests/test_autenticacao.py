@@ -0,0 +1,93 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def conferencia(vidaplus, monkeypatch):
+    # conferencia(segundos): intervalo em que este worker relê a versão das credenciais
+    def ajustar(segundos):
+        monkeypatch.setattr(vidaplus.versao_credenciais, 'intervalo', segundos)
+    ajustar(60)
+    return ajustar
+
+
+def criar_usuario(vidaplus, inserir, cargo='admin'):
+    [user_id] = inserir(vidaplus.Usuario, [{
+        'username': 'ana', 'email': 'ana@vidaplus.com', 'nome_completo': 'Ana Souza', 'cargo': cargo,
+        'password_hash': generate_password_hash('senha123', vidaplus.HASH_SENHA_METODO),
+    }])
+    with vidaplus.app.app_context():
+        token = vidaplus.db.session.get(vidaplus.Usuario, user_id).generate_token()
+    return user_id, {'Authorization': f'Bearer {token}'}
+
+
+def alterar_usuario_neste_worker(vidaplus, user_id, **campos):
+    with vidaplus.app.app_context():
+        usuario = vidaplus.db.session.get(vidaplus.Usuario, user_id)
+        for campo, valor in campos.items():
+            setattr(usuario, campo, valor)
+        vidaplus.db.session.commit()
+
+
+def alterar_usuario_em_outro_worker(vidaplus, banco, user_id, **campos):
+    # Direto no banco, sem a sessão deste processo: como o commit de outro
+    # worker, só a versão em versao_dados muda
+    usuario = vidaplus.Usuario.__table__
+    with banco.begin() as conexao:
+        conexao.execute(usuario.update().where(usuario.c.id == user_id).values(**campos))
+        conexao.execute(vidaplus._SQL_INCREMENTAR_VERSAO, [{'tabela': vidaplus.CHAVE_VERSAO_CREDENCIAIS, 'versao': 1}])
+
+
+def test_principal_em_cache_nao_faz_sql(vidaplus, inserir, cliente, contador_queries, conferencia):
+    _, cabecalhos = criar_usuario(vidaplus, inserir)
+    assert cliente.get('/auth/cache/estatisticas', headers=cabecalhos).status_code == 200
+
+    status = []
+    assert contador_queries(
+        lambda: status.append(cliente.get('/auth/cache/estatisticas', headers=cabecalhos).status_code)
+    ) == 0
+    assert status == [200]
+
+
+def test_alteracao_neste_worker_vale_na_hora(vidaplus, inserir, cliente, conferencia):
+    user_id, cabecalhos = criar_usuario(vidaplus, inserir)
+    assert cliente.get('/auth/cache/estatisticas', headers=cabecalhos).status_code == 200
+
+    alterar_usuario_neste_worker(vidaplus, user_id, cargo='medico')
+    assert cliente.get('/auth/cache/estatisticas', headers=cabecalhos).status_code == 403
+
+    alterar_usuario_neste_worker(vidaplus, user_id, ativo=False)
+    resposta = cliente.get('/auth/me', headers=cabecalhos)
+    assert resposta.status_code == 401
+    assert resposta.get_json() == {'erro': 'Usuário inativo'}
+
+
+def test_alteracao_em_outro_worker_vale_apos_a_conferencia(vidaplus, inserir, banco, cliente, conferencia):
+    user_id, cabecalhos = criar_usuario(vidaplus, inserir)
+    assert cliente.get('/auth/me', headers=cabecalhos).status_code == 200
+
+    alterar_usuario_em_outro_worker(vidaplus, banco, user_id, ativo=False)
+    # Dentro do intervalo de conferência o principal em cache ainda vale
+    assert cliente.get('/auth/me', headers=cabecalhos).status_code == 200
+
+    conferencia(0)
+    resposta = cliente.get('/auth/me', headers=cabecalhos)
+    assert resposta.status_code == 401
+    assert resposta.get_json() == {'erro': 'Usuário inativo'}
+
+
+def test_versao_das_credenciais_sobe_so_com_ativo_cargo_ou_senha(vidaplus, inserir, cliente):
+    user_id, _ = criar_usuario(vidaplus, inserir)
+
+    def versao():
+        with vidaplus.app.app_context():
+            return vidaplus.ler_versoes((vidaplus.CHAVE_VERSAO_CREDENCIAIS,))[0]
+
+    inicial = versao()
+    alterar_usuario_neste_worker(vidaplus, user_id, ultimo_login=vidaplus.datetime.utcnow())
+    assert versao() == inicial
+
+    alterar_usuario_neste_worker(
+        vidaplus, user_id, password_hash=generate_password_hash('outra456', vidaplus.HASH_SENHA_METODO)
+    )
+    assert versao() == inicial + 1
@@ -0,0 +1,162 @@
+import random
+import re
+import statistics
+import time
+import unicodedata
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+
+def test_busca_ordena_todos_os_encontrados_e_pagina_ate_o_fim(vidaplus, inserir, cliente):
+    # Mais de mil "Maria" com nome longo e, cadastradas por último (rowid
+    # maior), as de nome curto, que devem abrir a primeira página
+    longos = inserir(vidaplus.Paciente, [
+        {'nome': f'Maria Aparecida dos Santos {i:04d}', 'cpf': f'{i:011d}'} for i in range(1500)
+    ])
+    curtos = inserir(vidaplus.Paciente, [
+        {'nome': f'Maria {i}', 'cpf': f'9{i:010d}'} for i in range(3)
+    ])
+    with vidaplus.app.app_context():
+        vidaplus.reindexar_busca_pacientes()
+        vidaplus.db.session.commit()
+
+    resposta = cliente.get('/pacientes/busca', query_string={'q': 'maria', 'limit': 5})
+    assert [p['id'] for p in resposta.get_json()['itens']] == curtos + longos[:2]
+
+    encontrados, cursor = [], None
+    while True:
+        parametros = {'q': 'maria', 'limit': 100}
+        if cursor:
+            parametros['cursor'] = cursor
+        corpo = cliente.get('/pacientes/busca', query_string=parametros).get_json()
+        encontrados += [p['id'] for p in corpo['itens']]
+        cursor = corpo['next_cursor']
+        if cursor is None:
+            break
+    assert encontrados == curtos + longos
+
+
+def test_busca_por_cpf_ignora_a_pontuacao_gravada(vidaplus, cliente, banco):
+    ids = {}
+    for cpf in ('123.456.789-00', '12345000000', '98765432100'):
+        resposta = cliente.post('/pacientes', json={'nome': f'Paciente {cpf}', 'cpf': cpf})
+        ids[cpf] = resposta.get_json()['id']
+
+    def buscar(**parametros):
+        return [p['id'] for p in cliente.get('/pacientes/busca', query_string=parametros).get_json()['itens']]
+
+    assert buscar(cpf='123.456') == [ids['123.456.789-00']]
+    assert buscar(q='123456') == [ids['123.456.789-00']]
+    assert buscar(cpf='123') == [ids['12345000000'], ids['123.456.789-00']]
+    assert buscar(q='paciente', cpf='123456') == [ids['123.456.789-00']]
+
+    # A busca sem nome usa o índice do CPF só com dígitos
+    capturados = []
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM paciente WHERE' in statement:
+            capturados.append((statement, parameters))
+    event.listen(banco, 'before_cursor_execute', capturar)
+    try:
+        buscar(cpf='123')
+    finally:
+        event.remove(banco, 'before_cursor_execute', capturar)
+    [(statement, parameters)] = capturados
+    with banco.connect() as conexao:
+        plano = ' '.join(linha[-1] for linha in conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters))
+    assert 'USING INDEX ix_paciente_cpf_digitos' in plano
+
+
+def test_editar_nome_troca_a_chave_do_paciente_no_indice(vidaplus, cliente, banco):
+    paciente = cliente.post('/pacientes', json={'nome': 'Joana Prado', 'cpf': '11122233344'}).get_json()['id']
+    assert cliente.put(f'/pacientes/{paciente}', json={'nome': 'Joana de Souza Prado'}).status_code == 200
+
+    def buscar(q):
+        return [p['id'] for p in cliente.get('/pacientes/busca', query_string={'q': q}).get_json()['itens']]
+    assert buscar('joana souza') == [paciente]
+    with banco.connect() as conexao:
+        assert conexao.exec_driver_sql('SELECT count(*) FROM paciente_busca').scalar() == 1
+
+    assert cliente.delete(f'/pacientes/{paciente}').status_code == 200
+    assert buscar('joana') == []
+    with banco.connect() as conexao:
+        assert conexao.exec_driver_sql('SELECT count(*) FROM paciente_busca').scalar() == 0
+
+
+PRIMEIROS_NOMES = [
+    'Maria', 'Mariana', 'Marcos', 'Mário', 'José', 'Ana', 'João', 'Antônio', 'Francisca', 'Fernanda',
+    'Fernando', 'Juliana', 'Paulo', 'Pedro', 'Lucas', 'Luíza', 'Rafael', 'Patrícia', 'Camila', 'Bruno',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+]
+LIGACOES = ['', '', 'da ', 'de ', 'dos ']
+
+
+def test_busca_com_cem_mil_pacientes_pagina_pela_chave_sem_ordenar_todos(vidaplus, inserir, cliente):
+    # Tamanho realista: 100 mil pacientes, nomes de 2 a 4 palavras e CPFs com e sem pontuação
+    aleatorio = random.Random(7)
+    pacientes = []
+    for i in range(100_000):
+        sobrenomes = ' '.join(
+            aleatorio.choice(LIGACOES) + aleatorio.choice(SOBRENOMES) for _ in range(aleatorio.randint(1, 3))
+        )
+        cpf = f'{(i * 7919999 + 12345) % 10 ** 11:011d}'
+        if i % 2:
+            cpf = f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}'
+        pacientes.append({
+            'nome': f'{aleatorio.choice(PRIMEIROS_NOMES)} {sobrenomes}', 'cpf': cpf,
+            'data_nascimento': date(1940, 1, 1) + timedelta(days=aleatorio.randrange(30000)),
+        })
+    ids = inserir(vidaplus.Paciente, pacientes)
+    with vidaplus.app.app_context():
+        vidaplus.reindexar_busca_pacientes()
+        vidaplus.db.session.commit()
+
+    # Paginação completa pela rota: mesma ordem (palavras, tamanho, id) do bm25
+    # para termos obrigatórios, sem repetir nem pular ninguém
+    def sem_acentos(texto):
+        return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).lower()
+
+    def encontrado(nome, termos):
+        palavras = re.findall(r'\w+', sem_acentos(nome))
+        return all(any(palavra.startswith(termo) for palavra in palavras) for termo in termos)
+
+    esperado = sorted(
+        (paciente['nome'].count(' '), len(paciente['nome']), paciente_id)
+        for paciente_id, paciente in zip(ids, pacientes) if encontrado(paciente['nome'], ('mari', 'silv'))
+    )
+    encontrados, cursor = [], None
+    while True:
+        parametros = {'q': 'mari silv', 'limit': 500}
+        if cursor:
+            parametros['cursor'] = cursor
+        corpo = cliente.get('/pacientes/busca', query_string=parametros).get_json()
+        encontrados += [p['id'] for p in corpo['itens']]
+        cursor = corpo['next_cursor']
+        if cursor is None:
+            break
+    assert encontrados == [paciente_id for _, _, paciente_id in esperado]
+
+    cpf = re.sub(r'\D', '', pacientes[77_777]['cpf'])
+    casos = [
+        ('"ma"*', '', None), ('"maria"*', '', None), ('"fernand"*', '', None), ('"ma"* "da"* "so"*', '', None),
+        ('"maria"*', cpf[:1], None), ('"maria"*', cpf[:9], None), ('', cpf[:1], None), ('', cpf[:3], None),
+        ('', '', pacientes[77_777]['data_nascimento']),
+    ]
+    with vidaplus.app.app_context():
+        for termos, prefixo_cpf, data_nascimento in casos:
+            # A 20ª página custa o mesmo que a primeira: o cursor começa na chave
+            cursor = None
+            for _ in range(20):
+                linhas = vidaplus.buscar_ids_pacientes(termos, prefixo_cpf, data_nascimento, 51, cursor)
+                if len(linhas) < 51:
+                    break
+                cursor = linhas[49].chave
+            tempos = []
+            for _ in range(5):
+                inicio = time.perf_counter()
+                vidaplus.buscar_ids_pacientes(termos, prefixo_cpf, data_nascimento, 51, cursor)
+                tempos.append(time.perf_counter() - inicio)
+            assert statistics.median(tempos) < 0.020, (termos, prefixo_cpf, data_nascimento, tempos)
@@ -0,0 +1,127 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+
+def contadores_batem_com_consultas(vidaplus):
+    db = vidaplus.db
+    with vidaplus.app.app_context():
+        por_dia = {
+            (data, status): total
+            for data, status, total in db.session.query(
+                vidaplus.ContagemConsultasDia.data, vidaplus.ContagemConsultasDia.status,
+                vidaplus.ContagemConsultasDia.total
+            ) if total
+        }
+        por_mes = {
+            (mes, profissional_id, status): total
+            for mes, profissional_id, status, total in db.session.query(
+                vidaplus.ProdutividadeMes.mes, vidaplus.ProdutividadeMes.profissional_id,
+                vidaplus.ProdutividadeMes.status, vidaplus.ProdutividadeMes.total
+            ).filter(vidaplus.ProdutividadeMes.tipo == 'consulta') if total
+        }
+        consultas = db.session.query(
+            vidaplus.Consulta.data_consulta, vidaplus.Consulta.profissional_id, vidaplus.Consulta.status
+        ).all()
+
+    esperado_dia, esperado_mes = {}, {}
+    for data_consulta, profissional_id, status in consultas:
+        chave = (data_consulta.date(), status)
+        esperado_dia[chave] = esperado_dia.get(chave, 0) + 1
+        chave = (data_consulta.strftime('%Y-%m'), profissional_id, status)
+        esperado_mes[chave] = esperado_mes.get(chave, 0) + 1
+    assert por_dia == esperado_dia
+    assert por_mes == esperado_mes
+
+
+def test_mudancas_de_status_simultaneas_mantem_os_contadores(vidaplus, inserir, cliente, banco):
+    with banco.connect() as conexao:
+        assert conexao.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    profissionais = inserir(vidaplus.Profissional, [
+        {'nome': f'Dr. {i}', 'crm_coren': f'CRM{i}', 'especialidade': 'Clínica', 'tipo': 'medico'}
+        for i in range(2)
+    ])
+    consultas = []
+    for i in range(20):
+        # Passa do fim do mês para os contadores mensais também serem conferidos
+        data = datetime(2026, 3, 30, 8) + timedelta(hours=i * 5)
+        resposta = cliente.post('/consultas', json={
+            'paciente_id': paciente, 'profissional_id': profissionais[i % 2],
+            'data_consulta': data.strftime('%Y-%m-%d %H:%M'),
+        })
+        consultas.append(resposta.get_json()['id'])
+
+    agentes = 12
+    largada = threading.Barrier(agentes)
+    status = []
+
+    def agente(indice):
+        cliente = vidaplus.app.test_client()
+        aleatorio = random.Random(indice)
+        largada.wait()
+        for consulta in consultas:
+            resposta = cliente.put(f'/consultas/{consulta}/status', json={
+                'status': aleatorio.choice(('realizada', 'cancelada'))
+            })
+            status.append(resposta.status_code)
+
+    threads = [threading.Thread(target=agente, args=(i,)) for i in range(agentes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(status) <= {200, 409}
+    contadores_batem_com_consultas(vidaplus)
+
+
+def test_iniciar_e_finalizar_simultaneos_mantem_os_contadores_de_atendimentos(vidaplus, inserir, cliente):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    [profissional] = inserir(vidaplus.Profissional, [
+        {'nome': 'Dr. Rui', 'crm_coren': 'CRM1', 'especialidade': 'Clínica', 'tipo': 'medico'}
+    ])
+    atendimentos = [
+        cliente.post('/atendimentos-online', json={
+            'paciente_id': paciente, 'profissional_id': profissional, 'data_inicio': f'2026-03-{10 + i} 09:00',
+        }).get_json()['id']
+        for i in range(10)
+    ]
+
+    agentes = 8
+    largada = threading.Barrier(agentes)
+
+    def agente():
+        cliente = vidaplus.app.test_client()
+        largada.wait()
+        for atendimento in atendimentos:
+            cliente.put(f'/atendimentos-online/{atendimento}/iniciar')
+            cliente.put(f'/atendimentos-online/{atendimento}/finalizar', json={'diagnostico': 'ok'})
+
+    threads = [threading.Thread(target=agente) for _ in range(agentes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db = vidaplus.db
+    with vidaplus.app.app_context():
+        assert {status for (status,) in db.session.query(vidaplus.AtendimentoOnline.status)} == {'finalizado'}
+        por_hora = {}
+        for hora, status, total in db.session.query(
+            vidaplus.ContagemAtendimentosHora.hora, vidaplus.ContagemAtendimentosHora.status,
+            vidaplus.ContagemAtendimentosHora.total
+        ):
+            if total:
+                por_hora[(hora, status)] = total
+        esperado = {}
+        for (data_inicio,) in db.session.query(vidaplus.AtendimentoOnline.data_inicio):
+            chave = (vidaplus.hora_do_atendimento(data_inicio), 'finalizado')
+            esperado[chave] = esperado.get(chave, 0) + 1
+        assert por_hora == esperado
+        total = db.func.sum(vidaplus.ProdutividadeMes.total)
+        por_status = db.session.query(vidaplus.ProdutividadeMes.status, total).filter(
+            vidaplus.ProdutividadeMes.tipo == 'atendimento_online'
+        ).group_by(vidaplus.ProdutividadeMes.status).having(total != 0)
+        assert dict(por_status.all()) == {'finalizado': len(atendimentos)}
@@ -0,0 +1,60 @@
+from sqlalchemy import event
+
+
+def relatorio(unidade, periodo, receita, despesas):
+    return {'unidade': unidade, 'periodo': periodo, 'receita_total': receita, 'despesas_operacionais': despesas}
+
+
+def suprimento(nome, estoque, minimo, preco):
+    return {'nome': nome, 'categoria': 'EPI', 'quantidade_estoque': estoque, 'quantidade_minima': minimo,
+            'preco_unitario': preco, 'fornecedor': 'MedSupply', 'unidade': 'Unidade Central'}
+
+
+def test_dashboard_reaproveita_o_snapshot_ate_os_dados_mudarem(adm, cliente_adm):
+    for dados in (relatorio('Central', '2026-01', 1000, 600), relatorio('Norte', '2026-01', 500, 400)):
+        assert cliente_adm.post('/api/relatorios', json=dados).status_code == 201
+    ids = [
+        cliente_adm.post('/api/suprimentos', json=dados).get_json()['suprimento']['id']
+        for dados in (suprimento('Luvas', 10, 50, 0.5), suprimento('Máscaras', 200, 100, 1.25))
+    ]
+
+    agregados = []
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if 'sum(' in statement.lower():
+            agregados.append(statement)
+    with adm.app.app_context():
+        event.listen(adm.db.engine, 'before_cursor_execute', capturar)
+    try:
+        corpo = cliente_adm.get('/api/dashboard').get_json()['dashboard']
+        assert corpo['resumo_financeiro'] == {
+            'receita_total_periodo': 1500.0, 'lucro_total_periodo': 500.0, 'total_relatorios': 2,
+            'margem_lucro_media': 500 / 1500 * 100,
+        }
+        assert corpo['resumo_suprimentos'] == {
+            'total_suprimentos': 2, 'itens_estoque_baixo': 1, 'valor_total_estoque': 255.0,
+            'percentual_estoque_baixo': 50.0,
+        }
+        assert len(agregados) == 1
+
+        # Sem escritas: o snapshot gravado no banco é devolvido sem recalcular
+        assert cliente_adm.get('/api/dashboard').get_json()['dashboard'] == corpo
+        assert len(agregados) == 1
+
+        assert cliente_adm.put(f'/api/suprimentos/{ids[0]}', json={'quantidade_estoque': 60}).status_code == 200
+        corpo = cliente_adm.get('/api/dashboard').get_json()['dashboard']
+        assert corpo['resumo_suprimentos']['itens_estoque_baixo'] == 0
+        assert corpo['resumo_suprimentos']['valor_total_estoque'] == 280.0
+        assert len(agregados) == 2
+
+        # A importação também sobe a versão e invalida o snapshot
+        resposta = cliente_adm.post('/api/relatorios/import', content_type='text/csv', data=(
+            'unidade;periodo;receita_total;despesas_operacionais\nSul;2026-01;300;100\n'
+        ).encode())
+        assert resposta.status_code == 200
+        corpo = cliente_adm.get('/api/dashboard').get_json()['dashboard']
+        assert corpo['resumo_financeiro']['total_relatorios'] == 3
+        assert corpo['resumo_financeiro']['lucro_total_periodo'] == 700.0
+        assert len(agregados) == 3
+    finally:
+        with adm.app.app_context():
+            event.remove(adm.db.engine, 'before_cursor_execute', capturar)
@@ -0,0 +1,92 @@
+def test_fragmentos_de_pacientes_seguem_a_versao_da_linha(vidaplus, inserir, cliente):
+    ids = inserir(vidaplus.Paciente, [{'nome': f'Paciente {i}', 'cpf': f'{i:011d}'} for i in range(3)])
+
+    def nomes():
+        return [p['nome'] for p in cliente.get('/pacientes').get_json()['itens']]
+
+    assert nomes() == ['Paciente 0', 'Paciente 1', 'Paciente 2']
+    antes = vidaplus.cache_fragmentos.estatisticas()
+    assert nomes() == ['Paciente 0', 'Paciente 1', 'Paciente 2']
+    depois = vidaplus.cache_fragmentos.estatisticas()
+    assert (depois['hits'] - antes['hits'], depois['misses'] - antes['misses']) == (3, 0)
+
+    # Edição pela rota: só o fragmento editado é refeito
+    assert cliente.put(f'/pacientes/{ids[1]}', json={'nome': 'Bia Souza', 'telefone': '1199'}).status_code == 200
+    antes = vidaplus.cache_fragmentos.estatisticas()
+    assert nomes() == ['Paciente 0', 'Bia Souza', 'Paciente 2']
+    depois = vidaplus.cache_fragmentos.estatisticas()
+    assert (depois['hits'] - antes['hits'], depois['misses'] - antes['misses']) == (2, 1)
+    assert cliente.get(f'/pacientes/{ids[1]}').get_json()['telefone'] == '1199'
+
+    # Edição de outro worker: o cache deste não foi limpo, mas a versão da linha mudou
+    paciente = vidaplus.Paciente.__table__
+    with vidaplus.app.app_context():
+        vidaplus.db.session.execute(
+            paciente.update().where(paciente.c.id == ids[2]).values(nome='Caio Lima', versao=paciente.c.versao + 1)
+        )
+        vidaplus.db.session.commit()
+    assert cliente.get(f'/pacientes/{ids[2]}').get_json()['nome'] == 'Caio Lima'
+
+    assert cliente.delete(f'/pacientes/{ids[0]}').status_code == 200
+    assert nomes() == ['Bia Souza', 'Caio Lima']
+
+
+def test_fragmentos_de_suprimentos_refeitos_apos_put_e_importacao(cliente_adm):
+    ids = [
+        cliente_adm.post('/api/suprimentos', json={
+            'nome': nome, 'categoria': 'EPI', 'quantidade_estoque': 10, 'quantidade_minima': 5,
+            'preco_unitario': 1.5, 'fornecedor': 'MedSupply', 'unidade': 'Unidade Central',
+        }).get_json()['suprimento']['id']
+        for nome in ('Luvas', 'Máscaras')
+    ]
+
+    def estoques():
+        return {s['nome']: s['quantidade_estoque'] for s in cliente_adm.get('/api/suprimentos').get_json()['suprimentos']}
+
+    def estatisticas():
+        return cliente_adm.get('/api/cache/fragmentos').get_json()['fragmentos']
+
+    assert estoques() == {'Luvas': 10, 'Máscaras': 10}
+    antes = estatisticas()
+    assert estoques() == {'Luvas': 10, 'Máscaras': 10}
+    depois = estatisticas()
+    assert (depois['hits'] - antes['hits'], depois['misses'] - antes['misses']) == (2, 0)
+
+    assert cliente_adm.put(f'/api/suprimentos/{ids[0]}', json={'quantidade_estoque': 3}).status_code == 200
+    assert cliente_adm.get(f'/api/suprimentos/{ids[0]}').get_json()['suprimento']['quantidade_estoque'] == 3
+    antes = estatisticas()
+    assert estoques() == {'Luvas': 3, 'Máscaras': 10}
+    depois = estatisticas()
+    assert (depois['hits'] - antes['hits'], depois['misses'] - antes['misses']) == (2, 0)
+
+    # A importação atualiza pelo par (nome, unidade) e também sobe a versão
+    resposta = cliente_adm.post('/api/suprimentos/import', content_type='text/csv', data=(
+        'nome;categoria;quantidade_estoque;quantidade_minima;preco_unitario;fornecedor;unidade\n'
+        'Máscaras;EPI;42;5;1.5;MedSupply;Unidade Central\n'
+    ).encode())
+    assert resposta.get_json()['atualizados'] == 1
+    assert estoques() == {'Luvas': 3, 'Máscaras': 42}
+
+
+def test_cache_de_fragmentos_respeita_os_limites(adm):
+    cache = adm.CacheFragmentos(maximo_itens=2, maximo_bytes=10)
+    cache.guardar('suprimentos', 1, 1, b'aaaa')
+    cache.guardar('suprimentos', 2, 1, b'bbbb')
+    assert cache.obter_varios('suprimentos', [(1, 1)]) == {1: b'aaaa'}
+
+    # Passa do limite de itens: sai o menos usado (o 2, já que o 1 acabou de ser lido)
+    cache.guardar('suprimentos', 3, 1, b'cc')
+    assert cache.obter_varios('suprimentos', [(1, 1), (2, 1), (3, 1)]) == {1: b'aaaa', 3: b'cc'}
+
+    # 4 cabe nos 10 bytes junto com o 3; o 5 não cabe com ninguém
+    cache.guardar('suprimentos', 4, 1, b'dddddddd')
+    assert cache.obter_varios('suprimentos', [(1, 1), (3, 1), (4, 1)]) == {3: b'cc', 4: b'dddddddd'}
+    cache.guardar('suprimentos', 5, 1, b'eeeeeeeee')
+    assert cache.obter_varios('suprimentos', [(3, 1), (4, 1), (5, 1)]) == {5: b'eeeeeeeee'}
+    # Versão diferente da guardada não serve
+    assert cache.obter_varios('suprimentos', [(5, 2)]) == {}
+
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['itens'], estatisticas['bytes'], estatisticas['descartes']) == (1, 9, 4)
+    assert (estatisticas['hits'], estatisticas['misses']) == (6, 5)
+    assert estatisticas['taxa_acerto'] == 54.55
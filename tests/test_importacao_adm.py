@@ -0,0 +1,60 @@
+CABECALHO = 'nome;categoria;quantidade_estoque;quantidade_minima;preco_unitario;fornecedor;unidade'
+
+
+def importar(cliente_adm, csv):
+    return cliente_adm.post('/api/suprimentos/import', data=csv.encode('utf-8'), content_type='text/csv')
+
+
+def suprimentos(cliente_adm):
+    return {s['nome']: s for s in cliente_adm.get('/api/suprimentos').get_json()['suprimentos']}
+
+
+def test_importacao_sem_validade_mantem_a_validade_gravada(cliente_adm):
+    resposta = importar(cliente_adm, CABECALHO + ';validade\n'
+                        'Luvas Descartáveis;EPI;100;50;0.5;MedSupply;Unidade Central;2025-03-15\n')
+    assert resposta.get_json()['inseridos'] == 1
+
+    # Sem a coluna validade
+    resposta = importar(cliente_adm, CABECALHO + '\nLuvas Descartáveis;EPI;80;50;0.5;MedSupply;Unidade Central\n')
+    assert resposta.get_json()['atualizados'] == 1
+    luvas = suprimentos(cliente_adm)['Luvas Descartáveis']
+    assert (luvas['quantidade_estoque'], luvas['validade']) == (80, '2025-03-15')
+
+    # Com a coluna, mas a célula vazia
+    resposta = importar(cliente_adm, CABECALHO + ';validade\nLuvas Descartáveis;EPI;60;50;0.5;MedSupply;Unidade Central;\n')
+    assert resposta.get_json()['atualizados'] == 1
+    luvas = suprimentos(cliente_adm)['Luvas Descartáveis']
+    assert (luvas['quantidade_estoque'], luvas['validade']) == (60, '2025-03-15')
+
+    # Informada, a validade é atualizada
+    importar(cliente_adm, CABECALHO + ';validade\nLuvas Descartáveis;EPI;60;50;0.5;MedSupply;Unidade Central;2026-01-31\n')
+    assert suprimentos(cliente_adm)['Luvas Descartáveis']['validade'] == '2026-01-31'
+
+
+def test_importacao_de_csv_vazio(cliente_adm):
+    resposta = importar(cliente_adm, '')
+    assert resposta.status_code == 400
+    assert resposta.get_json() == {'status': 'erro', 'mensagem': 'Arquivo CSV vazio'}
+
+
+def test_importacao_interrompida_por_linha_fora_do_utf8(cliente_adm):
+    linhas = [f'Item {i};EPI;10;5;1.0;MedSupply;Unidade Central' for i in range(3)]
+    corpo = (CABECALHO + '\n' + '\n'.join(linhas) + '\n').encode('utf-8') + 'Máscara;EPI;1;1;1;X;Y\n'.encode('latin-1')
+    resposta = cliente_adm.post('/api/suprimentos/import', data=corpo, content_type='text/csv')
+    assert resposta.status_code == 400
+    corpo = resposta.get_json()
+    assert corpo['status'] == 'erro'
+    assert (corpo['linhas_processadas'], corpo['inseridos']) == (3, 3)
+    assert corpo['erros'] == [{'linha': 5, 'erro': 'Linha não está em UTF-8'}]
+    assert set(suprimentos(cliente_adm)) == {'Item 0', 'Item 1', 'Item 2'}
+
+
+def test_importacao_interrompida_por_csv_malformado(cliente_adm):
+    # Campo acima do limite do módulo csv
+    corpo = CABECALHO + '\nItem 0;EPI;10;5;1.0;MedSupply;Unidade Central\n' + 'x' * 200000 + ';EPI;1;1;1;X;Y\n'
+    resposta = importar(cliente_adm, corpo)
+    assert resposta.status_code == 400
+    corpo = resposta.get_json()
+    assert corpo['inseridos'] == 1
+    assert corpo['erros'][0]['linha'] == 3
+    assert corpo['mensagem'].startswith('Importação interrompida na linha 3: CSV malformado')
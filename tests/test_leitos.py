@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture
+def leituras_leito(banco):
+    # leituras_leito(funcao) -> quantos SELECT na tabela leito a função fez
+    def contar(funcao):
+        selects = []
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'FROM leito' in statement:
+                selects.append(statement)
+        event.listen(banco, 'before_cursor_execute', registrar)
+        try:
+            funcao()
+        finally:
+            event.remove(banco, 'before_cursor_execute', registrar)
+        return len(selects)
+    return contar
+
+
+def quadro(cliente):
+    return {leito['numero']: leito for leito in cliente.get('/leitos').get_json()['itens']}
+
+
+def test_indice_de_leitos_nao_recarrega_com_escritas_que_nao_mudam_o_quadro(vidaplus, inserir, cliente, leituras_leito):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    for numero in ('101', '102'):
+        assert cliente.post('/leitos', json={'numero': numero, 'setor': 'UTI'}).status_code == 201
+    assert leituras_leito(lambda: quadro(cliente)) == 1
+
+    # Cadastro de paciente e as próprias escritas do worker não descartam o índice
+    assert cliente.post('/pacientes', json={'nome': 'Bia', 'cpf': '00000000002'}).status_code == 201
+    assert cliente.post('/leitos', json={'numero': '103', 'setor': 'UTI'}).status_code == 201
+    leito_101 = quadro(cliente)['101']['id']
+    assert cliente.put(f'/leitos/{leito_101}/ocupar', json={'paciente_id': paciente}).status_code == 200
+    assert cliente.post('/leitos/alocar', json={'paciente_id': paciente + 1, 'setor': 'UTI'}).status_code == 200
+
+    leitos = {}
+    assert leituras_leito(lambda: leitos.update(quadro(cliente))) == 0
+    assert leitos['101']['paciente_nome'] == 'Ana'
+    assert leitos['102']['paciente_nome'] == 'Bia'
+    assert not leitos['103']['ocupado']
+
+    assert cliente.put(f'/leitos/{leito_101}/liberar').status_code == 200
+    assert leituras_leito(lambda: leitos.update(quadro(cliente))) == 0
+    assert not leitos['101']['ocupado']
+
+
+def test_indice_de_leitos_recarrega_com_escritas_de_outro_worker(vidaplus, inserir, cliente):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    assert cliente.post('/leitos', json={'numero': '101', 'setor': 'UTI'}).status_code == 201
+    leito_id = quadro(cliente)['101']['id']
+    assert cliente.put(f'/leitos/{leito_id}/ocupar', json={'paciente_id': paciente}).status_code == 200
+    assert quadro(cliente)['101']['paciente_nome'] == 'Ana'
+
+    # Alterações feitas fora deste worker: o índice só sabe pela versão no banco
+    with vidaplus.app.app_context():
+        vidaplus.db.session.get(vidaplus.Paciente, paciente).nome = 'Ana Lima'
+        vidaplus.db.session.commit()
+    assert quadro(cliente)['101']['paciente_nome'] == 'Ana Lima'
+
+    inserir(vidaplus.Leito, [{'numero': '102', 'setor': 'UTI'}])
+    assert set(quadro(cliente)) == {'101', '102'}
+
+
+def test_alocar_leito_recusa_paciente_internado_e_setor_lotado(vidaplus, inserir, cliente):
+    ana, bia = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}, {'nome': 'Bia', 'cpf': '00000000002'}])
+    for numero, setor in (('101', 'UTI'), ('201', 'Enfermaria')):
+        assert cliente.post('/leitos', json={'numero': numero, 'setor': setor}).status_code == 201
+
+    resposta = cliente.post('/leitos/alocar', json={'paciente_id': ana, 'setor': 'UTI'})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['numero'] == '101'
+
+    resposta = cliente.post('/leitos/alocar', json={'paciente_id': ana, 'setor': 'Enfermaria'})
+    assert resposta.status_code == 409
+    assert resposta.get_json() == {'erro': 'Paciente já ocupa o leito 101'}
+
+    resposta = cliente.post('/leitos/alocar', json={'paciente_id': bia, 'setor': 'UTI'})
+    assert resposta.status_code == 409
+    assert resposta.get_json() == {'erro': 'Nenhum leito livre no setor UTI'}
+
+    assert cliente.post('/leitos/alocar', json={'paciente_id': bia + 100, 'setor': 'UTI'}).status_code == 404
+    assert cliente.post('/leitos/alocar', json={'paciente_id': bia}).status_code == 400
+    assert quadro(cliente)['201']['ocupado'] is False
+
+
+def test_alocar_leito_com_indice_defasado_usa_o_proximo_livre(vidaplus, inserir, cliente):
+    ana, bia = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}, {'nome': 'Bia', 'cpf': '00000000002'}])
+    for numero in ('101', '102'):
+        assert cliente.post('/leitos', json={'numero': numero, 'setor': 'UTI'}).status_code == 201
+    leitos = quadro(cliente)
+
+    # Ocupado por "outro worker": o índice deste ainda acha que o 101 está livre
+    with vidaplus.app.app_context():
+        vidaplus.db.session.execute(
+            vidaplus.db.update(vidaplus.Leito).where(vidaplus.Leito.id == leitos['101']['id'])
+            .values(ocupado=True, paciente_id=bia)
+        )
+        vidaplus.db.session.commit()
+
+    resposta = cliente.post('/leitos/alocar', json={'paciente_id': ana, 'setor': 'UTI'})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['numero'] == '102'
+
+
+def test_alocacoes_simultaneas_nao_repetem_leito_nem_paciente(vidaplus, inserir, cliente):
+    pacientes = inserir(vidaplus.Paciente, [{'nome': f'Paciente {i}', 'cpf': f'{i:011d}'} for i in range(8)])
+    for i in range(5):
+        assert cliente.post('/leitos', json={'numero': f'10{i}', 'setor': 'UTI'}).status_code == 201
+    assert cliente.post('/leitos', json={'numero': '201', 'setor': 'Enfermaria'}).status_code == 201
+
+    # Oito pacientes para cinco leitos da UTI e o primeiro paciente pedido também na enfermaria
+    pedidos = [(paciente, 'UTI') for paciente in pacientes] + [(pacientes[0], 'Enfermaria')]
+    largada = threading.Barrier(len(pedidos))
+    status = []
+
+    def alocar(paciente, setor):
+        cliente = vidaplus.app.test_client()
+        largada.wait()
+        status.append(cliente.post('/leitos/alocar', json={'paciente_id': paciente, 'setor': setor}).status_code)
+
+    threads = [threading.Thread(target=alocar, args=pedido) for pedido in pedidos]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # A UTI lota; a enfermaria só fica com o primeiro paciente se ele não levou leito na UTI
+    leitos = quadro(cliente)
+    ocupados = [leito['paciente_id'] for leito in leitos.values() if leito['ocupado']]
+    assert set(status) <= {200, 409}
+    assert status.count(200) == len(ocupados) == len(set(ocupados))
+    assert all(leitos[f'10{i}']['ocupado'] for i in range(5))
+    assert ocupados.count(pacientes[0]) == 1
+    corpo = cliente.get('/relatorios/ocupacao-leitos').get_json()
+    assert corpo['resumo_geral']['ocupados'] == len(ocupados)
@@ -0,0 +1,63 @@
+from datetime import date, datetime, time
+
+import pytest
+
+# Cada linha aponta para um paciente/profissional diferente: com carga
+# preguiçosa dos relacionamentos, cada um viraria um SELECT a mais
+LISTAGENS = [
+    '/consultas',
+    '/exames',
+    '/atendimentos-online',
+    '/prescricoes',
+    '/relatorios/consultas-dia?data=2026-03-10',
+    '/agenda-disponivel',
+]
+
+
+def popular(vidaplus, inserir, n):
+    pacientes = inserir(vidaplus.Paciente, [
+        {'nome': f'Paciente {i}', 'cpf': f'{i:011d}'} for i in range(n)
+    ])
+    profissionais = inserir(vidaplus.Profissional, [
+        {'nome': f'Profissional {i}', 'crm_coren': f'CRM{i}', 'especialidade': 'Clínica', 'tipo': 'medico'}
+        for i in range(n)
+    ])
+    pares = list(zip(pacientes, profissionais))
+    inserir(vidaplus.Consulta, [
+        {'paciente_id': p, 'profissional_id': m, 'data_consulta': datetime(2026, 3, 10, 8, i % 60),
+         'tipo': 'presencial'}
+        for i, (p, m) in enumerate(pares)
+    ])
+    inserir(vidaplus.Exame, [
+        {'paciente_id': p, 'tipo_exame': 'Hemograma', 'data_exame': datetime(2026, 3, 10, 9)}
+        for p, _ in pares
+    ])
+    atendimentos = inserir(vidaplus.AtendimentoOnline, [
+        {'paciente_id': p, 'profissional_id': m, 'data_inicio': datetime(2026, 3, 10, 10)}
+        for p, m in pares
+    ])
+    inserir(vidaplus.Prescricao, [
+        {'paciente_id': p, 'profissional_id': m, 'atendimento_online_id': a, 'medicamento': 'Dipirona',
+         'medicamento_normalizado': 'dipirona', 'dosagem': '500mg', 'frequencia': '6/6h', 'duracao': '3 dias'}
+        for (p, m), a in zip(pares, atendimentos)
+    ])
+    inserir(vidaplus.AgendaDisponivel, [
+        {'profissional_id': m, 'data': date(2026, 3, 11), 'hora_inicio': time(8), 'hora_fim': time(9),
+         'tipo_atendimento': 'ambos'}
+        for _, m in pares
+    ])
+
+
+@pytest.mark.parametrize('url', LISTAGENS)
+def test_quantidade_de_queries_nao_depende_do_numero_de_linhas(vidaplus, inserir, limpar_banco, cliente, contador_queries, url):
+    chave = 'consultas' if 'consultas-dia' in url else 'itens'
+    queries = {}
+    for n in (1, 50):
+        limpar_banco()
+        popular(vidaplus, inserir, n)
+        respostas = []
+        queries[n] = contador_queries(lambda: respostas.append(cliente.get(url)))
+        assert respostas[0].status_code == 200
+        assert len(respostas[0].get_json()[chave]) == n
+
+    assert queries[50] == queries[1]
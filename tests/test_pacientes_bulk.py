@@ -0,0 +1,45 @@
+def test_bulk_cria_e_reporta_cada_linha(cliente):
+    resposta = cliente.post('/pacientes/bulk', json=[
+        {'nome': 'Ana', 'cpf': '00000000001', 'data_nascimento': '1990-01-02'},
+        {'nome': 'Sem CPF'},
+        {'nome': 'Ana de novo', 'cpf': '00000000001'},
+    ])
+
+    assert resposta.status_code == 207
+    corpo = resposta.get_json()
+    assert (corpo['criados'], corpo['erros']) == (1, 2)
+    assert [r['status'] for r in corpo['resultados']] == ['criado', 'erro', 'erro']
+    assert corpo['resultados'][2]['erro'] == 'CPF repetido no lote'
+
+
+def test_cpf_gravado_por_outro_cadastro_durante_o_bulk_vira_erro_da_linha(vidaplus, inserir, cliente, monkeypatch):
+    # Os CPFs 3 e 6 são gravados "por outro worker" depois da conferência:
+    # a conferência não os enxerga e o INSERT do bloco viola o CPF único
+    inserir(vidaplus.Paciente, [{'nome': 'Concorrente', 'cpf': f'{i:011d}'} for i in (3, 6)])
+    monkeypatch.setattr(vidaplus, 'cpfs_cadastrados', lambda cpfs: set())
+    monkeypatch.setattr(vidaplus, 'TAMANHO_LOTE_BULK', 2)
+
+    resposta = cliente.post('/pacientes/bulk', json=[
+        {'nome': f'Paciente {i}', 'cpf': f'{i:011d}'} for i in range(1, 8)
+    ])
+
+    assert resposta.status_code == 207
+    corpo = resposta.get_json()
+    assert (corpo['criados'], corpo['erros']) == (5, 2)
+    erros = [r['linha'] for r in corpo['resultados'] if r['status'] == 'erro']
+    assert erros == [3, 6]
+    assert all(r['erro'] == 'CPF já cadastrado' for r in corpo['resultados'] if r['status'] == 'erro')
+
+    with vidaplus.app.app_context():
+        assert vidaplus.Paciente.query.count() == 7
+
+
+def test_bulk_aceita_ndjson(cliente):
+    corpo = '{"nome": "Ana", "cpf": "00000000001"}\n\n{"nome": "Bia", "cpf": "00000000002"}\n'
+    resposta = cliente.post('/pacientes/bulk', data=corpo, content_type='application/x-ndjson')
+    assert resposta.status_code == 201
+    assert resposta.get_json()['criados'] == 2
+
+    resposta = cliente.post('/pacientes/bulk', data='{"nome": "Ana"}\n{quebrado\n', content_type='application/x-ndjson')
+    assert resposta.status_code == 400
+    assert resposta.get_json() == {'erro': 'Linha 2 do NDJSON não é um JSON válido'}
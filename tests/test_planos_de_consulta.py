@@ -0,0 +1,12 @@
+# Uma rota que volte a varrer a tabela inteira (índice faltando ou consulta
+# que deixou de usá-lo) falha aqui, não só no "flask verificar-planos"
+
+
+def test_rotas_do_app_nao_fazem_varredura_completa(vidaplus, banco):
+    with vidaplus.app.app_context():
+        assert vidaplus.verificar_planos_de_consulta() == []
+
+
+def test_rotas_do_adm_nao_fazem_varredura_completa(adm, cliente_adm):
+    with adm.app.app_context():
+        assert adm.verificar_planos_de_consulta() == []
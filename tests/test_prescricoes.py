@@ -0,0 +1,42 @@
+def prescricao(paciente_id, profissional_id, medicamento):
+    return {'paciente_id': paciente_id, 'profissional_id': profissional_id, 'medicamento': medicamento,
+            'dosagem': '500mg', 'frequencia': '8/8h', 'duracao': '7 dias'}
+
+
+def test_filtro_e_sugestoes_usam_o_nome_normalizado(vidaplus, inserir, cliente):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    [profissional] = inserir(vidaplus.Profissional, [
+        {'nome': 'Dr. Rui', 'crm_coren': 'CRM1', 'especialidade': 'Clínica', 'tipo': 'medico'}
+    ])
+    ids = {}
+    for medicamento in ('Amoxicilina 500mg', ' amoxicilína  500MG ', 'AMOXICILINA 500mg', 'Amoxil', 'Ambroxol',
+                        'Ambroxol', 'Dipirona'):
+        resposta = cliente.post('/prescricoes', json=prescricao(paciente, profissional, medicamento))
+        ids.setdefault(medicamento, []).append(resposta.get_json()['id'])
+    assert cliente.put(f'/prescricoes/{ids["AMOXICILINA 500mg"][0]}/desativar').status_code == 200
+
+    def filtrar(medicamento):
+        corpo = cliente.get('/prescricoes', query_string={'medicamento': medicamento}).get_json()
+        return sorted(p['id'] for p in corpo['itens'])
+
+    # Grafias diferentes do mesmo medicamento; a desativada fica de fora
+    assert filtrar('Amoxicilina 500 mg') == []
+    assert filtrar('amoxicilina   500mg') == sorted(ids['Amoxicilina 500mg'] + ids[' amoxicilína  500MG '])
+    assert filtrar('AMBROXOL') == ids['Ambroxol']
+
+    def sugestoes(prefixo, **parametros):
+        corpo = cliente.get('/prescricoes/medicamentos/sugestoes', query_string=dict(prefixo=prefixo, **parametros))
+        return [(s['medicamento'], s['prescricoes'], s['prescricoes_ativas']) for s in corpo.get_json()['sugestoes']]
+
+    # Mais prescritos primeiro, com a grafia da primeira prescrição
+    assert sugestoes('AM') == [('Amoxicilina 500mg', 3, 2), ('Ambroxol', 2, 2), ('Amoxil', 1, 1)]
+    assert sugestoes('amóx') == [('Amoxicilina 500mg', 3, 2), ('Amoxil', 1, 1)]
+    assert sugestoes('am', limit=1) == [('Amoxicilina 500mg', 3, 2)]
+    assert sugestoes('x') == []
+
+    assert cliente.put(f'/prescricoes/{ids["Ambroxol"][0]}/desativar').status_code == 200
+    # Desativar de novo não desconta outra vez
+    assert cliente.put(f'/prescricoes/{ids["Ambroxol"][0]}/desativar').status_code == 200
+    assert sugestoes('amb') == [('Ambroxol', 2, 1)]
+
+    assert cliente.get('/prescricoes/medicamentos/sugestoes', query_string={'prefixo': '  '}).status_code == 400
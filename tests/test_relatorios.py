@@ -0,0 +1,231 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def prescricao(paciente_id, profissional_id, medicamento):
+    return {'paciente_id': paciente_id, 'profissional_id': profissional_id, 'medicamento': medicamento,
+            'dosagem': '500mg', 'frequencia': '8/8h', 'duracao': '7 dias'}
+
+
+def test_prescricoes_ativas_nao_devolve_cache_antigo_com_etag_novo(vidaplus, inserir, cliente):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    [profissional] = inserir(vidaplus.Profissional, [
+        {'nome': 'Dr. Rui', 'crm_coren': 'CRM1', 'especialidade': 'Clínica', 'tipo': 'medico'}
+    ])
+    assert cliente.post('/prescricoes', json=prescricao(paciente, profissional, 'Dipirona')).status_code == 201
+
+    resposta = cliente.get('/relatorios/prescricoes-ativas')
+    etag_antigo = resposta.headers['ETag']
+    assert resposta.get_json()['total_prescricoes_ativas'] == 1
+
+    # Gravada por "outro worker": o cache deste processo não é limpo
+    inserir(vidaplus.Prescricao, [dict(prescricao(paciente, profissional, 'Amoxicilina'), medicamento_normalizado='amoxicilina')])
+
+    resposta = cliente.get('/relatorios/prescricoes-ativas', headers={'If-None-Match': etag_antigo})
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] != etag_antigo
+    corpo = resposta.get_json()
+    assert corpo['total_prescricoes_ativas'] == 2
+    assert {m['medicamento'] for m in corpo['medicamentos_mais_prescritos']} == {'Dipirona', 'Amoxicilina'}
+
+    resposta = cliente.get('/relatorios/prescricoes-ativas', headers={'If-None-Match': resposta.headers['ETag']})
+    assert resposta.status_code == 304
+
+
+def test_ocupacao_de_leitos_acompanha_as_rotas_e_o_reparo_corrige_divergencias(vidaplus, inserir, cliente):
+    pacientes = inserir(vidaplus.Paciente, [{'nome': f'Paciente {i}', 'cpf': f'{i:011d}'} for i in range(3)])
+    leitos = [
+        cliente.post('/leitos', json={'numero': numero, 'setor': setor}).get_json()['id']
+        for numero, setor in (('101', 'UTI'), ('102', 'UTI'), ('201', 'Enfermaria'))
+    ]
+    assert cliente.put(f'/leitos/{leitos[0]}/ocupar', json={'paciente_id': pacientes[0]}).status_code == 200
+    assert cliente.post('/leitos/alocar', json={'paciente_id': pacientes[1], 'setor': 'Enfermaria'}).status_code == 200
+    # Tentativas recusadas não mexem no resumo
+    assert cliente.put(f'/leitos/{leitos[0]}/ocupar', json={'paciente_id': pacientes[2]}).status_code == 400
+    assert cliente.put(f'/leitos/{leitos[1]}/liberar').status_code == 400
+
+    def por_setor():
+        corpo = cliente.get('/relatorios/ocupacao-leitos').get_json()
+        return corpo['resumo_geral'], {s['setor']: (s['total_leitos'], s['ocupados']) for s in corpo['por_setor']}
+
+    resumo, setores = por_setor()
+    assert setores == {'UTI': (2, 1), 'Enfermaria': (1, 1)}
+    assert resumo == {'total_leitos': 3, 'ocupados': 2, 'livres': 1, 'taxa_ocupacao_geral': 66.67}
+
+    assert cliente.put(f'/leitos/{leitos[0]}/liberar').status_code == 200
+    assert por_setor()[1] == {'UTI': (2, 0), 'Enfermaria': (1, 1)}
+
+    # Leito gravado direto no banco (sem a rota): o resumo fica defasado até o reparo
+    inserir(vidaplus.Leito, [{'numero': '301', 'setor': 'Pediatria', 'ocupado': True, 'paciente_id': pacientes[2]}])
+    assert 'Pediatria' not in por_setor()[1]
+
+    saida = vidaplus.app.test_cli_runner().invoke(args=['reparar-ocupacao-leitos']).output
+    assert 'Pediatria: total 0 -> 1, ocupados 0 -> 1' in saida
+    assert por_setor()[1] == {'UTI': (2, 0), 'Enfermaria': (1, 1), 'Pediatria': (1, 1)}
+    saida = vidaplus.app.test_cli_runner().invoke(args=['reparar-ocupacao-leitos']).output
+    assert 'consistente' in saida
+
+
+def test_prescricoes_ativas_agrega_com_filtros_e_acompanha_a_desativacao(vidaplus, inserir, cliente):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    rui, eva = inserir(vidaplus.Profissional, [
+        {'nome': 'Dr. Rui', 'crm_coren': 'CRM1', 'especialidade': 'Clínica', 'tipo': 'medico'},
+        {'nome': 'Dra. Eva', 'crm_coren': 'CRM2', 'especialidade': 'Clínica', 'tipo': 'medico'},
+    ])
+    linhas = []
+    for profissional, medicamento, dia in (
+        (rui, 'Dipirona', 3), (rui, 'Dipirona', 3), (rui, 'Amoxicilina', 4), (eva, 'Dipirona', 10),
+        (eva, 'Amoxicilina', 10), (eva, 'Amoxicilina', 11), (eva, 'Amoxicilina', 11), (eva, 'Losartana', 12),
+    ):
+        linhas.append(dict(
+            prescricao(paciente, profissional, medicamento),
+            medicamento_normalizado=medicamento.lower(), created_at=datetime(2026, 3, dia, 9),
+        ))
+    ids = inserir(vidaplus.Prescricao, linhas)
+
+    def relatorio(**parametros):
+        corpo = cliente.get('/relatorios/prescricoes-ativas', query_string=parametros).get_json()
+        return corpo['total_prescricoes_ativas'], [
+            (m['medicamento'], m['quantidade']) for m in corpo['medicamentos_mais_prescritos']
+        ]
+
+    # Mais prescritos primeiro; empate pelo nome
+    assert relatorio() == (8, [('Amoxicilina', 4), ('Dipirona', 3), ('Losartana', 1)])
+    assert relatorio(limit=1) == (8, [('Amoxicilina', 4)])
+    assert relatorio(profissional_id=rui) == (3, [('Dipirona', 2), ('Amoxicilina', 1)])
+    # data_fim inclusiva
+    assert relatorio(data_inicio='2026-03-04', data_fim='2026-03-11') == (
+        5, [('Amoxicilina', 4), ('Dipirona', 1)]
+    )
+
+    assert cliente.put(f'/prescricoes/{ids[2]}/desativar').status_code == 200
+    assert cliente.put(f'/prescricoes/{ids[3]}/desativar').status_code == 200
+    assert relatorio() == (6, [('Amoxicilina', 3), ('Dipirona', 2), ('Losartana', 1)])
+    assert relatorio(profissional_id=rui) == (2, [('Dipirona', 2)])
+
+    assert cliente.get('/relatorios/prescricoes-ativas', query_string={'limit': 0}).status_code == 400
+
+
+def test_atendimentos_online_somam_as_contagens_por_hora_em_qualquer_periodo(vidaplus, inserir, cliente):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    rui, eva = inserir(vidaplus.Profissional, [
+        {'nome': 'Dr. Rui', 'crm_coren': 'CRM1', 'especialidade': 'Clínica', 'tipo': 'medico'},
+        {'nome': 'Dra. Eva', 'crm_coren': 'CRM2', 'especialidade': 'Clínica', 'tipo': 'medico'},
+    ])
+    # 09 e 10/03 na mesma semana (segunda e terça), 16/03 na seguinte, 01/04 no mês seguinte
+    atendimentos = [
+        cliente.post('/atendimentos-online', json={
+            'paciente_id': paciente, 'profissional_id': profissional, 'data_inicio': data_inicio,
+        }).get_json()['id']
+        for profissional, data_inicio in (
+            (rui, '2026-03-09 09:00'), (rui, '2026-03-10 14:30'), (eva, '2026-03-10 14:00'),
+            (eva, '2026-03-16 09:00'), (rui, '2026-04-01 08:00'), (eva, '2026-03-31 23:00'),
+        )
+    ]
+    # Iniciado e finalizado: passa para a hora atual, fora de março e abril de 2026
+    assert cliente.put(f'/atendimentos-online/{atendimentos[-1]}/iniciar').status_code == 200
+    assert cliente.put(f'/atendimentos-online/{atendimentos[-1]}/finalizar', json={}).status_code == 200
+
+    def relatorio(**parametros):
+        return cliente.get('/relatorios/atendimentos-online', query_string=parametros).get_json()
+
+    estatisticas = relatorio()['estatisticas']
+    assert (estatisticas['total_atendimentos'], estatisticas['finalizados'], estatisticas['taxa_conclusao']) == (6, 1, 16.67)
+    assert relatorio(data_inicio='2026-03-09', data_fim='2026-03-10')['estatisticas']['total_atendimentos'] == 3
+    assert relatorio(data_inicio='2026-03-01', data_fim='2026-04-30', profissional_id=eva)['estatisticas'][
+        'total_atendimentos'] == 2
+
+    def serie(granularidade):
+        corpo = relatorio(data_inicio='2026-03-01', data_fim='2026-04-30', granularidade=granularidade)
+        return [(ponto['periodo'], ponto['total_atendimentos']) for ponto in corpo['serie']]
+
+    assert serie('dia') == [('2026-03-09', 1), ('2026-03-10', 2), ('2026-03-16', 1), ('2026-04-01', 1)]
+    assert serie('semana') == [('2026-03-09', 3), ('2026-03-16', 1), ('2026-03-30', 1)]
+    assert serie('mes') == [('2026-03', 4), ('2026-04', 1)]
+
+    assert cliente.get('/relatorios/atendimentos-online', query_string={'granularidade': 'ano'}).status_code == 400
+
+
+@pytest.mark.parametrize('inicio, fim, meses, pontas', [
+    (None, None, (None, None), []),
+    ('2026-03-01', '2026-04-01', ('2026-03-01', '2026-04-01'), []),
+    ('2026-01-15', '2026-04-10', ('2026-02-01', '2026-04-01'),
+     [('2026-01-15', '2026-02-01'), ('2026-04-01', '2026-04-10')]),
+    ('2026-03-05', '2026-03-20', None, [('2026-03-05', '2026-03-20')]),
+    # Atravessa a virada do mês sem fechar nenhum mês
+    ('2026-03-31', '2026-04-02', None, [('2026-03-31', '2026-04-02')]),
+    (None, '2026-03-10', (None, '2026-03-01'), [('2026-03-01', '2026-03-10')]),
+    ('2026-12-15', None, ('2027-01-01', None), [('2026-12-15', '2027-01-01')]),
+])
+def test_dividir_periodo_por_mes(vidaplus, inicio, fim, meses, pontas):
+    def data(texto):
+        return datetime.strptime(texto, '%Y-%m-%d') if texto else None
+
+    esperado_meses = tuple(data(m) for m in meses) if meses else None
+    esperado_pontas = [(data(de), data(ate)) for de, ate in pontas]
+    assert vidaplus.dividir_periodo_por_mes(data(inicio), data(fim)) == (esperado_meses, esperado_pontas)
+
+
+def test_produtividade_bate_com_a_contagem_direta_em_periodos_que_cortam_meses(vidaplus, inserir, cliente):
+    [paciente] = inserir(vidaplus.Paciente, [{'nome': 'Ana', 'cpf': '00000000001'}])
+    profissionais = inserir(vidaplus.Profissional, [
+        {'nome': f'Dr. {i}', 'crm_coren': f'CRM{i}', 'especialidade': 'Clínica', 'tipo': 'medico'} for i in range(3)
+    ])
+    # De 25/02 a 05/04, a cada 19 horas, alternando profissional e status
+    for i in range(50):
+        data = datetime(2026, 2, 25, 7) + timedelta(hours=19 * i)
+        profissional = profissionais[i % 3]
+        consulta = cliente.post('/consultas', json={
+            'paciente_id': paciente, 'profissional_id': profissional, 'data_consulta': data.strftime('%Y-%m-%d %H:%M'),
+        }).get_json()['id']
+        if i % 4:
+            cliente.put(f'/consultas/{consulta}/status', json={'status': ('realizada', 'cancelada', 'realizada')[i % 4 - 1]})
+        if i % 5 == 0:
+            cliente.post('/atendimentos-online', json={
+                'paciente_id': paciente, 'profissional_id': profissional, 'data_inicio': data.strftime('%Y-%m-%d %H:%M'),
+            })
+        if i % 7 == 0:
+            cliente.post('/prescricoes', json=prescricao(paciente, profissional, 'Dipirona'))
+
+    db = vidaplus.db
+    with vidaplus.app.app_context():
+        registros = {
+            'consulta': db.session.query(
+                vidaplus.Consulta.profissional_id, vidaplus.Consulta.data_consulta, vidaplus.Consulta.status
+            ).all(),
+            'atendimento_online': db.session.query(
+                vidaplus.AtendimentoOnline.profissional_id, vidaplus.AtendimentoOnline.data_inicio,
+                vidaplus.AtendimentoOnline.status
+            ).all(),
+            'prescricao': [
+                (profissional, criada, 'emitida') for profissional, criada in db.session.query(
+                    vidaplus.Prescricao.profissional_id, vidaplus.Prescricao.created_at
+                )
+            ],
+        }
+
+    campos = {'consulta': 'total_consultas', 'atendimento_online': 'total_atendimentos_online',
+              'prescricao': 'total_prescricoes'}
+    hoje = datetime.utcnow().strftime('%Y-%m-%d')
+    for parametros in (
+        {}, {'data_inicio': '2026-03-01', 'data_fim': '2026-03-31'},
+        {'data_inicio': '2026-02-27', 'data_fim': '2026-04-02'}, {'data_inicio': '2026-03-31', 'data_fim': '2026-04-01'},
+        {'data_fim': '2026-03-15'}, {'data_inicio': '2026-03-10', 'data_fim': hoje},
+        {'data_inicio': '2026-02-01', 'data_fim': '2026-04-30', 'status_consulta': 'realizada,cancelada'},
+    ):
+        inicio = datetime.strptime(parametros['data_inicio'], '%Y-%m-%d') if 'data_inicio' in parametros else datetime.min
+        fim = (datetime.strptime(parametros['data_fim'], '%Y-%m-%d') + timedelta(days=1)
+               if 'data_fim' in parametros else datetime.max)
+        status_consulta = parametros.get('status_consulta', 'agendada,realizada,cancelada').split(',')
+        esperado = {
+            profissional: {campo: 0 for campo in campos.values()} for profissional in profissionais
+        }
+        for tipo, linhas in registros.items():
+            for profissional, data, status in linhas:
+                if inicio <= data < fim and (tipo != 'consulta' or status in status_consulta):
+                    esperado[profissional][campos[tipo]] += 1
+
+        corpo = cliente.get('/relatorios/profissionais-produtividade', query_string=parametros).get_json()
+        obtido = {linha['id']: {campo: linha[campo] for campo in campos.values()} for linha in corpo}
+        assert obtido == esperado, parametros